@@ -0,0 +1,65 @@
+"""
+Surunkali davomatsizlikni aniqlash.
+
+Barcha talabalar bitta window-function SQL so'rovi (ketma-ket qoldirilgan
+darslar) va bitta statistika so'rovi (past davomat foizi) bilan baholanadi.
+"""
+from __future__ import annotations
+
+from django.db import connection
+
+from .models import Lesson, Attendance, AttendanceStatistics
+
+
+def _absence_streaks(min_streak: int) -> dict:
+    """Oxirgi darslardan boshlab ketma-ket `absent` bo'lgan talabalar: student_id -> streak."""
+    qn = connection.ops.quote_name
+    sql = f"""
+        SELECT student_id, COUNT(*) AS streak
+        FROM (
+            SELECT a.{qn('student_id')} AS student_id,
+                   SUM(CASE WHEN a.{qn('status')} <> 'absent' THEN 1 ELSE 0 END) OVER (
+                       PARTITION BY a.{qn('student_id')}
+                       ORDER BY l.{qn('date')} DESC, l.{qn('start_time')} DESC
+                       ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW
+                   ) AS attended_since
+            FROM {qn(Attendance._meta.db_table)} a
+            JOIN {qn(Lesson._meta.db_table)} l ON l.{qn('id')} = a.{qn('lesson_id')}
+            WHERE a.{qn('deleted_at')} IS NULL
+              AND l.{qn('deleted_at')} IS NULL
+              AND l.{qn('status')} <> 'cancelled'
+        ) ranked
+        WHERE attended_since = 0
+        GROUP BY student_id
+        HAVING COUNT(*) >= %s
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [min_streak])
+        return {
+            Attendance._meta.get_field('student').to_python(student_id): streak
+            for student_id, streak in cursor.fetchall()
+        }
+
+
+def find_chronically_absent_students(rate_threshold: float, min_lessons: int, min_streak: int) -> dict:
+    """
+    Davomati past yoki ketma-ket dars qoldirgan talabalarni topish.
+
+    Returns:
+        dict: student_id -> {'attendance_rate': float | None, 'streak': int}
+    """
+    flagged = {
+        student_id: {'attendance_rate': None, 'streak': streak}
+        for student_id, streak in _absence_streaks(min_streak).items()
+    }
+
+    low_rates = AttendanceStatistics.objects.filter(
+        subject__isnull=True,
+        deleted_at__isnull=True,
+        total_lessons__gte=min_lessons,
+        attendance_rate__lt=rate_threshold,
+    ).values_list('student_id', 'attendance_rate')
+    for student_id, rate in low_rates:
+        flagged.setdefault(student_id, {'attendance_rate': None, 'streak': 0})['attendance_rate'] = rate
+
+    return flagged
@@ -0,0 +1,193 @@
+"""
+Bugungi va haftalik darslar javoblarini Redis'da keshlash.
+
+Talaba ilovalari `today` va `this_week` endpointlarini tez-tez so'raydi.
+Javob (guruh, sana/hafta) bo'yicha tayyor JSON ko'rinishida saqlanadi va
+shu guruhdagi Lesson/Attendance yozuvlari o'zgarganda o'chiriladi.
+
+Har bir guruhning avlod (generation) hisoblagichi bor: o'chirishda u
+oshiriladi, keshga yozish esa faqat o'qish boshlangandagi avlod o'zgarmagan
+bo'lsa bajariladi. Shu tufayli parallel so'rov eski ma'lumotni qayta
+yozib qo'ya olmaydi.
+"""
+from __future__ import annotations
+
+import logging
+from datetime import date, timedelta
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from .models import Lesson
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "lessons"
+ALL_GROUPS = "all"
+
+# KEYS[1] - ma'lumot kaliti, KEYS[2] - avlod kaliti; ARGV: avlod, ttl, body
+_SET_IF_GENERATION_LUA = """
+if (redis.call('GET', KEYS[2]) or '0') ~= ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[3], 'EX', tonumber(ARGV[2]))
+return 1
+"""
+_set_script = None
+
+
+def _redis():
+    from apps.common.redis_client import get_redis
+
+    return get_redis("cache")
+
+
+def _set_if_generation(client, keys, args):
+    global _set_script
+    if _set_script is None:
+        _set_script = _redis().register_script(_SET_IF_GENERATION_LUA)
+    return _set_script(keys=keys, args=args, client=client)
+
+
+def current_week(today: Optional[date] = None) -> tuple[date, date]:
+    today = today or timezone.localdate()
+    week_start = today - timedelta(days=today.weekday())
+    return week_start, week_start + timedelta(days=6)
+
+
+def _scope(group_id) -> str:
+    return str(group_id) if group_id else ALL_GROUPS
+
+
+def _generation_key(scope: str) -> str:
+    return f"{KEY_PREFIX}:gen:{scope}"
+
+
+def today_key(group_id, day: date) -> str:
+    return f"{KEY_PREFIX}:today:{_scope(group_id)}:{day.isoformat()}"
+
+
+def week_key(group_id, week_start: date) -> str:
+    return f"{KEY_PREFIX}:week:{_scope(group_id)}:{week_start.isoformat()}"
+
+
+def lesson_list_queryset():
+    """`LessonListSerializer` uchun: bog'liq jadvallar va davomat soni bitta so'rovda."""
+    return Lesson.objects.filter(deleted_at__isnull=True).select_related(
+        'group', 'subject', 'teacher__user'
+    ).annotate(
+        marked_count=Count('attendances', filter=Q(attendances__deleted_at__isnull=True))
+    )
+
+
+def render_lessons(lessons: Iterable[Lesson]) -> bytes:
+    from .serializers import LessonListSerializer
+
+    return JSONRenderer().render(LessonListSerializer(lessons, many=True).data)
+
+
+def get_or_render(key: str, group_id, build) -> bytes:
+    """
+    Keshdagi javobni qaytarish yoki `build()` natijasini render qilib saqlash.
+
+    Redis ishlamasa javob to'g'ridan-to'g'ri bazadan quriladi.
+    """
+    if not settings.LESSON_CACHE_ENABLED:
+        return render_lessons(build())
+
+    generation_key = _generation_key(_scope(group_id))
+    try:
+        client = _redis()
+        cached, generation = client.mget(key, generation_key)
+    except Exception:
+        logger.warning("Redis unavailable, lesson cache bypassed")
+        return render_lessons(build())
+    if cached is not None:
+        return cached.encode() if isinstance(cached, str) else cached
+
+    body = render_lessons(build())
+    try:
+        _set_if_generation(
+            client,
+            keys=[key, generation_key],
+            args=[generation or '0', settings.LESSON_CACHE_TTL_SECONDS, body],
+        )
+    except Exception:
+        logger.warning("Failed to store lesson cache entry", extra={"key": key})
+    return body
+
+
+def _delete_entries(group_ids: set) -> None:
+    today = timezone.localdate()
+    week_start, _ = current_week(today)
+    scopes = {_scope(group_id) for group_id in group_ids} | {ALL_GROUPS}
+    try:
+        pipe = _redis().pipeline(transaction=False)
+        for scope in scopes:
+            pipe.incr(_generation_key(scope))
+            pipe.delete(
+                f"{KEY_PREFIX}:today:{scope}:{today.isoformat()}",
+                f"{KEY_PREFIX}:week:{scope}:{week_start.isoformat()}",
+            )
+        pipe.execute()
+    except Exception:
+        logger.warning("Redis unavailable, lesson cache not invalidated", extra={"groups": len(scopes)})
+
+
+def invalidate_lesson_cache(group_ids: Iterable) -> None:
+    """Guruhlar (va umumiy ro'yxat) keshini tranzaksiya tasdiqlangach o'chirish."""
+    if not settings.LESSON_CACHE_ENABLED:
+        return
+    group_ids = {group_id for group_id in group_ids if group_id}
+    transaction.on_commit(lambda: _delete_entries(group_ids))
+
+
+def warm_lesson_cache() -> int:
+    """
+    Bugungi va haftalik javoblarni barcha guruhlar uchun oldindan tayyorlash.
+
+    Hafta darslari bitta so'rov bilan olinib, xotirada guruhlarga ajratiladi.
+    Returns:
+        int: keshga yozilgan kalitlar soni
+    """
+    from apps.students.models import StudentGroup
+
+    today = timezone.localdate()
+    week_start, week_end = current_week(today)
+    lessons = list(lesson_list_queryset().filter(date__gte=week_start, date__lte=week_end))
+    group_ids = list(
+        StudentGroup.objects.filter(deleted_at__isnull=True).values_list('id', flat=True)
+    )
+
+    by_group: dict = {}
+    for lesson in lessons:
+        by_group.setdefault(lesson.group_id, []).append(lesson)
+
+    entries = []  # (key, group_id, lessons)
+    for group_id in [None, *group_ids]:
+        week_lessons = by_group.get(group_id, []) if group_id else lessons
+        entries.append((week_key(group_id, week_start), group_id, week_lessons))
+        entries.append((today_key(group_id, today), group_id, [l for l in week_lessons if l.date == today]))
+
+    client = _redis()
+    generations = dict(zip(
+        ['all', *group_ids],
+        client.mget([_generation_key(_scope(group_id)) for group_id in [None, *group_ids]]),
+    ))
+
+    pipe = client.pipeline(transaction=False)
+    for key, group_id, items in entries:
+        _set_if_generation(
+            pipe,
+            keys=[key, _generation_key(_scope(group_id))],
+            args=[
+                generations[group_id or 'all'] or '0',
+                settings.LESSON_CACHE_TTL_SECONDS,
+                render_lessons(items),
+            ],
+        )
+    return sum(pipe.execute())
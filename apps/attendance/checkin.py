@@ -0,0 +1,268 @@
+"""
+Dars boshidagi ommaviy "keldim" belgilari uchun Redis bufer.
+
+Dars boshlanganda butun guruh bir necha soniya ichida o'zini belgilaydi.
+Har bir belgi bitta Lua chaqiruvi bilan yoziladi:
+
+- ``checkin:{lesson}:seen`` - takrorlarni O(1) aniqlash uchun to'plam
+- ``checkin:{lesson}:new`` - hali bazaga yozilmagan talabalar
+- ``checkin:pending`` - birinchi belgi vaqti bo'yicha darslar (ZSET)
+
+Boshqa yo'l bilan yozilgan davomat (o'qituvchi, test, avtomatik "kelmadi")
+commit dan keyin ``seen`` to'plamiga qo'shiladi (``remember_marked``),
+shuning uchun belgi bazaga murojaatsiz "avval belgilangan" javobini oladi.
+Bo'shatish baribir bazada yozuvi bor talabalarni tashlab ketadi.
+
+Fon vazifasi oyna (CHECKIN_DRAIN_WINDOW_SECONDS) o'tgan darslarni
+bo'shatib, har bir dars uchun bitta bulk_create bajaradi va statistikani
+bir marta yangilaydi. Bo'shatishda talabalar avval
+``checkin:{lesson}:processing`` ga ko'chiriladi (dars ``checkin:inflight``
+ZSET ga o'tadi) va faqat tranzaksiya commit bo'lgach o'chiriladi. Worker
+o'rtada to'xtasa, CHECKIN_PROCESSING_TIMEOUT_SECONDS dan so'ng keyingi
+bo'shatish ularni qayta ishlaydi.
+"""
+from __future__ import annotations
+
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache as local_cache
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Lesson, Attendance
+from .signals import bulk_update_attendance_statistics
+from .cache import invalidate_lesson_cache
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "checkin"
+PENDING_KEY = f"{KEY_PREFIX}:pending"
+INFLIGHT_KEY = f"{KEY_PREFIX}:inflight"
+
+# KEYS: seen, new, pending; ARGV: student_id, lesson_id, now, ttl
+_CHECK_IN_LUA = """
+if redis.call('SADD', KEYS[1], ARGV[1]) == 0 then
+    return 0
+end
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[4]))
+redis.call('SADD', KEYS[2], ARGV[1])
+redis.call('EXPIRE', KEYS[2], tonumber(ARGV[4]))
+redis.call('ZADD', KEYS[3], 'NX', ARGV[3], ARGV[2])
+return 1
+"""
+
+# KEYS: new, processing, pending, inflight; ARGV: lesson_id, now, ttl
+# Yangi belgilar processing ga qo'shiladi (oldingi urinishdan qolganlari bilan)
+_DRAIN_LUA = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('SUNIONSTORE', KEYS[2], KEYS[2], KEYS[1])
+    redis.call('DEL', KEYS[1])
+end
+redis.call('EXPIRE', KEYS[2], tonumber(ARGV[3]))
+redis.call('ZREM', KEYS[3], ARGV[1])
+redis.call('ZADD', KEYS[4], ARGV[2], ARGV[1])
+return redis.call('SMEMBERS', KEYS[2])
+"""
+
+_scripts: dict = {}
+
+
+class CheckInError(Exception):
+    """Belgini qabul qilib bo'lmaydi (dars topilmadi, oyna yopiq va h.k.)"""
+
+
+def _redis():
+    from apps.common.redis_client import get_redis
+
+    return get_redis("cache")
+
+
+def _script(name: str, source: str):
+    if name not in _scripts:
+        _scripts[name] = _redis().register_script(source)
+    return _scripts[name]
+
+
+def _seen_key(lesson_id) -> str:
+    return f"{KEY_PREFIX}:{lesson_id}:seen"
+
+
+def _new_key(lesson_id) -> str:
+    return f"{KEY_PREFIX}:{lesson_id}:new"
+
+
+def _processing_key(lesson_id) -> str:
+    return f"{KEY_PREFIX}:{lesson_id}:processing"
+
+
+def _lesson_meta(lesson_id) -> Optional[dict]:
+    """Dars ma'lumotlari jarayon ichidagi keshda: har bir belgida bazaga bormaslik uchun."""
+    key = f"{KEY_PREFIX}:lesson:{lesson_id}"
+    meta = local_cache.get(key)
+    if meta is None:
+        meta = Lesson.objects.filter(id=lesson_id, deleted_at__isnull=True).values(
+            'id', 'group_id', 'date', 'start_time', 'end_time', 'status',
+            'attendance_window_before', 'attendance_window_after',
+        ).first() or {}
+        local_cache.set(key, meta, settings.CHECKIN_META_CACHE_SECONDS)
+    return meta or None
+
+
+def _student_meta(user) -> Optional[dict]:
+    from apps.students.models import Student
+
+    key = f"{KEY_PREFIX}:student:{user.pk}"
+    meta = local_cache.get(key)
+    if meta is None:
+        meta = Student.objects.filter(user=user, deleted_at__isnull=True).values('id', 'group_id').first() or {}
+        local_cache.set(key, meta, settings.CHECKIN_META_CACHE_SECONDS)
+    return meta or None
+
+
+def _window(meta: dict) -> tuple[datetime, datetime]:
+    start = timezone.make_aware(datetime.combine(meta['date'], meta['start_time']))
+    end = timezone.make_aware(datetime.combine(meta['date'], meta['end_time']))
+    return (
+        start - timedelta(minutes=meta['attendance_window_before']),
+        end + timedelta(minutes=meta['attendance_window_after']),
+    )
+
+
+def check_in(user, lesson_id) -> bool:
+    """
+    Talabani darsga "keldi" deb belgilash.
+
+    Returns:
+        bool: True - yangi belgi, False - avval belgilangan
+    Raises:
+        CheckInError: talaba yoki dars mos kelmasa
+    """
+    student = _student_meta(user)
+    if not student:
+        raise CheckInError("Siz student emassiz")
+    lesson = _lesson_meta(lesson_id)
+    if not lesson or lesson['group_id'] != student['group_id']:
+        raise CheckInError("Dars topilmadi")
+    if lesson['status'] == 'cancelled':
+        raise CheckInError("Dars bekor qilingan")
+
+    now = timezone.now()
+    window_start, window_end = _window(lesson)
+    if not window_start <= now <= window_end:
+        raise CheckInError("Davomat oynasi yopiq")
+
+    # Kalitlar davomat oynasi tugagach ham takrorlarni ushlab turishi uchun
+    ttl = int((window_end - now).total_seconds()) + settings.CHECKIN_KEY_GRACE_SECONDS
+    try:
+        added = _script('check_in', _CHECK_IN_LUA)(
+            keys=[_seen_key(lesson['id']), _new_key(lesson['id']), PENDING_KEY],
+            args=[str(student['id']), str(lesson['id']), time.time(), ttl],
+        )
+        return bool(added)
+    except Exception:
+        logger.warning("Redis unavailable, check-in written directly", extra={"lesson_id": str(lesson_id)})
+
+    _, created = Attendance.objects.get_or_create(
+        lesson_id=lesson['id'],
+        student_id=student['id'],
+        defaults={'status': 'present', 'marked_by': user},
+    )
+    return created
+
+
+def remember_marked(lesson_id, student_ids) -> None:
+    """
+    Bazaga boshqa yo'l bilan yozilgan davomatni ``seen`` to'plamiga qo'shish.
+
+    Davomat oynasi yopilgan bo'lsa hech narsa qilinmaydi (belgi baribir rad etiladi).
+    """
+    student_ids = [str(student_id) for student_id in student_ids]
+    lesson = _lesson_meta(lesson_id) if student_ids else None
+    if not lesson:
+        return
+    now = timezone.now()
+    _, window_end = _window(lesson)
+    if now > window_end:
+        return
+    ttl = int((window_end - now).total_seconds()) + settings.CHECKIN_KEY_GRACE_SECONDS
+    try:
+        pipe = _redis().pipeline(transaction=False)
+        pipe.sadd(_seen_key(lesson['id']), *student_ids)
+        pipe.expire(_seen_key(lesson['id']), ttl)
+        pipe.execute()
+    except Exception:
+        logger.warning("Redis unavailable, check-in seen set not updated", extra={"lesson_id": str(lesson_id)})
+
+
+def drain_check_ins(window_seconds: Optional[float] = None) -> dict:
+    """
+    Oynasi o'tgan darslar buferini bazaga yozish.
+
+    Har bir dars uchun bitta bulk_create; statistikalar oxirida bir marta.
+    Processing kaliti commit dan keyin o'chiriladi, shuning uchun xato yoki
+    worker to'xtashi belgilarni yo'qotmaydi. ``created`` - haqiqatda
+    qo'shilgan yozuvlar (bazada bor talabalar tashlab ketiladi).
+    """
+    from apps.students.models import Student
+
+    if window_seconds is None:
+        window_seconds = settings.CHECKIN_DRAIN_WINDOW_SECONDS
+    client = _redis()
+    now = time.time()
+    lesson_ids = list(dict.fromkeys(
+        client.zrangebyscore(PENDING_KEY, '-inf', now - window_seconds)
+        # oldingi bo'shatish commit qilmasdan to'xtagan darslar
+        + client.zrangebyscore(INFLIGHT_KEY, '-inf', now - settings.CHECKIN_PROCESSING_TIMEOUT_SECONDS)
+    ))
+    drain = _script('drain', _DRAIN_LUA)
+    ttl = settings.CHECKIN_PROCESSING_TIMEOUT_SECONDS + settings.CHECKIN_KEY_GRACE_SECONDS
+
+    created, student_ids, drained = 0, set(), []
+    for lesson_id in lesson_ids:
+        members = drain(
+            keys=[_new_key(lesson_id), _processing_key(lesson_id), PENDING_KEY, INFLIGHT_KEY],
+            args=[lesson_id, time.time(), ttl],
+        )
+        if members:
+            try:
+                with transaction.atomic():
+                    existing = set(map(str, Attendance.objects.filter(
+                        lesson_id=lesson_id, student_id__in=members
+                    ).values_list('student_id', flat=True)))
+                    users = dict(
+                        Student.objects.filter(id__in=set(members) - existing).values_list('id', 'user_id')
+                    )
+                    Attendance.objects.bulk_create([
+                        Attendance(
+                            lesson_id=lesson_id,
+                            student_id=student_id,
+                            status='present',
+                            marked_by_id=user_id,
+                            notes="Talaba o'zi belgiladi",
+                        )
+                        for student_id, user_id in users.items()
+                    ], batch_size=500, ignore_conflicts=True)
+            except Exception:
+                # processing kaliti joyida qoladi; dars yana navbatga
+                logger.exception("Check-in drain failed, re-queued", extra={"lesson_id": lesson_id})
+                pipe = client.pipeline()
+                pipe.zadd(PENDING_KEY, {lesson_id: time.time()}, nx=True)
+                pipe.zrem(INFLIGHT_KEY, lesson_id)
+                pipe.execute()
+                continue
+            created += len(users)
+            student_ids.update(users)
+            drained.append(lesson_id)
+        pipe = client.pipeline()
+        pipe.delete(_processing_key(lesson_id))
+        pipe.zrem(INFLIGHT_KEY, lesson_id)
+        pipe.execute()
+
+    if student_ids:
+        bulk_update_attendance_statistics(student_ids)
+        invalidate_lesson_cache(Lesson.objects.filter(id__in=drained).values_list('group_id', flat=True))
+    return {"lessons": len(lesson_ids), "created": created}
@@ -0,0 +1,201 @@
+"""
+Dars jadvalidagi to'qnashuvlarni aniqlash.
+
+Bir o'qituvchi bir vaqtda ikki guruhda yoki bitta xona ikki dars uchun band
+bo'lishi mumkin emas. Band vaqtlar (day, teacher) va (day, room) kalitlari
+bo'yicha xotiradagi interval indeksiga joylanadi; indeks bitta so'rov
+natijasidan quriladi.
+"""
+from __future__ import annotations
+
+import heapq
+from bisect import bisect_left
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import time
+from typing import Any, Iterable, Optional
+
+from django.db.models import Q
+
+from .models import Schedule, Lesson
+
+
+RESOURCES = ('teacher', 'room')
+
+
+@dataclass(frozen=True)
+class Booking:
+    """Bitta band vaqt oralig'i (jadval yozuvi yoki dars)"""
+    ref: Any
+    day: Any  # Schedule uchun hafta kuni, Lesson uchun sana
+    start: time
+    end: time
+    group_id: Any = None
+    teacher_id: Any = None
+    room: str = ''
+
+    def resource_keys(self):
+        if self.teacher_id:
+            yield 'teacher', (self.day, 'teacher', self.teacher_id)
+        room = (self.room or '').strip().lower()
+        if room:
+            yield 'room', (self.day, 'room', room)
+
+    def overlaps(self, other: 'Booking') -> bool:
+        return self.start < other.end and other.start < self.end
+
+    def as_dict(self) -> dict:
+        return {
+            'id': str(self.ref) if self.ref is not None else None,
+            'day': self.day.isoformat() if hasattr(self.day, 'isoformat') else self.day,
+            'start_time': self.start.strftime('%H:%M'),
+            'end_time': self.end.strftime('%H:%M'),
+            'group_id': str(self.group_id) if self.group_id else None,
+            'teacher_id': str(self.teacher_id) if self.teacher_id else None,
+            'room': self.room,
+        }
+
+
+def _conflict(kind: str, first: Booking, second: Booking) -> dict:
+    return {'type': kind, 'first': first.as_dict(), 'second': second.as_dict()}
+
+
+class IntervalIndex:
+    """
+    (day, resource) bo'yicha boshlanish vaqtiga ko'ra saralangan intervallar.
+
+    Qurish O(n log n); har bir tekshiruv bisect + prefiks maksimum tugash vaqti
+    bo'yicha kesilgan orqaga skan, ya'ni O(log n + k).
+    """
+
+    def __init__(self, bookings: Iterable[Booking] = ()):
+        buckets = defaultdict(list)
+        for booking in bookings:
+            for _, key in booking.resource_keys():
+                buckets[key].append(booking)
+
+        self._buckets = {}
+        for key, items in buckets.items():
+            items.sort(key=lambda b: (b.start, b.end))
+            max_end, prefix = None, []
+            for item in items:
+                max_end = item.end if max_end is None or item.end > max_end else max_end
+                prefix.append(max_end)
+            self._buckets[key] = ([item.start for item in items], items, prefix)
+
+    def __len__(self):
+        return sum(len(items) for _, items, _ in self._buckets.values())
+
+    def overlapping(self, booking: Booking, exclude_ref: Any = None) -> list[dict]:
+        """Berilgan band vaqt bilan to'qnashadigan yozuvlar."""
+        conflicts = []
+        for kind, key in booking.resource_keys():
+            bucket = self._buckets.get(key)
+            if not bucket:
+                continue
+            starts, items, prefix = bucket
+            index = bisect_left(starts, booking.end)
+            for i in range(index - 1, -1, -1):
+                if prefix[i] <= booking.start:
+                    break
+                other = items[i]
+                if other.end > booking.start and (exclude_ref is None or other.ref != exclude_ref):
+                    conflicts.append(_conflict(kind, other, booking))
+        return conflicts
+
+    def check_many(self, bookings: Iterable[Booking]) -> list[dict]:
+        """Yangi yozuvlar to'plamini indeks bilan va o'zaro tekshirish."""
+        bookings = list(bookings)
+        conflicts = []
+        for booking in bookings:
+            conflicts.extend(self.overlapping(booking))
+        conflicts.extend(find_overlaps(bookings))
+        return conflicts
+
+
+def find_overlaps(bookings: Iterable[Booking]) -> list[dict]:
+    """Barcha o'zaro to'qnashuvlarni sweep-line bilan topish: O(n log n + k)."""
+    buckets = defaultdict(list)
+    for booking in bookings:
+        for kind, key in booking.resource_keys():
+            buckets[(kind, key)].append(booking)
+
+    conflicts = []
+    for (kind, _), items in buckets.items():
+        items.sort(key=lambda b: (b.start, b.end))
+        active: list = []  # (end, seq, booking) min-heap
+        for seq, booking in enumerate(items):
+            while active and active[0][0] <= booking.start:
+                heapq.heappop(active)
+            for _, _, other in active:
+                conflicts.append(_conflict(kind, other, booking))
+            heapq.heappush(active, (booking.end, seq, booking))
+    return conflicts
+
+
+def _resource_filter(teacher_ids: set, rooms: set) -> Optional[Q]:
+    condition = Q()
+    if teacher_ids:
+        condition |= Q(teacher_id__in=teacher_ids)
+    for room in rooms:
+        condition |= Q(room__iexact=room)
+    return condition or None
+
+
+def schedule_bookings(queryset) -> list[Booking]:
+    return [
+        Booking(
+            ref=row['id'], day=row['day_of_week'], start=row['start_time'], end=row['end_time'],
+            group_id=row['group_id'], teacher_id=row['teacher_id'], room=row['room'],
+        )
+        for row in queryset.values('id', 'day_of_week', 'start_time', 'end_time', 'group_id', 'teacher_id', 'room')
+    ]
+
+
+def lesson_bookings(queryset) -> list[Booking]:
+    return [
+        Booking(
+            ref=row['id'], day=row['date'], start=row['start_time'], end=row['end_time'],
+            group_id=row['group_id'], teacher_id=row['teacher_id'], room=row['room'],
+        )
+        for row in queryset.values('id', 'date', 'start_time', 'end_time', 'group_id', 'teacher_id', 'room')
+    ]
+
+
+def active_schedules():
+    return Schedule.objects.filter(deleted_at__isnull=True, is_active=True)
+
+
+def active_lessons():
+    return Lesson.objects.filter(deleted_at__isnull=True).exclude(status='cancelled')
+
+
+def _rooms_of(bookings: Iterable[Booking]) -> set:
+    return {b.room.strip() for b in bookings if b.room and b.room.strip()}
+
+
+def schedule_conflicts(booking: Booking) -> list[dict]:
+    """Bitta jadval yozuvini mavjud faol jadval bilan tekshirish (bitta so'rov)."""
+    condition = _resource_filter({booking.teacher_id} - {None}, _rooms_of([booking]))
+    if condition is None:
+        return []
+    existing = active_schedules().filter(condition, day_of_week=booking.day)
+    return IntervalIndex(schedule_bookings(existing)).overlapping(booking, exclude_ref=booking.ref)
+
+
+def lesson_conflicts(booking: Booking) -> list[dict]:
+    """Bitta darsni shu kundagi darslar bilan tekshirish (bitta so'rov)."""
+    condition = _resource_filter({booking.teacher_id} - {None}, _rooms_of([booking]))
+    if condition is None:
+        return []
+    existing = active_lessons().filter(condition, date=booking.day)
+    return IntervalIndex(lesson_bookings(existing)).overlapping(booking, exclude_ref=booking.ref)
+
+
+def lesson_batch_conflicts(bookings: list[Booking], start_date, end_date) -> list[dict]:
+    """Darslar to'plamini (masalan, butun semestr) bitta so'rov bilan tekshirish."""
+    condition = _resource_filter({b.teacher_id for b in bookings} - {None}, _rooms_of(bookings))
+    if condition is None:
+        return []
+    existing = active_lessons().filter(condition, date__gte=start_date, date__lte=end_date)
+    return IntervalIndex(lesson_bookings(existing)).check_many(bookings)
@@ -0,0 +1,138 @@
+"""
+Davomat jadvali (register): talabalar × darslar matritsasi.
+
+Guruh va sana oralig'i uchun darslar va davomat qaydlari bittadan so'rov
+bilan olinadi va ustunli (column-oriented) tuzilmaga aylantiriladi.
+"""
+from __future__ import annotations
+
+import tempfile
+from dataclasses import dataclass, field
+
+from .models import Lesson, Attendance
+
+
+# Holat kodlari: 0 - belgilanmagan, qolganlari Attendance.status bo'yicha
+STATUS_CODES = {
+    'present': 1,
+    'absent': 2,
+    'late': 3,
+    'excused': 4,
+}
+STATUS_LEGEND = {0: None, **{code: name for name, code in STATUS_CODES.items()}}
+
+# XLSX katakchalari uchun qisqa belgilar
+XLSX_SYMBOLS = {0: '', 1: '+', 2: '-', 3: 'K', 4: 'S'}
+
+
+@dataclass
+class AttendanceMatrix:
+    """Ustunli davomat matritsasi"""
+    lessons: list[dict] = field(default_factory=list)
+    students: list[dict] = field(default_factory=list)
+
+    def as_dict(self) -> dict:
+        return {
+            'legend': STATUS_LEGEND,
+            'lessons': self.lessons,
+            'students': self.students,
+        }
+
+
+def build_attendance_matrix(group_id, start_date, end_date, subject_id=None) -> AttendanceMatrix:
+    """
+    Guruh uchun davomat matritsasini qurish.
+
+    Darslar (ustunlar) va davomat qaydlari bittadan so'rov bilan olinadi;
+    qatorlar uchun guruh talabalari ham bitta yengil so'rov bilan o'qiladi,
+    shunda hali belgilanmagan talabalar ham jadvalda ko'rinadi.
+    """
+    from apps.students.models import Student
+
+    lessons_qs = Lesson.objects.filter(
+        group_id=group_id,
+        date__gte=start_date,
+        date__lte=end_date,
+        deleted_at__isnull=True,
+    )
+    if subject_id:
+        lessons_qs = lessons_qs.filter(subject_id=subject_id)
+
+    lessons = list(
+        lessons_qs.order_by('date', 'start_time').values(
+            'id', 'date', 'start_time', 'status', 'subject_id', 'subject__name'
+        )
+    )
+    column_of = {row['id']: index for index, row in enumerate(lessons)}
+
+    students = list(
+        Student.objects.filter(group_id=group_id, deleted_at__isnull=True)
+        .order_by('user__last_name', 'user__first_name')
+        .values('id', 'user__first_name', 'user__last_name')
+    )
+    row_of = {row['id']: index for index, row in enumerate(students)}
+    statuses = [[0] * len(lessons) for _ in students]
+
+    if lessons and students:
+        records = Attendance.objects.filter(
+            lesson__group_id=group_id,
+            lesson__date__gte=start_date,
+            lesson__date__lte=end_date,
+            lesson__deleted_at__isnull=True,
+            deleted_at__isnull=True,
+        )
+        if subject_id:
+            records = records.filter(lesson__subject_id=subject_id)
+
+        for lesson_id, student_id, status_name in records.values_list('lesson_id', 'student_id', 'status'):
+            row = row_of.get(student_id)
+            column = column_of.get(lesson_id)
+            if row is None or column is None:
+                # Guruhdan chiqarilgan talaba yoki filterdan tashqaridagi dars
+                continue
+            statuses[row][column] = STATUS_CODES.get(status_name, 0)
+
+    return AttendanceMatrix(
+        lessons=[
+            {
+                'id': str(row['id']),
+                'date': row['date'].isoformat(),
+                'start_time': row['start_time'].strftime('%H:%M'),
+                'status': row['status'],
+                'subject_id': str(row['subject_id']),
+                'subject_name': row['subject__name'],
+            }
+            for row in lessons
+        ],
+        students=[
+            {
+                'id': str(row['id']),
+                'full_name': f"{row['user__first_name']} {row['user__last_name']}".strip(),
+                'statuses': statuses[index],
+            }
+            for index, row in enumerate(students)
+        ],
+    )
+
+
+def write_matrix_xlsx(matrix: AttendanceMatrix, title: str = 'Davomat'):
+    """
+    Matritsani openpyxl write-only rejimida XLSX faylga yozish.
+
+    Qaytariladigan vaqtinchalik fayl boshiga qaytarilgan holda beriladi va
+    FileResponse orqali bo'laklab uzatiladi.
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title=title[:31])
+
+    sheet.append(['Talaba'] + [f"{lesson['date']} {lesson['start_time']}" for lesson in matrix.lessons])
+    sheet.append([''] + [lesson['subject_name'] for lesson in matrix.lessons])
+    for student in matrix.students:
+        sheet.append([student['full_name']] + [XLSX_SYMBOLS[code] for code in student['statuses']])
+
+    output = tempfile.TemporaryFile()
+    workbook.save(output)
+    output.seek(0)
+    return output
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from .models import Schedule, Lesson, Attendance, AttendanceStatistics
+from .conflicts import Booking, schedule_conflicts, lesson_conflicts
 from apps.students.serializers import StudentListSerializer, TeacherListSerializer
 from apps.quizzes.serializers import SubjectListSerializer
 
@@ -56,12 +57,33 @@ class ScheduleCreateUpdateSerializer(serializers.ModelSerializer):
         ]
     
     def validate(self, data):
-        """Vaqt validatsiyasi"""
+        """Vaqt va to'qnashuv validatsiyasi"""
         if data.get('start_time') and data.get('end_time'):
             if data['start_time'] >= data['end_time']:
                 raise serializers.ValidationError(
                     "Tugash vaqti boshlanish vaqtidan katta bo'lishi kerak"
                 )
+        
+        # Qisman yangilashda yetishmayotgan maydonlar mavjud yozuvdan olinadi
+        merged = {
+            field: data.get(field, getattr(self.instance, field, None))
+            for field in ['group', 'teacher', 'day_of_week', 'start_time', 'end_time', 'room', 'is_active']
+        }
+        if merged['is_active'] is not False and merged['start_time'] and merged['end_time']:
+            conflicts = schedule_conflicts(Booking(
+                ref=self.instance.pk if self.instance else None,
+                day=merged['day_of_week'],
+                start=merged['start_time'],
+                end=merged['end_time'],
+                group_id=merged['group'].pk if merged['group'] else None,
+                teacher_id=merged['teacher'].pk if merged['teacher'] else None,
+                room=merged['room'] or '',
+            ))
+            if conflicts:
+                raise serializers.ValidationError({
+                    'non_field_errors': ["O'qituvchi yoki xona bu vaqtda band"],
+                    'conflicts': conflicts,
+                })
         return data
 
 
@@ -89,6 +111,9 @@ class LessonListSerializer(serializers.ModelSerializer):
     
     def get_attendance_count(self, obj):
         """Davomat belgilangan talabalar soni"""
+        marked_count = getattr(obj, 'marked_count', None)
+        if marked_count is not None:
+            return marked_count
         return obj.attendances.filter(deleted_at__isnull=True).count()
 
 
@@ -128,7 +153,41 @@ class LessonDetailSerializer(serializers.ModelSerializer):
         }
 
 
-class LessonCreateSerializer(serializers.ModelSerializer):
+class LessonConflictValidationMixin:
+    """Dars vaqti va o'qituvchi/xona to'qnashuvi validatsiyasi (yaratish va yangilash)"""
+
+    def validate(self, data):
+        """Validatsiya"""
+        # Qisman yangilashda yetishmayotgan maydonlar mavjud yozuvdan olinadi
+        merged = {
+            field: data.get(field, getattr(self.instance, field, None))
+            for field in ['group', 'teacher', 'date', 'start_time', 'end_time', 'room', 'status']
+        }
+        if merged['start_time'] and merged['end_time']:
+            if merged['start_time'] >= merged['end_time']:
+                raise serializers.ValidationError(
+                    "Tugash vaqti boshlanish vaqtidan katta bo'lishi kerak"
+                )
+
+            if merged['status'] != 'cancelled':
+                conflicts = lesson_conflicts(Booking(
+                    ref=self.instance.pk if self.instance else None,
+                    day=merged['date'],
+                    start=merged['start_time'],
+                    end=merged['end_time'],
+                    group_id=merged['group'].pk if merged['group'] else None,
+                    teacher_id=merged['teacher'].pk if merged['teacher'] else None,
+                    room=merged['room'] or '',
+                ))
+                if conflicts:
+                    raise serializers.ValidationError({
+                        'non_field_errors': ["O'qituvchi yoki xona bu vaqtda band"],
+                        'conflicts': conflicts,
+                    })
+        return data
+
+
+class LessonCreateSerializer(LessonConflictValidationMixin, serializers.ModelSerializer):
     """Dars yaratish uchun serializer"""
     
     class Meta:
@@ -139,18 +198,9 @@ class LessonCreateSerializer(serializers.ModelSerializer):
             'status', 'related_quiz_subject', 'auto_attendance_enabled',
             'attendance_window_before', 'attendance_window_after'
         ]
-    
-    def validate(self, data):
-        """Validatsiya"""
-        if data.get('start_time') and data.get('end_time'):
-            if data['start_time'] >= data['end_time']:
-                raise serializers.ValidationError(
-                    "Tugash vaqti boshlanish vaqtidan katta bo'lishi kerak"
-                )
-        return data
 
 
-class LessonUpdateSerializer(serializers.ModelSerializer):
+class LessonUpdateSerializer(LessonConflictValidationMixin, serializers.ModelSerializer):
     """Dars yangilash uchun serializer"""
     
     class Meta:
@@ -325,3 +375,19 @@ class AttendanceReportSerializer(serializers.Serializer):
                 "Boshlanish sanasi tugash sanasidan katta bo'lmasligi kerak"
             )
         return data
+
+
+class AttendanceMatrixSerializer(serializers.Serializer):
+    """Davomat matritsasi (talabalar × darslar) uchun parametrlar"""
+    group_id = serializers.UUIDField(required=True)
+    start_date = serializers.DateField(required=True)
+    end_date = serializers.DateField(required=True)
+    subject_id = serializers.UUIDField(required=False)
+    
+    def validate(self, data):
+        """Validatsiya"""
+        if data['start_date'] > data['end_date']:
+            raise serializers.ValidationError(
+                "Boshlanish sanasi tugash sanasidan katta bo'lmasligi kerak"
+            )
+        return data
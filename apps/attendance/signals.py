@@ -1,8 +1,11 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models import Count, Q
+from django.db.models.signals import post_save, post_delete, pre_save
 from django.dispatch import receiver
 from django.utils import timezone
 from apps.quizzes.models import Quiz
 from .models import Lesson, Attendance, AttendanceStatistics
+from .cache import current_week, invalidate_lesson_cache
 
 
 @receiver(post_save, sender=Quiz)
@@ -65,6 +68,15 @@ def update_statistics_on_attendance(sender, instance, created, **kwargs):
         update_attendance_statistics(instance.student, instance.lesson.subject)
 
 
+@receiver(post_save, sender=Attendance)
+def remember_attendance_for_check_in(sender, instance, created, **kwargs):
+    """Talaba o'zini belgilamoqchi bo'lsa "avval belgilangan" javobi Redis dan qaytadi"""
+    if created:
+        from .checkin import remember_marked
+
+        transaction.on_commit(lambda: remember_marked(instance.lesson_id, [instance.student_id]))
+
+
 def update_attendance_statistics(student, subject):
     """
     Talabaning davomat statistikasini yangilash
@@ -108,3 +120,87 @@ def update_attendance_statistics(student, subject):
     overall_stats.late_count = all_attendances.filter(status='late').count()
     overall_stats.excused_count = all_attendances.filter(status='excused').count()
     overall_stats.calculate_rate()
+
+
+def bulk_update_attendance_statistics(student_ids):
+    """
+    Bir nechta talaba statistikasini to'plam (set-based) so'rovlar bilan yangilash.
+
+    bulk_create post_save signalini chaqirmaydi, shuning uchun ommaviy
+    davomat yozuvlaridan keyin statistikani shu funksiya bilan bir marta
+    qayta hisoblash kerak.
+    """
+    student_ids = set(student_ids)
+    if not student_ids:
+        return
+
+    counters = {
+        'total_lessons': Count('id'),
+        'present_count': Count('id', filter=Q(status='present')),
+        'absent_count': Count('id', filter=Q(status='absent')),
+        'late_count': Count('id', filter=Q(status='late')),
+        'excused_count': Count('id', filter=Q(status='excused')),
+    }
+    attendances = Attendance.objects.filter(student_id__in=student_ids, deleted_at__isnull=True)
+
+    # (student_id, subject_id) -> hisoblagichlar; subject_id=None - umumiy statistika
+    rows = {}
+    for row in attendances.values('student_id', 'lesson__subject_id').annotate(**counters).order_by():
+        rows[(row['student_id'], row['lesson__subject_id'])] = row
+    for row in attendances.values('student_id').annotate(**counters).order_by():
+        rows[(row['student_id'], None)] = row
+
+    existing = {
+        (stats.student_id, stats.subject_id): stats
+        for stats in AttendanceStatistics.objects.filter(student_id__in=student_ids)
+    }
+
+    now = timezone.now()
+    to_create, to_update = [], []
+    for (student_id, subject_id), row in rows.items():
+        stats = existing.get((student_id, subject_id))
+        if stats is None:
+            stats = AttendanceStatistics(student_id=student_id, subject_id=subject_id)
+            to_create.append(stats)
+        else:
+            to_update.append(stats)
+        for field in counters:
+            setattr(stats, field, row[field])
+        stats.attendance_rate = (
+            (stats.present_count / stats.total_lessons) * 100 if stats.total_lessons > 0 else 0.0
+        )
+        stats.last_updated = now
+        stats.updated_at = now
+
+    fields = list(counters) + ['attendance_rate', 'last_updated', 'updated_at']
+    if to_update:
+        AttendanceStatistics.objects.bulk_update(to_update, fields, batch_size=500)
+    if to_create:
+        AttendanceStatistics.objects.bulk_create(to_create, batch_size=500)
+
+
+@receiver(pre_save, sender=Lesson)
+def remember_lesson_group(sender, instance, raw=False, **kwargs):
+    """Dars boshqa guruhga ko'chirilsa eski guruh keshini ham tozalash uchun"""
+    if raw or instance._state.adding:
+        return
+    instance._previous_group_id = Lesson.objects.filter(pk=instance.pk).values_list(
+        'group_id', flat=True
+    ).first()
+
+
+@receiver(post_save, sender=Lesson)
+@receiver(post_delete, sender=Lesson)
+def invalidate_lesson_cache_on_lesson_change(sender, instance, **kwargs):
+    """Bugungi/haftalik darslar keshini tozalash"""
+    invalidate_lesson_cache({instance.group_id, getattr(instance, '_previous_group_id', None)})
+
+
+@receiver(post_save, sender=Attendance)
+@receiver(post_delete, sender=Attendance)
+def invalidate_lesson_cache_on_attendance_change(sender, instance, **kwargs):
+    """attendance_count o'zgaradi; faqat joriy haftadagi darslar keshlanadi"""
+    lesson = instance.lesson
+    week_start, week_end = current_week()
+    if week_start <= lesson.date <= week_end:
+        invalidate_lesson_cache({lesson.group_id})
@@ -0,0 +1,286 @@
+from __future__ import annotations
+
+import logging
+from datetime import timedelta
+from functools import partial
+
+from celery import shared_task
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Lesson, Attendance, Schedule
+from .signals import bulk_update_attendance_statistics
+from .absence import find_chronically_absent_students
+from .cache import current_week, invalidate_lesson_cache, warm_lesson_cache
+from .checkin import drain_check_ins, remember_marked
+
+logger = logging.getLogger(__name__)
+
+
+def _auto_mark_absent(lesson_ids: list) -> int:
+    """Belgilanmagan talabalarni `absent` deb bitta bulk_create bilan belgilash.
+
+    Returns:
+        int: haqiqatda qo'shilgan yozuvlar soni
+    """
+    from apps.students.models import Student
+
+    lessons = dict(Lesson.objects.filter(id__in=lesson_ids).values_list('id', 'group_id'))
+    if not lessons:
+        return 0
+
+    students_by_group: dict = {}
+    for student_id, group_id in Student.objects.filter(
+        group_id__in=set(lessons.values()),
+        deleted_at__isnull=True,
+    ).values_list('id', 'group_id'):
+        students_by_group.setdefault(group_id, []).append(student_id)
+
+    with transaction.atomic():
+        # unique_together (lesson, student) soft-delete qilingan yozuvlarga ham tegishli
+        marked = set(Attendance.objects.filter(lesson_id__in=lessons).values_list('lesson_id', 'student_id'))
+        new_records = [
+            Attendance(
+                lesson_id=lesson_id,
+                student_id=student_id,
+                status='absent',
+                is_auto_marked=True,
+                notes='Dars tugagach avtomatik belgilandi',
+            )
+            for lesson_id, group_id in lessons.items()
+            for student_id in students_by_group.get(group_id, ())
+            if (lesson_id, student_id) not in marked
+        ]
+        if not new_records:
+            return 0
+        Attendance.objects.bulk_create(new_records, batch_size=500, ignore_conflicts=True)
+        # ignore_conflicts parallel (o'qituvchi, "keldim") yozilganlarni jim tashlab ketadi:
+        # faqat haqiqatda qo'shilgan avtomatik yozuvlar sanaladi
+        inserted = set(Attendance.objects.filter(
+            lesson_id__in=lessons, is_auto_marked=True, status='absent'
+        ).values_list('lesson_id', 'student_id')) - marked
+        if not inserted:
+            return 0
+        bulk_update_attendance_statistics({student_id for _, student_id in inserted})
+        invalidate_lesson_cache(lessons.values())
+        marked_by_lesson: dict = {}
+        for lesson_id, student_id in inserted:
+            marked_by_lesson.setdefault(lesson_id, []).append(student_id)
+        for lesson_id, student_ids in marked_by_lesson.items():
+            # davomat oynasi hali ochiq bo'lsa talabaning belgisi Redis da rad etiladi
+            transaction.on_commit(partial(remember_marked, lesson_id, student_ids))
+    return len(inserted)
+
+
+@shared_task(bind=True)
+def advance_lesson_statuses_task(self, auto_mark_absent: bool | None = None) -> dict:
+    """Vaqti o'tgan darslar holatini ommaviy UPDATE bilan yangilash.
+
+    - scheduled -> ongoing: bugungi, boshlangan, lekin hali tugamagan darslar
+    - scheduled/ongoing -> completed: o'tgan kunlardagi va bugun tugagan darslar
+
+    Args:
+        auto_mark_absent: tugagan darslarda belgilanmagan talabalarni `absent`
+            deb belgilash (default: LESSON_AUTO_ABSENT_ENABLED)
+    Returns:
+        dict: yangilangan darslar va yaratilgan davomat yozuvlari soni
+    """
+    if auto_mark_absent is None:
+        auto_mark_absent = settings.LESSON_AUTO_ABSENT_ENABLED
+
+    now = timezone.localtime()
+    today, current_time = now.date(), now.time()
+    active = Lesson.objects.filter(deleted_at__isnull=True, status__in=['scheduled', 'ongoing'])
+    finished_today = active.filter(date=today, end_time__lte=current_time)
+
+    completed_ids = []
+    if auto_mark_absent:
+        # Faqat yaqinda tugagan darslar: funksiya yoqilganda butun tarix belgilanib ketmasligi uchun
+        lookback = today - timedelta(days=settings.LESSON_AUTO_ABSENT_LOOKBACK_DAYS)
+        completed_ids = list(
+            active.filter(date__gte=lookback, date__lt=today).values_list('id', flat=True)
+        ) + list(finished_today.values_list('id', flat=True))
+
+    # UPDATE signallarni chaqirmaydi: joriy haftada holati o'zgaradigan guruhlar keshi tozalanadi
+    week_start, _ = current_week(today)
+    changed_groups = set(
+        active.filter(date__gte=week_start).filter(
+            Q(date__lt=today)
+            | Q(date=today, end_time__lte=current_time)
+            | Q(date=today, status='scheduled', start_time__lte=current_time)
+        ).values_list('group_id', flat=True).distinct()
+    )
+
+    # Sana bo'yicha guruhlangan UPDATE lar. "Kelmadi" belgilash bilan bitta tranzaksiyada:
+    # u muvaffaqiyatsiz bo'lsa darslar ham tugallanmaydi va keyingi ishga tushirish qayta urinadi
+    with transaction.atomic():
+        completed = active.filter(date__lt=today).update(status='completed', updated_at=now)
+        completed += finished_today.update(status='completed', updated_at=now)
+        started = active.filter(
+            date=today,
+            status='scheduled',
+            start_time__lte=current_time,
+            end_time__gt=current_time,
+        ).update(status='ongoing', updated_at=now)
+
+        absent_marked = _auto_mark_absent(completed_ids) if completed_ids else 0
+    if changed_groups:
+        invalidate_lesson_cache(changed_groups)
+
+    if completed or started or absent_marked:
+        logger.info(
+            "Lesson statuses advanced",
+            extra={"completed": completed, "started": started, "absent_marked": absent_marked},
+        )
+    return {"completed": completed, "started": started, "absent_marked": absent_marked}
+
+
+@shared_task(bind=True)
+def warm_lesson_cache_task(self) -> dict:
+    """Yarim tunda bugungi va haftalik darslar keshini oldindan to'ldirish.
+
+    Ertalabki so'rovlar oqimi bazaga tushmasligi uchun barcha guruhlar
+    javoblari bitta so'rov natijasidan tayyorlanadi.
+
+    Returns:
+        dict: keshga yozilgan kalitlar soni
+    """
+    warmed = warm_lesson_cache()
+    logger.info("Lesson cache warmed", extra={"keys": warmed})
+    return {"warmed": warmed}
+
+
+@shared_task(bind=True)
+def drain_check_ins_task(self) -> dict:
+    """Redis'dagi "keldim" belgilarini bazaga yozish.
+
+    Oyna ichidagi belgilar dars bo'yicha to'planib, bitta bulk_create bilan
+    saqlanadi; statistika barcha talabalar uchun bir marta yangilanadi.
+
+    Returns:
+        dict: ko'rilgan darslar va yaratilgan davomat yozuvlari soni
+    """
+    result = drain_check_ins()
+    if result["created"]:
+        logger.info("Check-ins drained", extra=result)
+    return result
+
+
+def _absence_alert_key(student_id) -> str:
+    return f"absence_alert:{student_id}"
+
+
+def _claim_absence_alerts(student_ids: list) -> list:
+    """Qayta ishga tushirishda spam bo'lmasligi uchun har bir talabaga alert TTL ichida bir marta."""
+    from apps.common.redis_client import get_redis
+
+    ttl = settings.CHRONIC_ABSENCE_ALERT_TTL_SECONDS
+    try:
+        pipe = get_redis("cache").pipeline(transaction=False)
+        for student_id in student_ids:
+            pipe.set(_absence_alert_key(student_id), "1", nx=True, ex=ttl)
+        claimed = pipe.execute()
+    except Exception:
+        logger.warning("Redis unavailable, chronic absence alerts are not throttled")
+        return list(student_ids)
+    return [student_id for student_id, ok in zip(student_ids, claimed) if ok]
+
+
+def _release_absence_alerts(student_ids) -> None:
+    """Yuborilmagan alertlar belgisini o'chirish - keyingi ishga tushirishda qayta yuboriladi."""
+    from apps.common.redis_client import get_redis
+
+    if not student_ids:
+        return
+    try:
+        get_redis("cache").delete(*[_absence_alert_key(student_id) for student_id in student_ids])
+    except Exception:
+        logger.warning("Redis unavailable, chronic absence alert claims not released")
+
+
+def _format_reason(info: dict) -> str:
+    reasons = []
+    if info['streak']:
+        reasons.append(f"ketma-ket {info['streak']} ta dars qoldirgan")
+    if info['attendance_rate'] is not None:
+        reasons.append(f"davomat {info['attendance_rate']:.0f}%")
+    return ", ".join(reasons)
+
+
+@shared_task(bind=True)
+def detect_chronic_absence_task(self) -> dict:
+    """Surunkali davomatsizlikni aniqlash va o'qituvchilarga xabar yuborish.
+
+    Har bir o'qituvchiga o'z guruhlaridagi belgilangan talabalar ro'yxati bitta
+    xabar bilan yuboriladi; talabaning o'ziga ham alohida eslatma boradi.
+
+    Returns:
+        dict: aniqlangan, xabar berilgan talabalar va yuborilgan xabarlar soni
+    """
+    from apps.students.models import Student
+    from apps.common.tasks_alerts import send_telegram_alert_task
+
+    flagged = find_chronically_absent_students(
+        rate_threshold=settings.CHRONIC_ABSENCE_RATE_THRESHOLD,
+        min_lessons=settings.CHRONIC_ABSENCE_MIN_LESSONS,
+        min_streak=settings.CHRONIC_ABSENCE_STREAK,
+    )
+    student_ids = _claim_absence_alerts(sorted(flagged, key=str)) if flagged else []
+    if not student_ids:
+        return {"flagged": len(flagged), "notified": 0, "messages": 0}
+
+    students = list(
+        Student.objects.filter(id__in=student_ids, deleted_at__isnull=True).values(
+            'id', 'group_id', 'group__name', 'user__first_name', 'user__last_name', 'user__bot_user__user_id'
+        )
+    )
+    teachers_by_group: dict = {}
+    for group_id, chat_id in Schedule.objects.filter(
+        group_id__in={row['group_id'] for row in students if row['group_id']},
+        is_active=True,
+        deleted_at__isnull=True,
+        teacher__user__bot_user__isnull=False,
+    ).values_list('group_id', 'teacher__user__bot_user__user_id').distinct():
+        teachers_by_group.setdefault(group_id, set()).add(chat_id)
+
+    lines_by_teacher: dict = {}
+    students_by_teacher: dict = {}
+    messages = 0
+    undelivered = set()
+
+    def send(text: str, chat_id, ids: list) -> None:
+        # Vazifa navbatga qo'yilmasa yoki oxirgi urinish ham muvaffaqiyatsiz bo'lsa
+        # belgi o'chiriladi, aks holda alert butun TTL davomida bostirilib qoladi.
+        nonlocal messages
+        try:
+            send_telegram_alert_task.delay(
+                text, chat_ids=[chat_id], release_keys=[_absence_alert_key(i) for i in ids]
+            )
+            messages += 1
+        except Exception:
+            logger.warning("Chronic absence alert not enqueued", exc_info=True, extra={"chat_id": chat_id})
+            undelivered.update(ids)
+
+    for row in students:
+        full_name = f"{row['user__first_name']} {row['user__last_name']}".strip()
+        reason = _format_reason(flagged[row['id']])
+        for chat_id in teachers_by_group.get(row['group_id'], ()):
+            lines_by_teacher.setdefault(chat_id, []).append(f"• {full_name} ({row['group__name']}): {reason}")
+            students_by_teacher.setdefault(chat_id, []).append(str(row['id']))
+        if settings.CHRONIC_ABSENCE_NOTIFY_STUDENTS and row['user__bot_user__user_id']:
+            send(
+                f"{full_name}, davomatingiz bo'yicha ogohlantirish.\n"
+                f"Sabab: {reason}.\n"
+                "Iltimos, darslarga muntazam qatnashing.",
+                row['user__bot_user__user_id'],
+                [str(row['id'])],
+            )
+
+    for chat_id, lines in lines_by_teacher.items():
+        send("Davomati past talabalar:\n" + "\n".join(lines), chat_id, students_by_teacher[chat_id])
+
+    _release_absence_alerts(sorted(undelivered))
+    logger.info("Chronic absence alerts sent", extra={"flagged": len(flagged), "messages": messages})
+    return {"flagged": len(flagged), "notified": len(students), "messages": messages}
@@ -1 +1,413 @@
 # Test signals
+from datetime import date, time, timedelta
+from unittest import mock
+
+import fakeredis
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from auth.users.models import User
+from apps.students.models import StudentGroup
+from apps.quizzes.models import Subject
+from .models import Lesson, Attendance, AttendanceStatistics, Schedule
+from .matrix import build_attendance_matrix, write_matrix_xlsx
+from .tasks import advance_lesson_statuses_task, detect_chronic_absence_task
+from .absence import find_chronically_absent_students
+from .conflicts import Booking, IntervalIndex, find_overlaps
+from .cache import lesson_list_queryset, render_lessons
+
+
+class AttendanceMatrixTests(TestCase):
+    def setUp(self):
+        self.group = StudentGroup.objects.create(name="9-A", grade=9)
+        self.subject = Subject.objects.create(name="Fizika")
+        self.students = []
+        for i, name in enumerate(["Ali", "Vali", "Soli"]):
+            user = User.objects.create_user(phone_number=f"+99890000000{i}", first_name=name, last_name="Test")
+            student = user.student_profile
+            student.group = self.group
+            student.save()
+            self.students.append(student)
+        self.lessons = [
+            Lesson.objects.create(
+                group=self.group, subject=self.subject, date=date(2025, 9, day),
+                start_time=time(9, 0), end_time=time(9, 45),
+            )
+            for day in (1, 2)
+        ]
+        Attendance.objects.create(lesson=self.lessons[0], student=self.students[0], status='present')
+        Attendance.objects.create(lesson=self.lessons[1], student=self.students[0], status='late')
+        Attendance.objects.create(lesson=self.lessons[0], student=self.students[1], status='absent')
+
+    def test_matrix_pivots_statuses_per_student(self):
+        with self.assertNumQueries(3):
+            matrix = build_attendance_matrix(self.group.id, date(2025, 9, 1), date(2025, 9, 30))
+
+        self.assertEqual([lesson['id'] for lesson in matrix.lessons], [str(lesson.id) for lesson in self.lessons])
+        rows = {row['id']: row['statuses'] for row in matrix.students}
+        self.assertEqual(rows[str(self.students[0].id)], [1, 3])
+        self.assertEqual(rows[str(self.students[1].id)], [2, 0])
+        self.assertEqual(rows[str(self.students[2].id)], [0, 0])
+
+    def test_matrix_xlsx_export(self):
+        from openpyxl import load_workbook
+
+        matrix = build_attendance_matrix(self.group.id, date(2025, 9, 1), date(2025, 9, 30))
+        sheet = load_workbook(write_matrix_xlsx(matrix)).active
+        self.assertEqual(sheet.max_row, 2 + len(self.students))
+        self.assertEqual(sheet.max_column, 1 + len(self.lessons))
+
+
+class LessonStatusTransitionTests(TestCase):
+    def setUp(self):
+        self.group = StudentGroup.objects.create(name="10-B", grade=10)
+        self.subject = Subject.objects.create(name="Kimyo")
+        self.student = User.objects.create_user(phone_number="+998901111111").student_profile
+        self.student.group = self.group
+        self.student.save()
+        yesterday = timezone.localdate() - timedelta(days=1)
+        self.past_lesson = Lesson.objects.create(
+            group=self.group, subject=self.subject, date=yesterday,
+            start_time=time(9, 0), end_time=time(9, 45),
+        )
+        self.future_lesson = Lesson.objects.create(
+            group=self.group, subject=self.subject, date=yesterday + timedelta(days=7),
+            start_time=time(9, 0), end_time=time(9, 45),
+        )
+
+    def test_past_lessons_are_completed_and_absentees_marked(self):
+        result = advance_lesson_statuses_task.apply(kwargs={'auto_mark_absent': True}).get()
+
+        self.assertEqual(result['completed'], 1)
+        self.assertEqual(result['absent_marked'], 1)
+        self.past_lesson.refresh_from_db()
+        self.future_lesson.refresh_from_db()
+        self.assertEqual(self.past_lesson.status, 'completed')
+        self.assertEqual(self.future_lesson.status, 'scheduled')
+        attendance = Attendance.objects.get(lesson=self.past_lesson, student=self.student)
+        self.assertEqual(attendance.status, 'absent')
+        stats = AttendanceStatistics.objects.get(student=self.student, subject=None)
+        self.assertEqual((stats.total_lessons, stats.absent_count, stats.attendance_rate), (1, 1, 0.0))
+
+        # Qayta ishga tushirish hech narsani o'zgartirmaydi
+        result = advance_lesson_statuses_task.apply(kwargs={'auto_mark_absent': True}).get()
+        self.assertEqual((result['completed'], result['absent_marked']), (0, 0))
+
+    def test_lessons_stay_open_when_absent_marking_fails(self):
+        with mock.patch.object(Attendance.objects, 'bulk_create', side_effect=RuntimeError("db down")):
+            with self.assertRaises(RuntimeError):
+                advance_lesson_statuses_task.apply(kwargs={'auto_mark_absent': True}, throw=True)
+
+        self.past_lesson.refresh_from_db()
+        self.assertEqual(self.past_lesson.status, 'scheduled')  # keyingi ishga tushirish qayta urinadi
+        result = advance_lesson_statuses_task.apply(kwargs={'auto_mark_absent': True}).get()
+        self.assertEqual((result['completed'], result['absent_marked']), (1, 1))
+
+    def test_concurrently_marked_student_not_counted(self):
+        classmate = User.objects.create_user(phone_number="+998901111112").student_profile
+        classmate.group = self.group
+        classmate.save()
+        bulk_create = Attendance.objects.bulk_create
+
+        def teacher_marks_first(records, **kwargs):
+            # o'qituvchi mavjud yozuvlar o'qilgandan keyin, bulk_create dan oldin belgiladi
+            Attendance.objects.create(lesson=self.past_lesson, student=self.student, status='late')
+            return bulk_create(records, **kwargs)
+
+        with mock.patch.object(Attendance.objects, 'bulk_create', side_effect=teacher_marks_first):
+            result = advance_lesson_statuses_task.apply(kwargs={'auto_mark_absent': True}).get()
+
+        self.assertEqual(result['absent_marked'], 1)
+        self.assertEqual(Attendance.objects.get(lesson=self.past_lesson, student=self.student).status, 'late')
+        self.assertEqual(Attendance.objects.get(lesson=self.past_lesson, student=classmate).status, 'absent')
+
+
+class ChronicAbsenceDetectionTests(TestCase):
+    def setUp(self):
+        self.group = group = StudentGroup.objects.create(name="11-A", grade=11)
+        self.subject = subject = Subject.objects.create(name="Tarix")
+        self.regular, self.truant = [
+            User.objects.create_user(phone_number=f"+99890222222{i}").student_profile for i in range(2)
+        ]
+        statuses = {
+            self.regular: ['absent', 'absent', 'present', 'absent'],
+            self.truant: ['present', 'absent', 'absent', 'absent'],
+        }
+        for day in range(4):
+            lesson = Lesson.objects.create(
+                group=group, subject=subject, date=date(2025, 10, day + 1),
+                start_time=time(10, 0), end_time=time(10, 45),
+            )
+            for student, marks in statuses.items():
+                Attendance.objects.create(lesson=lesson, student=student, status=marks[day])
+
+    def test_detects_trailing_absence_streak_and_low_rate(self):
+        flagged = find_chronically_absent_students(rate_threshold=30, min_lessons=4, min_streak=3)
+
+        self.assertEqual(set(flagged), {self.regular.id, self.truant.id})
+        self.assertEqual(flagged[self.truant.id]['streak'], 3)
+        self.assertEqual(flagged[self.truant.id]['attendance_rate'], 25.0)
+        # 'regular' faqat oxirgi bitta darsni qoldirgan, lekin foizi past
+        self.assertEqual(flagged[self.regular.id], {'attendance_rate': 25.0, 'streak': 0})
+
+    @override_settings(
+        CHRONIC_ABSENCE_RATE_THRESHOLD=30, CHRONIC_ABSENCE_MIN_LESSONS=4,
+        CHRONIC_ABSENCE_STREAK=3, CHRONIC_ABSENCE_NOTIFY_STUDENTS=True,
+    )
+    def test_alert_claim_released_when_not_enqueued(self):
+        from apps.botapp.models import BotUser
+
+        for chat_id, student in (('501', self.regular), ('502', self.truant)):
+            student.user.bot_user = BotUser.objects.create(user_id=chat_id)
+            student.user.save()
+        redis = fakeredis.FakeRedis(decode_responses=True)
+
+        def delay(text, chat_ids, release_keys):
+            if chat_ids == ['502']:
+                raise ConnectionError("broker down")
+
+        with mock.patch('apps.common.redis_client.get_redis', return_value=redis), \
+                mock.patch('apps.common.tasks_alerts.send_telegram_alert_task.delay', side_effect=delay) as sent, \
+                self.assertLogs('apps.attendance.tasks', 'WARNING'):
+            result = detect_chronic_absence_task.apply().get()
+
+        self.assertEqual(result['messages'], 1)
+        release = {tuple(call.kwargs['chat_ids']): call.kwargs['release_keys'] for call in sent.call_args_list}
+        self.assertEqual(release[('501',)], [f"absence_alert:{self.regular.id}"])
+        self.assertTrue(redis.exists(f"absence_alert:{self.regular.id}"))
+        self.assertFalse(redis.exists(f"absence_alert:{self.truant.id}"))  # keyingi kecha qayta yuboriladi
+
+    @override_settings(
+        CHRONIC_ABSENCE_RATE_THRESHOLD=30, CHRONIC_ABSENCE_MIN_LESSONS=4,
+        CHRONIC_ABSENCE_STREAK=3, CHRONIC_ABSENCE_NOTIFY_STUDENTS=False,
+    )
+    def test_every_teacher_of_group_gets_alert(self):
+        from apps.botapp.models import BotUser
+        from apps.common.tasks_alerts import send_telegram_alert_task
+
+        for student in (self.regular, self.truant):
+            student.group = self.group
+            student.save()
+        for i, chat_id in enumerate(('601', '602')):
+            teacher = User.objects.create_user(
+                phone_number=f"+99890333333{i}", user_type='teacher',
+                bot_user=BotUser.objects.create(user_id=chat_id),
+            ).teacher_profile
+            Schedule.objects.create(
+                group=self.group, subject=self.subject, teacher=teacher, day_of_week='monday',
+                start_time=time(8 + i, 0), end_time=time(8 + i, 45),
+            )
+        redis = fakeredis.FakeRedis(decode_responses=True)
+
+        def delay(text, chat_ids, release_keys):
+            send_telegram_alert_task.apply(args=(text,), kwargs={'chat_ids': chat_ids, 'release_keys': release_keys})
+
+        with mock.patch('apps.common.redis_client.get_redis', return_value=redis), \
+                mock.patch('apps.common.tasks_alerts.get_redis', return_value=redis), \
+                mock.patch.dict('os.environ', {'BOT_TOKEN': '123:abc'}), \
+                mock.patch('apps.common.tasks_alerts.telegram_send_many', return_value={'failed': []}) as send_many, \
+                mock.patch('apps.common.tasks_alerts.send_telegram_alert_task.delay', side_effect=delay):
+            result = detect_chronic_absence_task.apply().get()
+
+        self.assertEqual(result['messages'], 2)
+        # bir xil matn, lekin har bir o'qituvchiga alohida yetkaziladi
+        self.assertEqual(sorted(call.args[1] for call in send_many.call_args_list), [['601'], ['602']])
+        self.assertEqual(send_many.call_args_list[0].args[2], send_many.call_args_list[1].args[2])
+
+
+class IntervalIndexTests(SimpleTestCase):
+    def booking(self, ref, start, end, teacher=None, room=''):
+        return Booking(ref=ref, day='monday', start=time(*start), end=time(*end), teacher_id=teacher, room=room)
+
+    def test_overlapping_by_teacher_and_room(self):
+        index = IntervalIndex([
+            self.booking('a', (8, 0), (9, 0), teacher=1, room='101'),
+            self.booking('b', (9, 0), (10, 0), teacher=1, room='102'),
+            self.booking('c', (8, 0), (12, 0), teacher=2, room='Lab'),
+        ])
+        conflicts = index.overlapping(self.booking('new', (8, 30), (9, 30), teacher=1, room='lab'))
+        found = {(conflict['type'], conflict['first']['id']) for conflict in conflicts}
+        self.assertEqual(found, {('teacher', 'a'), ('teacher', 'b'), ('room', 'c')})
+
+        # Chegaralar tegib turishi to'qnashuv emas
+        self.assertEqual(index.overlapping(self.booking('x', (10, 0), (11, 0), teacher=1)), [])
+        # O'zini o'zi bilan solishtirmaslik
+        self.assertEqual(index.overlapping(self.booking('a', (8, 0), (9, 0), teacher=1), exclude_ref='a'), [])
+
+    def test_find_overlaps_sweep(self):
+        bookings = [
+            self.booking(1, (8, 0), (10, 0), teacher=7),
+            self.booking(2, (9, 0), (9, 30), teacher=7),
+            self.booking(3, (9, 15), (11, 0), teacher=7),
+            self.booking(4, (11, 0), (12, 0), teacher=7),
+        ]
+        pairs = {(c['first']['id'], c['second']['id']) for c in find_overlaps(bookings)}
+        self.assertEqual(pairs, {('1', '2'), ('1', '3'), ('2', '3')})
+
+
+@override_settings(LESSON_CACHE_ENABLED=False)
+class TodayLessonsTests(TestCase):
+    def setUp(self):
+        from rest_framework.test import APIClient
+
+        self.group = StudentGroup.objects.create(name="8-C", grade=8)
+        subject = Subject.objects.create(name="Biologiya")
+        student = User.objects.create_user(phone_number="+998903333333").student_profile
+        self.lessons = [
+            Lesson.objects.create(
+                group=self.group, subject=subject, date=timezone.localdate(),
+                start_time=time(hour, 0), end_time=time(hour, 45),
+            )
+            for hour in (9, 10)
+        ]
+        Attendance.objects.create(lesson=self.lessons[0], student=student, status='present')
+        self.client = APIClient()
+        self.client.force_authenticate(student.user)
+
+    def test_today_renders_counts_in_one_query(self):
+        with self.assertNumQueries(1):
+            body = render_lessons(lesson_list_queryset().filter(group=self.group))
+
+        response = self.client.get('/api/attendance/lessons/today/', {'group_id': str(self.group.id)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, body)
+        counts = {row['id']: row['attendance_count'] for row in response.json()}
+        self.assertEqual(counts, {str(self.lessons[0].id): 1, str(self.lessons[1].id): 0})
+
+
+class CheckInTests(TestCase):
+    def setUp(self):
+        from rest_framework.test import APIClient
+
+        group = StudentGroup.objects.create(name="7-D", grade=7)
+        now = timezone.localtime()
+        self.lesson = Lesson.objects.create(
+            group=group, subject=Subject.objects.create(name="Ingliz tili"), date=now.date(),
+            start_time=time(0, 0), end_time=time(23, 59),
+        )
+        self.student = User.objects.create_user(phone_number="+998904444444").student_profile
+        self.student.group = group
+        self.student.save()
+        self.client = APIClient()
+        self.client.force_authenticate(self.student.user)
+
+    def test_check_in_falls_back_to_database_without_redis(self):
+        url = f'/api/attendance/lessons/{self.lesson.id}/check_in/'
+        with mock.patch('apps.attendance.checkin._script', side_effect=ConnectionError):
+            first = self.client.post(url)
+            second = self.client.post(url)
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.json()['already_checked_in'], True)
+        self.assertEqual(Attendance.objects.filter(lesson=self.lesson, student=self.student).count(), 1)
+
+    def buffered(self):
+        redis = fakeredis.FakeRedis(decode_responses=True)
+        return mock.patch('apps.attendance.checkin._redis', return_value=redis), \
+            mock.patch.dict('apps.attendance.checkin._scripts', clear=True), redis
+
+    def test_marked_student_is_not_buffered(self):
+        from .checkin import _student_meta, check_in
+
+        patch_redis, patch_scripts, redis = self.buffered()
+        with patch_redis, patch_scripts:
+            with self.captureOnCommitCallbacks(execute=True):
+                Attendance.objects.create(lesson=self.lesson, student=self.student, status='absent')
+            self.assertTrue(redis.sismember(f'checkin:{self.lesson.id}:seen', str(self.student.id)))
+            _student_meta(self.student.user)  # talaba ma'lumoti jarayon keshiga
+            with self.assertNumQueries(0):  # javob faqat Redis dan
+                self.assertFalse(check_in(self.student.user, self.lesson.id))
+            self.assertEqual(redis.zcard('checkin:pending'), 0)
+
+    def test_drain_counts_only_inserted_rows(self):
+        from .checkin import check_in, drain_check_ins
+
+        patch_redis, patch_scripts, redis = self.buffered()
+        with patch_redis, patch_scripts:
+            self.assertTrue(check_in(self.student.user, self.lesson.id))
+            # o'qituvchi bo'shatishdan oldin belgiladi
+            Attendance.objects.create(lesson=self.lesson, student=self.student, status='late')
+            self.assertEqual(drain_check_ins(window_seconds=0)['created'], 0)
+        self.assertEqual(Attendance.objects.get(lesson=self.lesson, student=self.student).status, 'late')
+
+    @override_settings(CHECKIN_PROCESSING_TIMEOUT_SECONDS=0)
+    def test_drain_interrupted_before_commit_is_redone(self):
+        from .checkin import check_in, drain_check_ins
+
+        patch_redis, patch_scripts, redis = self.buffered()
+        with patch_redis, patch_scripts:
+            self.assertTrue(check_in(self.student.user, self.lesson.id))
+            with mock.patch.object(Attendance.objects, 'bulk_create', side_effect=SystemExit):
+                with self.assertRaises(SystemExit):  # worker o'ldirildi
+                    drain_check_ins(window_seconds=0)
+            self.assertEqual(redis.zcard('checkin:pending'), 0)
+            self.assertEqual(redis.scard(f'checkin:{self.lesson.id}:processing'), 1)
+
+            self.assertEqual(drain_check_ins(window_seconds=0), {'lessons': 1, 'created': 1})
+            self.assertEqual(redis.exists(f'checkin:{self.lesson.id}:processing'), 0)
+            self.assertEqual(redis.zcard('checkin:inflight'), 0)
+        self.assertTrue(Attendance.objects.filter(lesson=self.lesson, student=self.student).exists())
+
+    def test_other_group_cannot_check_in(self):
+        self.lesson.group = StudentGroup.objects.create(name="7-E", grade=7)
+        self.lesson.save()
+        response = self.client.post(f'/api/attendance/lessons/{self.lesson.id}/check_in/')
+        self.assertEqual(response.status_code, 400)
+
+
+class LessonConflictTests(TestCase):
+    def setUp(self):
+        from rest_framework.test import APIClient
+
+        self.group = StudentGroup.objects.create(name="6-A", grade=6)
+        self.other_group = StudentGroup.objects.create(name="6-B", grade=6)
+        self.subject = Subject.objects.create(name="Geografiya")
+        self.teachers = [
+            User.objects.create_user(phone_number=f"+99890555555{i}", user_type='teacher').teacher_profile
+            for i in range(2)
+        ]
+        self.day = date(2025, 9, 1)  # dushanba
+        self.busy = Lesson.objects.create(
+            group=self.other_group, subject=self.subject, teacher=self.teachers[0], date=self.day,
+            start_time=time(9, 0), end_time=time(10, 0), room='101',
+        )
+        self.lesson = Lesson.objects.create(
+            group=self.group, subject=self.subject, teacher=self.teachers[1], date=self.day,
+            start_time=time(11, 0), end_time=time(12, 0), room='102',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.teachers[0].user)
+
+    def patch(self, **data):
+        return self.client.patch(f'/api/attendance/lessons/{self.lesson.id}/', data, format='json')
+
+    def test_update_into_occupied_room_or_teacher_slot_is_rejected(self):
+        moved = {'start_time': '09:30', 'end_time': '10:30'}
+        self.assertEqual(self.patch(**moved).status_code, 200)  # boshqa o'qituvchi va xona
+
+        room = self.patch(room='101')
+        self.assertEqual(room.status_code, 400)
+        self.assertEqual(room.json()['conflicts'][0]['type'], 'room')
+
+        teacher = self.patch(teacher=str(self.teachers[0].id))
+        self.assertEqual(teacher.status_code, 400)
+        self.assertEqual(teacher.json()['conflicts'][0]['type'], 'teacher')
+
+        # O'zi bilan to'qnashmaydi
+        self.assertEqual(self.patch(topic="Iqlim").status_code, 200)
+
+    def test_generate_reports_skipped_lessons_not_conflict_pairs(self):
+        from .models import Schedule
+
+        Schedule.objects.create(
+            group=self.group, subject=self.subject, teacher=self.teachers[0], day_of_week='monday',
+            start_time=time(9, 0), end_time=time(10, 0), room='101',
+        )
+        # Birinchi dushanbadagi nomzod ikki mavjud dars bilan to'qnashadi (o'qituvchi va xona)
+        response = self.client.post('/api/attendance/lessons/generate_from_schedule/', {
+            'start_date': '2025-09-01', 'end_date': '2025-09-08',
+            'group_id': str(self.group.id), 'skip_conflicts': 'true',
+        }, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.json()['created_count'], response.json()['skipped_conflicts']), (1, 1))
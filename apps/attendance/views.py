@@ -2,12 +2,15 @@ from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from django.http import FileResponse, HttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
 from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter
 from django.utils import timezone
 from django.db.models import Count, Q, Avg
+import uuid
 from datetime import datetime, timedelta
 
+from auth.users.authentication import get_request_student
 from .models import Schedule, Lesson, Attendance, AttendanceStatistics
 from .serializers import (
     ScheduleListSerializer,
@@ -24,6 +27,26 @@ from .serializers import (
     AttendanceBulkCreateSerializer,
     AttendanceStatisticsSerializer,
     AttendanceReportSerializer,
+    AttendanceMatrixSerializer,
+)
+from .matrix import build_attendance_matrix, write_matrix_xlsx
+from .cache import (
+    current_week,
+    get_or_render,
+    invalidate_lesson_cache,
+    lesson_list_queryset,
+    today_key,
+    week_key,
+)
+from .checkin import CheckInError, check_in
+from .conflicts import (
+    Booking,
+    active_lessons,
+    active_schedules,
+    find_overlaps,
+    lesson_batch_conflicts,
+    lesson_bookings,
+    schedule_bookings,
 )
 
 
@@ -105,6 +128,39 @@ class ScheduleViewSet(viewsets.ModelViewSet):
         schedules = self.get_queryset().filter(group_id=group_id)
         serializer = self.get_serializer(schedules, many=True)
         return Response(serializer.data)
+    
+    @extend_schema(
+        summary="Jadval to'qnashuvlari",
+        description="O'qituvchi yoki xona bir vaqtda band bo'lgan barcha holatlar. "
+                    "start_date va end_date berilsa, shu oraliqdagi darslar ham tekshiriladi",
+        tags=["Jadval"],
+        parameters=[
+            OpenApiParameter(name='start_date', type=str, location=OpenApiParameter.QUERY, required=False),
+            OpenApiParameter(name='end_date', type=str, location=OpenApiParameter.QUERY, required=False),
+        ]
+    )
+    @action(detail=False, methods=['get'])
+    def conflicts(self, request):
+        """Jadval va darslardagi to'qnashuvlar hisoboti"""
+        report = {'schedules': find_overlaps(schedule_bookings(active_schedules()))}
+        
+        start_date = request.query_params.get('start_date')
+        end_date = request.query_params.get('end_date')
+        if start_date and end_date:
+            try:
+                start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
+                end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
+            except ValueError:
+                return Response(
+                    {'detail': 'Noto\'g\'ri sana formati (YYYY-MM-DD)'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            report['lessons'] = find_overlaps(lesson_bookings(
+                active_lessons().filter(date__gte=start_date, date__lte=end_date)
+            ))
+        
+        report['total'] = sum(len(items) for items in report.values())
+        return Response(report)
 
 
 @extend_schema_view(
@@ -169,21 +225,27 @@ class LessonViewSet(viewsets.ModelViewSet):
     @extend_schema(
         summary="Bugungi darslar",
         description="Bugungi kun uchun rejalashtirilgan darslar",
-        tags=["Darslar"]
+        tags=["Darslar"],
+        parameters=[
+            OpenApiParameter(name='group_id', type=str, location=OpenApiParameter.QUERY, required=False)
+        ]
     )
     @action(detail=False, methods=['get'])
     def today(self, request):
-        """Bugungi darslar"""
-        today = timezone.now().date()
-        lessons = self.get_queryset().filter(date=today)
-        
-        # Guruh bo'yicha filter
-        group_id = request.query_params.get('group_id')
-        if group_id:
-            lessons = lessons.filter(group_id=group_id)
-        
-        serializer = self.get_serializer(lessons, many=True)
-        return Response(serializer.data)
+        """Bugungi darslar (guruh bo'yicha keshlanadi)"""
+        today = timezone.localdate()
+        group_id = self._group_id_param(request)
+        if isinstance(group_id, Response):
+            return group_id
+
+        def build():
+            lessons = lesson_list_queryset().filter(date=today)
+            if group_id:
+                lessons = lessons.filter(group_id=group_id)
+            return lessons
+
+        body = get_or_render(today_key(group_id, today), group_id, build)
+        return HttpResponse(body, content_type='application/json')
     
     @extend_schema(
         summary="Haftalik darslar",
@@ -195,22 +257,57 @@ class LessonViewSet(viewsets.ModelViewSet):
     )
     @action(detail=False, methods=['get'])
     def this_week(self, request):
-        """Haftalik darslar"""
-        today = timezone.now().date()
-        week_start = today - timedelta(days=today.weekday())
-        week_end = week_start + timedelta(days=6)
-        
-        lessons = self.get_queryset().filter(
-            date__gte=week_start,
-            date__lte=week_end
-        )
-        
+        """Haftalik darslar (guruh bo'yicha keshlanadi)"""
+        week_start, week_end = current_week()
+        group_id = self._group_id_param(request)
+        if isinstance(group_id, Response):
+            return group_id
+
+        def build():
+            lessons = lesson_list_queryset().filter(
+                date__gte=week_start,
+                date__lte=week_end
+            )
+            if group_id:
+                lessons = lessons.filter(group_id=group_id)
+            return lessons
+
+        body = get_or_render(week_key(group_id, week_start), group_id, build)
+        return HttpResponse(body, content_type='application/json')
+
+    def _group_id_param(self, request):
+        """Kesh kaliti bir xil bo'lishi uchun group_id ni UUID ga keltirish"""
         group_id = request.query_params.get('group_id')
-        if group_id:
-            lessons = lessons.filter(group_id=group_id)
-        
-        serializer = self.get_serializer(lessons, many=True)
-        return Response(serializer.data)
+        if not group_id:
+            return None
+        try:
+            return uuid.UUID(group_id)
+        except ValueError:
+            return Response(
+                {'detail': "group_id noto'g'ri formatda"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+    
+    @extend_schema(
+        summary="Darsga kelganini belgilash",
+        description="Talaba davomat oynasi ichida o'zini 'keldi' deb belgilaydi. "
+                    "Belgi Redis'da saqlanadi va fon vazifasi bilan bazaga yoziladi.",
+        tags=["Darslar"],
+        request=None,
+    )
+    @action(detail=True, methods=['post'])
+    def check_in(self, request, pk=None):
+        """Talabaning o'zini belgilashi (bitta Redis so'rovi)"""
+        try:
+            created = check_in(request.user, uuid.UUID(str(pk)))
+        except ValueError:
+            return Response({'detail': 'Dars topilmadi'}, status=status.HTTP_404_NOT_FOUND)
+        except CheckInError as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(
+            {'lesson_id': str(pk), 'status': 'present', 'already_checked_in': not created},
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        )
     
     @extend_schema(
         summary="Jadvldan darslar yaratish",
@@ -222,7 +319,8 @@ class LessonViewSet(viewsets.ModelViewSet):
                 'properties': {
                     'start_date': {'type': 'string', 'format': 'date'},
                     'end_date': {'type': 'string', 'format': 'date'},
-                    'group_id': {'type': 'string', 'format': 'uuid'}
+                    'group_id': {'type': 'string', 'format': 'uuid'},
+                    'skip_conflicts': {'type': 'boolean'}
                 }
             }
         }
@@ -249,50 +347,88 @@ class LessonViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Guruhning jadvalini olish
-        schedules = Schedule.objects.filter(
+        # Guruhning jadvalini olish (bitta so'rov)
+        schedules_by_day = {}
+        for schedule in Schedule.objects.filter(
             group_id=group_id,
             is_active=True,
             deleted_at__isnull=True
+        ):
+            schedules_by_day.setdefault(schedule.day_of_week, []).append(schedule)
+        
+        # Allaqachon yaratilgan darslar (bitta so'rov)
+        existing = set(
+            Lesson.objects.filter(
+                group_id=group_id,
+                date__gte=start_date,
+                date__lte=end_date,
+                deleted_at__isnull=True
+            ).values_list('subject_id', 'date', 'start_time')
         )
         
-        created_lessons = []
+        candidates, sources = [], []
         current_date = start_date
-        
         while current_date <= end_date:
             day_name = current_date.strftime('%A').lower()
-            
-            # Shu kun uchun jadvallarni topish
-            day_schedules = schedules.filter(day_of_week=day_name)
-            
-            for schedule in day_schedules:
-                # Allaqachon yaratilgan dars bor yoki yo'qligini tekshirish
-                if not Lesson.objects.filter(
-                    group=schedule.group,
-                    subject=schedule.subject,
-                    date=current_date,
-                    start_time=schedule.start_time,
-                    deleted_at__isnull=True
-                ).exists():
-                    lesson = Lesson.objects.create(
-                        schedule=schedule,
-                        group=schedule.group,
-                        subject=schedule.subject,
-                        teacher=schedule.teacher,
-                        date=current_date,
-                        start_time=schedule.start_time,
-                        end_time=schedule.end_time,
+            for schedule in schedules_by_day.get(day_name, []):
+                if (schedule.subject_id, current_date, schedule.start_time) not in existing:
+                    candidates.append(Booking(
+                        ref=len(candidates),
+                        day=current_date,
+                        start=schedule.start_time,
+                        end=schedule.end_time,
+                        group_id=schedule.group_id,
+                        teacher_id=schedule.teacher_id,
                         room=schedule.room,
-                        related_quiz_subject=schedule.subject,
-                        auto_attendance_enabled=True
-                    )
-                    created_lessons.append(lesson)
-            
+                    ))
+                    sources.append(schedule)
             current_date += timedelta(days=1)
         
+        # O'qituvchi/xona to'qnashuvlari: butun oraliq bitta so'rov + interval indeks
+        conflicts = lesson_batch_conflicts(candidates, start_date, end_date)
+        skip_conflicts = str(request.data.get('skip_conflicts', '')).lower() in ['true', '1', 'yes']
+        if conflicts and not skip_conflicts:
+            return Response(
+                {
+                    'detail': "Jadvaldan yaratiladigan darslarda to'qnashuvlar bor",
+                    'conflicts': conflicts
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # To'qnashuv juftlarida mavjud darslar ham bor - faqat nomzodlar tashlab ketiladi
+        conflicting = {
+            conflict[side]['id']
+            for conflict in conflicts
+            for side in ('first', 'second')
+        }
+        skipped = sum(1 for candidate in candidates if str(candidate.ref) in conflicting)
+        created_lessons = Lesson.objects.bulk_create([
+            Lesson(
+                schedule=schedule,
+                group_id=candidate.group_id,
+                subject_id=schedule.subject_id,
+                teacher_id=candidate.teacher_id,
+                date=candidate.day,
+                start_time=candidate.start,
+                end_time=candidate.end,
+                room=candidate.room,
+                related_quiz_subject_id=schedule.subject_id,
+                auto_attendance_enabled=True
+            )
+            for candidate, schedule in zip(candidates, sources)
+            if str(candidate.ref) not in conflicting
+        ])
+        # bulk_create signallarni chaqirmaydi
+        invalidate_lesson_cache({lesson.group_id for lesson in created_lessons})
+        
         return Response({
             'created_count': len(created_lessons),
-            'lessons': LessonListSerializer(created_lessons, many=True).data
+            'skipped_conflicts': skipped,
+            'lessons': LessonListSerializer(
+                self.get_queryset().filter(id__in=[lesson.id for lesson in created_lessons]),
+                many=True
+            ).data
         }, status=status.HTTP_201_CREATED)
 
 
@@ -420,6 +556,55 @@ class AttendanceViewSet(viewsets.ModelViewSet):
             'errors': errors
         }, status=status.HTTP_201_CREATED)
     
+    @extend_schema(
+        summary="Davomat matritsasi",
+        description="Guruh uchun talabalar × darslar davomat jadvali. "
+                    "Har bir talaba uchun holat kodlari massivi qaytariladi "
+                    "(0 - belgilanmagan, 1 - keldi, 2 - kelmadi, 3 - kech qoldi, 4 - sababli)",
+        tags=["Davomat"],
+        parameters=[
+            OpenApiParameter(name='group_id', type=str, location=OpenApiParameter.QUERY, required=True),
+            OpenApiParameter(name='start_date', type=str, location=OpenApiParameter.QUERY, required=True),
+            OpenApiParameter(name='end_date', type=str, location=OpenApiParameter.QUERY, required=True),
+            OpenApiParameter(name='subject_id', type=str, location=OpenApiParameter.QUERY, required=False),
+        ]
+    )
+    @action(detail=False, methods=['get'])
+    def matrix(self, request):
+        """Davomat matritsasi (JSON)"""
+        serializer = AttendanceMatrixSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        
+        matrix = build_attendance_matrix(**serializer.validated_data)
+        return Response(matrix.as_dict())
+    
+    @extend_schema(
+        summary="Davomat matritsasini yuklab olish",
+        description="Guruh davomat jadvalini XLSX formatida yuklab olish",
+        tags=["Davomat"],
+        parameters=[
+            OpenApiParameter(name='group_id', type=str, location=OpenApiParameter.QUERY, required=True),
+            OpenApiParameter(name='start_date', type=str, location=OpenApiParameter.QUERY, required=True),
+            OpenApiParameter(name='end_date', type=str, location=OpenApiParameter.QUERY, required=True),
+            OpenApiParameter(name='subject_id', type=str, location=OpenApiParameter.QUERY, required=False),
+        ]
+    )
+    @action(detail=False, methods=['get'], url_path='matrix/export')
+    def matrix_export(self, request):
+        """Davomat matritsasi (XLSX)"""
+        serializer = AttendanceMatrixSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        
+        data = serializer.validated_data
+        matrix = build_attendance_matrix(**data)
+        filename = f"davomat_{data['start_date']}_{data['end_date']}.xlsx"
+        return FileResponse(
+            write_matrix_xlsx(matrix),
+            as_attachment=True,
+            filename=filename,
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        )
+    
     @extend_schema(
         summary="Mening davomatim",
         description="Joriy student uchun davomat qaydlari",
@@ -428,10 +613,8 @@ class AttendanceViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def my_attendance(self, request):
         """Mening davomatim"""
-        try:
-            from apps.students.models import Student
-            student = Student.objects.get(user=request.user, deleted_at__isnull=True)
-        except Student.DoesNotExist:
+        student = get_request_student(request)
+        if student is None:
             return Response(
                 {'detail': 'Siz student emassiz'},
                 status=status.HTTP_403_FORBIDDEN
@@ -491,10 +674,8 @@ class AttendanceStatisticsViewSet(viewsets.ReadOnlyModelViewSet):
     @action(detail=False, methods=['get'])
     def my_statistics(self, request):
         """Mening statistikam"""
-        try:
-            from apps.students.models import Student
-            student = Student.objects.get(user=request.user, deleted_at__isnull=True)
-        except Student.DoesNotExist:
+        student = get_request_student(request)
+        if student is None:
             return Response(
                 {'detail': 'Siz student emassiz'},
                 status=status.HTTP_403_FORBIDDEN
@@ -1,6 +1,6 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.utils.html import format_html
-from .models import BotUser
+from .models import BotUser, Broadcast
 
 
 @admin.register(BotUser)
@@ -55,3 +55,40 @@ class BotUserAdmin(admin.ModelAdmin):
     def has_add_permission(self, request):
         """BotUser qo'shish ruxsatini o'chirish (faqat bot orqali yaratilishi kerak)"""
         return False
+
+
+@admin.register(Broadcast)
+class BroadcastAdmin(admin.ModelAdmin):
+    list_display = ('short_text', 'group', 'subject', 'status', 'progress_display', 'sent_count', 'failed_count', 'blocked_count', 'created_at')
+    list_filter = ('status', 'group', 'subject', 'created_at')
+    search_fields = ('text',)
+    readonly_fields = ('status', 'total_count', 'sent_count', 'failed_count', 'blocked_count', 'last_error',
+                       'started_at', 'finished_at', 'created_by', 'created_at', 'updated_at')
+    actions = ['start_broadcast', 'cancel_broadcast']
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            obj.created_by = request.user
+        super().save_model(request, obj, form, change)
+
+    def short_text(self, obj):
+        return obj.text[:60]
+    short_text.short_description = "Xabar"
+
+    def progress_display(self, obj):
+        return f"{obj.progress}%"
+    progress_display.short_description = "Jarayon"
+
+    @admin.action(description="Tanlangan xabarlarni yuborish")
+    def start_broadcast(self, request, queryset):
+        from .tasks import send_broadcast_task
+
+        pending = list(queryset.filter(status='pending').values_list('id', flat=True))
+        for broadcast_id in pending:
+            send_broadcast_task.delay(str(broadcast_id))
+        self.message_user(request, f"{len(pending)} ta xabar yuborish navbatiga qo'yildi", messages.SUCCESS)
+
+    @admin.action(description="Yuborishni bekor qilish")
+    def cancel_broadcast(self, request, queryset):
+        count = queryset.filter(status__in=['pending', 'running']).update(status='cancelled')
+        self.message_user(request, f"{count} ta xabar bekor qilindi", messages.WARNING)
@@ -0,0 +1,284 @@
+"""
+Bot orqali talabalarga ommaviy xabar yuborish (Broadcast modeli).
+
+Telegram limitlari: umumiy ~30 xabar/soniya va bitta chatga 1 xabar/soniya.
+Har ikki limit Redis GCRA (apps/common/ratelimit.py) orqali tekshiriladi,
+shuning uchun bir vaqtda ishlayotgan bir nechta broadcast va worker umumiy
+limitni birgalikda bo'lishadi:
+
+- ``broadcast:global`` - BROADCAST_GLOBAL_RATE, burst=1 (xabarlar teng
+  oraliqda, limitdan oshmasdan);
+- ``broadcast:chat:{chat_id}`` - BROADCAST_CHAT_RATE (uzun xabar bo'laklari
+  uchun).
+
+Yuborish asyncio da: bir vaqtda ko'pi bilan BROADCAST_CONCURRENCY so'rov.
+429 javobidagi ``retry_after`` davomida barcha yuborishlar to'xtatiladi;
+bu kutish BROADCAST_MAX_RETRIES ga hisoblanmaydi (u faqat 5xx va tarmoq
+xatolari uchun). Jarayon har BROADCAST_PROGRESS_INTERVAL_SECONDS da bazaga
+yoziladi (``updated_at`` - worker tirikligi belgisi); admin broadcastni
+bekor qilsa yuborish shu paytda to'xtaydi. Worker o'lib qolsa 'running'
+holatdagi broadcast BROADCAST_STALE_SECONDS dan keyin 'failed' qilinadi
+(reclaim_stale_broadcasts). Botni bloklagan foydalanuvchilar
+``is_active=False`` qilinadi.
+
+Redis ishlamasa limiter fail-open bo'ladi; u holda Telegramning 429
+javoblari tezlikni cheklaydi.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from datetime import timedelta
+from typing import Iterable, Optional
+
+import httpx
+from django.conf import settings
+from django.utils import timezone
+
+from apps.common.http import HTTP2_AVAILABLE
+from apps.common.ratelimit import hit, parse_rate
+from .models import BotUser, Broadcast
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_LIMIT = 4096  # Telegram sendMessage matn chegarasi
+
+
+def audience_queryset(group=None, subject=None):
+    """
+    Broadcast qabul qiluvchilari (bitta so'rov).
+
+    Guruh va/yoki fan bo'yicha: fan tanlansa, shu fan faol jadvalida bor
+    guruhlarning talabalari. Ikkalasi ham bo'lmasa - barcha talabalar.
+    """
+    filters = {
+        'is_active': True,
+        'deleted_at__isnull': True,
+        'linked_user__student_profile__isnull': False,
+        'linked_user__student_profile__deleted_at__isnull': True,
+    }
+    if group is not None:
+        filters['linked_user__student_profile__group'] = group
+    if subject is not None:
+        filters['linked_user__student_profile__group__schedules__subject'] = subject
+        filters['linked_user__student_profile__group__schedules__is_active'] = True
+    return BotUser.objects.filter(**filters).values_list('user_id', flat=True).distinct()
+
+
+def split_text(text: str, size: int = MESSAGE_LIMIT) -> list[str]:
+    """Uzun matnni qatorlar bo'yicha Telegram chegarasiga bo'lish."""
+    parts, current = [], ""
+    for line in text.splitlines(keepends=True):
+        while len(line) > size:
+            if current:
+                parts.append(current)
+                current = ""
+            parts.append(line[:size])
+            line = line[size:]
+        if len(current) + len(line) > size:
+            parts.append(current)
+            current = ""
+        current += line
+    if current:
+        parts.append(current)
+    return parts
+
+
+class Pacer:
+    """
+    Umumiy va chat bo'yicha limitlarni ushlab turuvchi rejalashtiruvchi.
+
+    GCRA tekshiruvlari sinxron Redis klientida thread orqali bajariladi
+    (asinxron pool event loop ga bog'lanib qoladi). Umumiy limitni bir
+    vaqtda faqat bitta korutina kutadi - Redis ga ortiqcha so'rov yo'q.
+    """
+
+    def __init__(self, global_rate: Optional[str] = None, chat_rate: Optional[str] = None):
+        self.global_rate = parse_rate(global_rate or settings.BROADCAST_GLOBAL_RATE)
+        self.chat_rate = parse_rate(chat_rate or settings.BROADCAST_CHAT_RATE)
+        self._lock = asyncio.Lock()
+        self.paused_until = 0.0
+
+    def pause(self, seconds: float) -> None:
+        """429 retry_after: barcha yuborishlarni to'xtatish"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    async def _wait(self, key: str, rate, burst: int) -> None:
+        while True:
+            verdict = await asyncio.to_thread(hit, key, rate, burst)
+            if verdict.allowed:
+                return
+            await asyncio.sleep(verdict.retry_after)
+
+    async def acquire(self, chat_id: str) -> None:
+        await self._wait(f"broadcast:chat:{chat_id}", self.chat_rate, 1)
+        async with self._lock:
+            delay = self.paused_until - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await self._wait("broadcast:global", self.global_rate, 1)
+
+
+class BroadcastSender:
+    """Bitta Broadcast ni yuborish (asyncio)."""
+
+    def __init__(self, broadcast: Broadcast, token: str, pacer: Optional[Pacer] = None):
+        self.broadcast = broadcast
+        self.url = f"{settings.TELEGRAM_API_BASE}/bot{token}/sendMessage"
+        self.pacer = pacer or Pacer()
+        self.parts = split_text(broadcast.text)
+        self.counts = {'sent_count': 0, 'failed_count': 0, 'blocked_count': 0}
+        self.blocked: list[str] = []
+        self.last_error = ""
+        self.stop = asyncio.Event()
+
+    async def _send_part(self, client: httpx.AsyncClient, chat_id: str, text: str) -> str:
+        """Returns: 'sent', 'blocked', 'failed' yoki 'cancelled'"""
+        data = {'chat_id': chat_id, 'text': text}
+        if self.broadcast.parse_mode:
+            data['parse_mode'] = self.broadcast.parse_mode
+        failures = 0
+        while True:
+            await self.pacer.acquire(chat_id)
+            if self.stop.is_set():  # navbatda kutayotganlar bekor qilingandan keyin yubormaydi
+                return 'cancelled'
+            try:
+                resp = await client.post(self.url, data=data)
+            except httpx.HTTPError as exc:
+                self.last_error = repr(exc)
+            else:
+                if resp.status_code == 200:
+                    return 'sent'
+                try:
+                    payload = resp.json()
+                except ValueError:
+                    payload = {}
+                self.last_error = f"{resp.status_code}: {payload.get('description', resp.text[:200])}"
+                if resp.status_code == 429:
+                    # Kutishni Pacer ta'minlaydi; urinish hisoblanmaydi
+                    retry_after = (payload.get('parameters') or {}).get('retry_after', 1)
+                    logger.warning("Broadcast hit Telegram flood limit", extra={"retry_after": retry_after})
+                    self.pacer.pause(retry_after)
+                    continue
+                if resp.status_code == 403:
+                    return 'blocked'
+                if resp.status_code < 500:
+                    return 'failed'  # 400: chat topilmadi va h.k. - qayta urinish foydasiz
+            # 5xx yoki tarmoq xatosi
+            failures += 1
+            if failures > settings.BROADCAST_MAX_RETRIES:
+                return 'failed'
+            await asyncio.sleep(min(2 ** failures * 0.5, 10))
+
+    async def _deliver(self, client, chat_id: str, slots: asyncio.Semaphore) -> None:
+        try:
+            result = 'sent'
+            for text in self.parts:
+                result = await self._send_part(client, chat_id, text)
+                if result != 'sent':
+                    break
+            if result == 'cancelled':
+                return
+            self.counts[f"{result}_count"] += 1
+            if result == 'blocked':
+                self.blocked.append(chat_id)
+        finally:
+            slots.release()
+
+    async def _report(self) -> None:
+        """Jarayonni bazaga yozish va bekor qilinganini tekshirish"""
+        await Broadcast.objects.filter(pk=self.broadcast.pk).aupdate(
+            **self.counts, last_error=self.last_error, updated_at=timezone.now()
+        )
+        if await Broadcast.objects.filter(pk=self.broadcast.pk, status='cancelled').aexists():
+            self.stop.set()
+
+    async def _reporter(self) -> None:
+        while not self.stop.is_set():
+            try:
+                await asyncio.wait_for(self.stop.wait(), settings.BROADCAST_PROGRESS_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                await self._report()
+
+    async def run(self, chat_ids: Iterable[str]) -> dict:
+        slots = asyncio.Semaphore(settings.BROADCAST_CONCURRENCY)
+        tasks = []
+        reporter = asyncio.create_task(self._reporter())
+        async with httpx.AsyncClient(
+            http2=settings.HTTP_CLIENT_HTTP2 and HTTP2_AVAILABLE,
+            timeout=settings.HTTP_CLIENT_TIMEOUT_SECONDS,
+            limits=httpx.Limits(max_connections=settings.BROADCAST_CONCURRENCY),
+        ) as client:
+            try:
+                for chat_id in chat_ids:
+                    await slots.acquire()
+                    if self.stop.is_set():
+                        slots.release()
+                        break
+                    tasks.append(asyncio.create_task(self._deliver(client, chat_id, slots)))
+                await asyncio.gather(*tasks)
+            finally:
+                cancelled = self.stop.is_set()
+                self.stop.set()
+                await reporter
+        await self._report()
+        if self.blocked:
+            await BotUser.objects.filter(user_id__in=self.blocked).aupdate(is_active=False)
+        return {**self.counts, 'cancelled': cancelled}
+
+
+def send_broadcast(broadcast_id, token: str) -> dict:
+    """
+    Broadcast ni yuborish (Celery vazifasidan chaqiriladi).
+
+    Faqat 'pending' holatdagi broadcast olinadi, shuning uchun takroriy
+    vazifa xabarni ikki marta yubormaydi.
+    """
+    now = timezone.now()
+    claimed = Broadcast.objects.filter(pk=broadcast_id, status='pending').update(
+        status='running', started_at=now, updated_at=now
+    )
+    if not claimed:
+        return {'status': 'skipped'}
+    broadcast = Broadcast.objects.get(pk=broadcast_id)
+    chat_ids = list(audience_queryset(broadcast.group, broadcast.subject))
+    Broadcast.objects.filter(pk=broadcast_id).update(total_count=len(chat_ids))
+    logger.info("Broadcast started", extra={"broadcast_id": str(broadcast_id), "recipients": len(chat_ids)})
+
+    try:
+        result = asyncio.run(BroadcastSender(broadcast, token).run(chat_ids))
+    except Exception as exc:
+        Broadcast.objects.filter(pk=broadcast_id).update(
+            status='failed', last_error=repr(exc)[:1000], finished_at=timezone.now()
+        )
+        raise
+    status = 'cancelled' if result.pop('cancelled') else 'completed'
+    # Bekor qilish holatini ustidan yozmaslik
+    Broadcast.objects.filter(pk=broadcast_id, status='running').update(status=status)
+    Broadcast.objects.filter(pk=broadcast_id).update(finished_at=timezone.now())
+    logger.info("Broadcast finished", extra={"broadcast_id": str(broadcast_id), **result})
+    return {'status': status, **result}
+
+
+def reclaim_stale_broadcasts() -> int:
+    """
+    Worker o'lib qolgan broadcastlarni 'failed' qilish (Celery beat).
+
+    Ishlayotgan yuborish har BROADCAST_PROGRESS_INTERVAL_SECONDS da
+    ``updated_at`` ni yangilaydi; BROADCAST_STALE_SECONDS davomida
+    yangilanmagan 'running' broadcast tirik emas. U qayta yuborilmaydi:
+    qaysi qabul qiluvchilarga yetib borgani saqlanmaydi.
+
+    Returns:
+        'failed' qilingan broadcastlar soni
+    """
+    now = timezone.now()
+    reclaimed = Broadcast.objects.filter(
+        status='running', updated_at__lt=now - timedelta(seconds=settings.BROADCAST_STALE_SECONDS)
+    ).update(
+        status='failed', last_error="Worker to'xtab qoldi (jarayon yangilanmadi)", finished_at=now, updated_at=now
+    )
+    if reclaimed:
+        logger.warning("Reclaimed stale broadcasts", extra={"count": reclaimed})
+    return reclaimed
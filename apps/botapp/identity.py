@@ -0,0 +1,149 @@
+"""
+Bot handlerlari uchun Telegram foydalanuvchi identifikatsiyasi keshi.
+
+Har bir /start va /login BotUser va bog'langan User ni bazadan qidirardi.
+Bu modul Telegram user_id -> (BotUser id, bog'langan User id) juftligini
+Redis da saqlaydi (``bot:identity:{tg_id}``); kesh bo'sh bo'lsa bitta
+so'rov bilan yuklanadi.
+
+``BotUser.last_interaction`` auto_now bo'lgani uchun har bir saqlash butun
+qatorni qayta yozadi. Endi har bir update faqat Redis ZSET ga vaqt yozadi
+(``bot:last_interaction``), fon vazifasi esa ularni har
+BOT_LAST_INTERACTION_FLUSH_SECONDS da bitta UPDATE bilan bazaga o'tkazadi.
+
+Admin paneldan User <-> BotUser bog'lanishi o'zgarsa kesh ko'pi bilan
+BOT_IDENTITY_CACHE_TTL_SECONDS kechikadi; bot handlerlari o'zgarishdan
+keyin keshni o'zlari tozalaydi.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import time
+from datetime import datetime, timezone as dt_timezone
+from typing import NamedTuple, Optional
+
+from django.conf import settings
+from django.db.models import Case, DateTimeField, Value, When
+
+from apps.common.redis_client import get_async_redis, get_redis
+from .models import BotUser
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "bot:identity"
+LAST_INTERACTION_KEY = "bot:last_interaction"
+FLUSH_CHUNK = 500
+
+# ZSET ni o'qib darhol o'chirish (flush paytida kelgan yozuvlar yo'qolmaydi)
+_POP_ALL_LUA = """
+local items = redis.call('ZRANGE', KEYS[1], 0, -1, 'WITHSCORES')
+redis.call('DEL', KEYS[1])
+return items
+"""
+_pop_script = None
+
+
+class Identity(NamedTuple):
+    bot_user_id: str
+    user_id: Optional[str]
+
+    @property
+    def registered(self) -> bool:
+        return self.user_id is not None
+
+
+def _key(tg_id) -> str:
+    return f"{KEY_PREFIX}:{tg_id}"
+
+
+async def _load(tg_id: str) -> Optional[Identity]:
+    row = await BotUser.objects.filter(user_id=tg_id).values('id', 'linked_user__id').afirst()
+    if row is None:
+        return None
+    linked = row['linked_user__id']
+    return Identity(str(row['id']), str(linked) if linked else None)
+
+
+async def remember_identity(tg_id, identity: Identity) -> None:
+    try:
+        await get_async_redis("cache").set(
+            _key(tg_id), json.dumps(identity._asdict()), ex=settings.BOT_IDENTITY_CACHE_TTL_SECONDS
+        )
+    except Exception:
+        logger.warning("Redis unavailable, bot identity not cached", extra={"tg_id": str(tg_id)})
+
+
+async def forget_identity(tg_id) -> None:
+    """Ro'yxatdan o'tish / bog'lashdan keyin chaqiriladi"""
+    try:
+        await get_async_redis("cache").delete(_key(tg_id))
+    except Exception:
+        logger.warning("Redis unavailable, bot identity not invalidated", extra={"tg_id": str(tg_id)})
+
+
+async def resolve_identity(tg_id) -> Optional[Identity]:
+    """
+    Telegram foydalanuvchisini aniqlash va oxirgi muloqot vaqtini yozish.
+
+    Kesh o'qish va last_interaction yozuvi bitta pipeline da (bitta
+    round trip) bajariladi.
+
+    Returns:
+        Identity yoki None (BotUser hali yaratilmagan)
+    """
+    tg_id = str(tg_id)
+    cached = None
+    try:
+        pipe = get_async_redis("cache").pipeline(transaction=False)
+        pipe.get(_key(tg_id))
+        pipe.zadd(LAST_INTERACTION_KEY, {tg_id: time.time()})
+        cached, _ = await pipe.execute()
+    except Exception:
+        logger.warning("Redis unavailable, bot identity loaded from DB", extra={"tg_id": tg_id})
+    if cached:
+        return Identity(**json.loads(cached))
+
+    identity = await _load(tg_id)
+    if identity is not None:
+        await remember_identity(tg_id, identity)
+    return identity
+
+
+def flush_last_interactions() -> int:
+    """
+    Buferdagi last_interaction vaqtlarini bazaga yozish.
+
+    auto_now chetlab o'tiladi: har bir bo'lak uchun bitta
+    ``UPDATE ... SET last_interaction = CASE user_id ...`` so'rovi.
+
+    Returns:
+        Yangilangan BotUser lar soni
+    """
+    global _pop_script
+    if _pop_script is None:
+        _pop_script = get_redis("cache").register_script(_POP_ALL_LUA)
+    items = _pop_script(keys=[LAST_INTERACTION_KEY])
+    seen = {
+        items[i]: datetime.fromtimestamp(float(items[i + 1]), tz=dt_timezone.utc)
+        for i in range(0, len(items), 2)
+    }
+    updated = 0
+    tg_ids = list(seen)
+    for start in range(0, len(tg_ids), FLUSH_CHUNK):
+        chunk = tg_ids[start:start + FLUSH_CHUNK]
+        try:
+            updated += BotUser.objects.filter(user_id__in=chunk).update(
+                last_interaction=Case(
+                    *[When(user_id=tg_id, then=Value(seen[tg_id])) for tg_id in chunk],
+                    output_field=DateTimeField(),
+                )
+            )
+        except Exception:
+            # Yozilmagan vaqtlarni buferga qaytarish (yangiroq vaqt ustidan yozilmaydi)
+            rest = tg_ids[start:]
+            get_redis("cache").zadd(
+                LAST_INTERACTION_KEY, {tg_id: seen[tg_id].timestamp() for tg_id in rest}, gt=True
+            )
+            raise
+    return updated
@@ -0,0 +1,34 @@
+import asyncio
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.botapp.stream import run_consumers
+
+
+class Command(BaseCommand):
+    help = "Process Telegram updates queued by the webhook (Redis Streams consumer)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=1, help="Total number of consumer processes")
+        parser.add_argument("--index", type=int, default=0, help="Index of this process (0..workers-1)")
+
+    def handle(self, *args, **options):
+        workers, index = options["workers"], options["index"]
+        if not 0 <= index < workers:
+            self.stderr.write(self.style.ERROR("--index must be in range 0..workers-1"))
+            return
+        # Each shard is owned by exactly one process to keep per-chat order
+        shards = [shard for shard in range(settings.TELEGRAM_STREAM_SHARDS) if shard % workers == index]
+        self.stdout.write(f"Consuming shards: {shards}")
+
+        async def _run():
+            stop = asyncio.Event()
+            loop = asyncio.get_running_loop()
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                loop.add_signal_handler(sig, stop.set)
+            await run_consumers(shards, stop)
+
+        asyncio.run(_run())
+        self.stdout.write(self.style.SUCCESS("Consumer stopped."))
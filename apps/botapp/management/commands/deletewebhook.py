@@ -1,12 +1,14 @@
 from django.core.management.base import BaseCommand
 import asyncio
-from bot.bot import bot
+from bot.bot import get_bot
 
 
 class Command(BaseCommand):
     help = "Delete Telegram webhook"
 
     def handle(self, *args, **options):
+        bot = get_bot()
+
         async def _del():
             try:
                 await bot.delete_webhook(drop_pending_updates=False)
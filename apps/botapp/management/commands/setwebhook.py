@@ -1,7 +1,7 @@
 from django.core.management.base import BaseCommand
 from environs import Env
 import asyncio
-from bot.bot import bot
+from bot.bot import get_bot
 
 
 class Command(BaseCommand):
@@ -11,6 +11,7 @@ class Command(BaseCommand):
         parser.add_argument("--drop-pending", action="store_true", help="Drop pending updates on Telegram side")
 
     def handle(self, *args, **options):
+        bot = get_bot()
         env = Env(); env.read_env()
         domain = env.str("TELEGRAM_WEBHOOK_DOMAIN")
         path = env.str("TELEGRAM_WEBHOOK_PATH", "/api/telegram/webhook")
@@ -1,12 +1,14 @@
 from django.core.management.base import BaseCommand
 import asyncio
-from bot.bot import bot
+from bot.bot import get_bot
 
 
 class Command(BaseCommand):
     help = "Show current Telegram webhook info"
 
     def handle(self, *args, **options):
+        bot = get_bot()
+
         async def _info():
             try:
                 info = await bot.get_webhook_info()
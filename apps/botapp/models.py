@@ -19,4 +19,80 @@ class BotUser(BaseModel):
     
     class Meta:
         verbose_name = "Bot foydalanuvchisi"
-        verbose_name_plural = "Bot foydalanuvchilari"
\ No newline at end of file
+        verbose_name_plural = "Bot foydalanuvchilari"
+
+class Broadcast(BaseModel):
+    """
+    Bot orqali talabalarga ommaviy xabar (test natijalari, jadval o'zgarishi, ogohlantirishlar).
+
+    Auditoriya guruh va/yoki fan bo'yicha tanlanadi; yuborish
+    apps/botapp/broadcast.py da Telegram limitlari asosida boshqariladi.
+    """
+    text = models.TextField(verbose_name="Xabar matni")
+    parse_mode = models.CharField(
+        max_length=10,
+        choices=[('HTML', 'HTML'), ('Markdown', 'Markdown')],
+        default='HTML',
+        blank=True,
+        verbose_name="Formatlash"
+    )
+    group = models.ForeignKey(
+        'students.StudentGroup',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='broadcasts',
+        verbose_name="Guruh"
+    )
+    subject = models.ForeignKey(
+        'quizzes.Subject',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='broadcasts',
+        verbose_name="Fan",
+        help_text="Shu fan jadvalida bor guruhlar talabalariga"
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=[
+            ('pending', 'Kutilmoqda'),
+            ('running', 'Yuborilmoqda'),
+            ('completed', 'Yakunlangan'),
+            ('cancelled', 'Bekor qilingan'),
+            ('failed', 'Xatolik'),
+        ],
+        default='pending',
+        verbose_name="Holat"
+    )
+    total_count = models.PositiveIntegerField(default=0, verbose_name="Qabul qiluvchilar")
+    sent_count = models.PositiveIntegerField(default=0, verbose_name="Yuborildi")
+    failed_count = models.PositiveIntegerField(default=0, verbose_name="Yuborilmadi")
+    blocked_count = models.PositiveIntegerField(default=0, verbose_name="Botni bloklaganlar")
+    last_error = models.TextField(blank=True, verbose_name="Oxirgi xatolik")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="Boshlangan vaqti")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Tugagan vaqti")
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='broadcasts',
+        verbose_name="Yaratuvchi"
+    )
+
+    def __str__(self):
+        return f"{self.text[:40]} ({self.get_status_display()})"
+
+    @property
+    def progress(self) -> float:
+        """Yuborish jarayoni foizda"""
+        if not self.total_count:
+            return 0.0
+        done = self.sent_count + self.failed_count + self.blocked_count
+        return round(done * 100 / self.total_count, 1)
+
+    class Meta:
+        verbose_name = "Ommaviy xabar"
+        verbose_name_plural = "Ommaviy xabarlar"
+        ordering = ['-created_at']
@@ -0,0 +1,235 @@
+"""
+Telegram webhook update queue on Redis Streams.
+
+The webhook only validates the update, appends it to a stream and answers
+200; ``manage.py consume_updates`` workers run the aiogram handlers.
+
+- Updates are sharded by chat id into ``TELEGRAM_STREAM_SHARDS`` streams
+  (``tg:updates:{n}``). Each shard is read by a single consumer task, so
+  updates of one chat are handled in order while different chats run
+  concurrently.
+- Every shard has the consumer group ``bot``; worker processes split the
+  shards between them (``--workers`` / ``--index``) to scale horizontally.
+  Unacknowledged entries stay in the group's pending list and are picked up
+  again when the consumer restarts.
+- An update that fails ``TELEGRAM_STREAM_MAX_ATTEMPTS`` times is moved to
+  ``tg:updates:dead`` together with the error.
+- ``stream_stats()`` reports per-shard lag/pending and processed counters.
+
+Telegram re-delivers an update when the webhook answers slowly or fails.
+Seen ``update_id`` values are kept in rolling bitmaps (``tg:seen:{block}``,
+one bit per id, 8 KB per 65536 updates) and duplicates are dropped before
+they are queued, in the same Lua call as the XADD.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Iterable, Optional
+
+from django.conf import settings
+
+from apps.common.redis_client import get_async_redis, get_redis
+
+logger = logging.getLogger(__name__)
+
+STREAM_PREFIX = "tg:updates"
+DEAD_LETTER_KEY = f"{STREAM_PREFIX}:dead"
+STATS_KEY = f"{STREAM_PREFIX}:stats"
+SEEN_PREFIX = "tg:seen"
+SEEN_BLOCK_BITS = 2 ** 16
+GROUP = "bot"
+
+# KEYS: seen bitmap, stats; ARGV: bit offset, ttl
+_MARK_SEEN = """
+if redis.call('SETBIT', KEYS[1], ARGV[1], 1) == 1 then
+    redis.call('HINCRBY', KEYS[2], 'duplicates', 1)
+    return false
+end
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+"""
+_MARK_SEEN_LUA = _MARK_SEEN + "return 1"
+# + KEYS[3]: stream; ARGV: ..., maxlen, update, received_at
+_ENQUEUE_LUA = _MARK_SEEN + """
+return redis.call('XADD', KEYS[3], 'MAXLEN', '~', ARGV[3], '*', 'update', ARGV[4], 'received_at', ARGV[5])
+"""
+_scripts: dict = {}
+
+
+def shard_key(shard: int) -> str:
+    return f"{STREAM_PREFIX}:{shard}"
+
+
+def shard_for(update) -> int:
+    """Shard by chat (falls back to the sender, then to update_id)."""
+    event = update.event
+    chat = getattr(event, 'chat', None) or getattr(getattr(event, 'message', None), 'chat', None)
+    sender = getattr(event, 'from_user', None)
+    ordering_id = chat.id if chat else sender.id if sender else update.update_id
+    return abs(int(ordering_id)) % settings.TELEGRAM_STREAM_SHARDS
+
+
+def _script(name: str, source: str):
+    if name not in _scripts:
+        _scripts[name] = get_async_redis().register_script(source)
+    return _scripts[name]
+
+
+def _seen_keys(update_id: int) -> tuple[list, int]:
+    return [f"{SEEN_PREFIX}:{update_id // SEEN_BLOCK_BITS}", STATS_KEY], update_id % SEEN_BLOCK_BITS
+
+
+async def enqueue_update(update, raw_body: str) -> Optional[str]:
+    """Append a validated update to its shard stream.
+
+    Returns:
+        Stream entry id, or None if this update_id was already received
+    """
+    keys, offset = _seen_keys(update.update_id)
+    return await _script("enqueue", _ENQUEUE_LUA)(
+        keys=[*keys, shard_key(shard_for(update))],
+        args=[offset, settings.TELEGRAM_UPDATE_DEDUP_TTL_SECONDS, settings.TELEGRAM_STREAM_MAXLEN,
+              raw_body, f"{time.time():.3f}"],
+    )
+
+
+async def mark_seen(update_id: int) -> bool:
+    """Record an update processed inline; False if it is a duplicate."""
+    keys, offset = _seen_keys(update_id)
+    return bool(await _script("mark_seen", _MARK_SEEN_LUA)(
+        keys=keys, args=[offset, settings.TELEGRAM_UPDATE_DEDUP_TTL_SECONDS],
+    ))
+
+
+async def forget_seen(update_id: int) -> None:
+    """Let Telegram's retry through after inline processing failed."""
+    keys, offset = _seen_keys(update_id)
+    await get_async_redis().setbit(keys[0], offset, 0)
+
+
+async def _ensure_group(redis, key: str) -> None:
+    try:
+        await redis.xgroup_create(key, GROUP, id="0", mkstream=True)
+    except Exception as exc:  # BUSYGROUP: group already exists
+        if "BUSYGROUP" not in str(exc):
+            raise
+
+
+async def _handle(dp, bot, fields: dict) -> None:
+    from aiogram.types import Update
+
+    update = Update.model_validate_json(fields["update"])
+    await dp.feed_update(bot=bot, update=update)
+
+
+async def _process(redis, dp, bot, key: str, entries: list) -> None:
+    """Handle entries of one shard in order, then ack them in one round trip."""
+    processed, dead = 0, []
+    for entry_id, fields in entries:
+        error = None
+        for attempt in range(1, settings.TELEGRAM_STREAM_MAX_ATTEMPTS + 1):
+            try:
+                await _handle(dp, bot, fields)
+                error = None
+                break
+            except Exception as exc:
+                error = exc
+                logger.warning(
+                    "Update handling failed",
+                    extra={"stream": key, "entry_id": str(entry_id), "attempt": attempt},
+                    exc_info=True,
+                )
+                await asyncio.sleep(min(2 ** attempt * 0.1, 2))
+        if error is None:
+            processed += 1
+        else:
+            dead.append((entry_id, fields, error))
+
+    pipe = redis.pipeline(transaction=False)
+    for entry_id, fields, error in dead:
+        pipe.xadd(DEAD_LETTER_KEY, {
+            **fields,
+            "stream": key,
+            "entry_id": entry_id,
+            "error": repr(error)[:1000],
+            "failed_at": f"{time.time():.3f}",
+        }, maxlen=settings.TELEGRAM_STREAM_MAXLEN, approximate=True)
+    pipe.xack(key, GROUP, *[entry_id for entry_id, _ in entries])
+    pipe.hincrby(STATS_KEY, "processed", processed)
+    if dead:
+        pipe.hincrby(STATS_KEY, "dead_lettered", len(dead))
+        logger.error("Updates moved to dead-letter stream", extra={"stream": key, "count": len(dead)})
+    await pipe.execute()
+
+
+async def consume_shard(dp, bot, shard: int, consumer: str, stop: asyncio.Event) -> None:
+    redis = get_async_redis()
+    key = shard_key(shard)
+    await _ensure_group(redis, key)
+    # Own pending entries first (left over from a crash), then new ones.
+    # TELEGRAM_STREAM_BLOCK_MS must stay below REDIS_SOCKET_TIMEOUT.
+    last_id = "0"
+    while not stop.is_set():
+        try:
+            reply = await redis.xreadgroup(
+                GROUP, consumer, {key: last_id},
+                count=settings.TELEGRAM_STREAM_BATCH_SIZE,
+                block=None if last_id == "0" else settings.TELEGRAM_STREAM_BLOCK_MS,
+            )
+        except Exception:
+            logger.exception("Stream read failed", extra={"stream": key})
+            await asyncio.sleep(1)
+            continue
+        entries = reply[0][1] if reply else []
+        if not entries:
+            last_id = ">"
+            continue
+        await _process(redis, dp, bot, key, entries)
+
+
+async def run_consumers(shards: Iterable[int], stop: Optional[asyncio.Event] = None):
+    """Run one consumer task per owned shard until ``stop`` is set."""
+    from bot.bot import get_bot
+    from bot.dispatcher import get_dispatcher
+
+    bot, dp = get_bot(), get_dispatcher()
+    stop = stop or asyncio.Event()
+    # A shard has exactly one owner, so the consumer name is stable across
+    # restarts and hosts: a restarted worker resumes its own pending entries.
+    tasks = [
+        asyncio.create_task(consume_shard(dp, bot, shard, f"shard-{shard}", stop))
+        for shard in shards
+    ]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        await bot.session.close()
+
+
+def stream_stats() -> dict:
+    """Per-shard lag / pending, dead-letter size and throughput counters."""
+    pipe = get_redis().pipeline(transaction=False)
+    for shard in range(settings.TELEGRAM_STREAM_SHARDS):
+        pipe.xinfo_groups(shard_key(shard))
+    pipe.xlen(DEAD_LETTER_KEY)
+    pipe.hgetall(STATS_KEY)
+    *infos, dead_letter, counters = pipe.execute(raise_on_error=False)
+
+    shards = {}
+    for shard, groups in enumerate(infos):
+        if isinstance(groups, Exception):  # stream not created yet
+            continue
+        for group in groups:
+            if group["name"] == GROUP:
+                # "lag" needs Redis 7+
+                shards[shard] = {"lag": group.get("lag"), "pending": group["pending"]}
+    return {
+        "shards": shards,
+        "lag": sum(s["lag"] or 0 for s in shards.values()),
+        "pending": sum(s["pending"] for s in shards.values()),
+        "dead_letter": dead_letter,
+        "processed": int(counters.get("processed", 0)),
+        "dead_lettered": int(counters.get("dead_lettered", 0)),
+        "duplicates": int(counters.get("duplicates", 0)),
+    }
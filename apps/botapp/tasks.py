@@ -0,0 +1,55 @@
+import logging
+
+from celery import shared_task
+
+from .broadcast import reclaim_stale_broadcasts, send_broadcast
+from .identity import flush_last_interactions
+
+try:
+    from bot.data.config import BOT_TOKEN
+except Exception:  # pragma: no cover - bot config might be missing in some envs
+    BOT_TOKEN = None
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(bind=True)
+def flush_last_interactions_task(self):
+    """
+    Bot foydalanuvchilarining buferdagi oxirgi muloqot vaqtlarini bazaga yozish.
+
+    Returns:
+        dict: Yangilangan BotUser lar soni
+    """
+    updated = flush_last_interactions()
+    if updated:
+        logger.info("Flushed bot last_interaction", extra={"updated": updated})
+    return {"updated": updated}
+
+
+@shared_task(bind=True)
+def send_broadcast_task(self, broadcast_id: str):
+    """
+    Ommaviy xabarni Telegram limitlari doirasida yuborish.
+
+    Args:
+        broadcast_id: Broadcast ID (faqat 'pending' holatdagisi yuboriladi)
+
+    Returns:
+        dict: Yuborildi / yuborilmadi / bloklangan soni
+    """
+    if not BOT_TOKEN:
+        logger.warning("Broadcast skipped: BOT_TOKEN is not configured", extra={"broadcast_id": broadcast_id})
+        return {"status": "skipped"}
+    return send_broadcast(broadcast_id, BOT_TOKEN)
+
+
+@shared_task(bind=True)
+def reclaim_stale_broadcasts_task(self):
+    """
+    Worker o'lib qolgani uchun 'running' da qotib qolgan broadcastlarni yopish.
+
+    Returns:
+        dict: 'failed' qilingan broadcastlar soni
+    """
+    return {"reclaimed": reclaim_stale_broadcasts()}
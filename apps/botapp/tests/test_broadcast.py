@@ -0,0 +1,149 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import parse_qs
+
+import fakeredis
+from django.test import TransactionTestCase, override_settings
+
+from apps.botapp import broadcast
+from apps.botapp.models import BotUser, Broadcast
+from apps.common import ratelimit
+from apps.students.models import Student, StudentGroup
+from auth.users.models import User
+
+
+class _TelegramStub(BaseHTTPRequestHandler):
+    """sendMessage: replies queued per chat_id in ``server.replies``, then 200."""
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length'])).decode()
+        chat_id = parse_qs(body)['chat_id'][0]
+        self.server.calls.append((time.monotonic(), chat_id))
+        queued = self.server.replies.get(chat_id)
+        code, payload = queued.pop(0) if queued else (200, {'ok': True})
+        raw = json.dumps(payload).encode()
+        self.send_response(code)
+        self.send_header('Content-Length', str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def log_message(self, *args):
+        pass
+
+
+@override_settings(
+    BROADCAST_GLOBAL_RATE="100/s",
+    BROADCAST_CHAT_RATE="100/s",
+    BROADCAST_MAX_RETRIES=1,
+    BROADCAST_PROGRESS_INTERVAL_SECONDS=0.05,
+    HTTP_CLIENT_HTTP2=False,
+)
+class BroadcastSendTests(TransactionTestCase):
+    """Sending against a local Telegram Bot API stub"""
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _TelegramStub)
+        self.server.calls, self.server.replies = [], {}
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        redis_server = fakeredis.FakeServer()
+        self.enterContext(override_settings(TELEGRAM_API_BASE=f"http://127.0.0.1:{self.server.server_port}"))
+        self.enterContext(mock.patch.object(ratelimit, 'get_redis', lambda *a: fakeredis.FakeRedis(server=redis_server)))
+        self.enterContext(mock.patch.object(ratelimit, '_sync_script', None))
+
+    def send(self, chat_ids, **fields):
+        obj = Broadcast.objects.create(text="Salom", **fields)
+        result = asyncio.run(broadcast.BroadcastSender(obj, "TOKEN").run(chat_ids))
+        obj.refresh_from_db()
+        return obj, result
+
+    def test_counters_progress_and_blocked_users_saved(self):
+        group = StudentGroup.objects.create(name="G1")
+        for i in range(3):
+            bot_user = BotUser.objects.create(user_id=str(100 + i))
+            user = User.objects.create(phone_number=f"+99890000000{i}", first_name="S", bot_user=bot_user)
+            Student.objects.update_or_create(user=user, defaults={'group': group})
+        self.server.replies['101'] = [(403, {'ok': False, 'description': 'Forbidden: bot was blocked by the user'})]
+        obj = Broadcast.objects.create(text="Salom", group=group)
+
+        result = broadcast.send_broadcast(obj.id, "TOKEN")
+
+        self.assertEqual(result, {'status': 'completed', 'sent_count': 2, 'failed_count': 0, 'blocked_count': 1})
+        obj.refresh_from_db()
+        self.assertEqual(
+            (obj.status, obj.total_count, obj.sent_count, obj.blocked_count, obj.progress),
+            ('completed', 3, 2, 1, 100.0),
+        )
+        self.assertIn("403", obj.last_error)
+        self.assertFalse(BotUser.objects.get(user_id='101').is_active)
+        self.assertTrue(BotUser.objects.get(user_id='100').is_active)
+        # a second run of the task does not send again
+        self.assertEqual(broadcast.send_broadcast(obj.id, "TOKEN"), {'status': 'skipped'})
+        self.assertEqual(len(self.server.calls), 3)
+
+    def test_flood_limit_pauses_and_retries(self):
+        self.server.replies['300'] = [(429, {'ok': False, 'parameters': {'retry_after': 1}})]
+
+        with self.assertLogs('apps.botapp.broadcast', 'WARNING'):
+            obj, result = self.send(['300'])
+
+        self.assertEqual(obj.sent_count, 1)
+        self.assertEqual(result['sent_count'], 1)
+        (first, _), (retry, _) = self.server.calls
+        self.assertGreaterEqual(retry - first, 1.0)
+
+    def test_flood_wait_does_not_use_retry_budget(self):
+        self.server.replies['310'] = [
+            (429, {'ok': False, 'parameters': {'retry_after': 1}}),
+            (502, {'ok': False, 'description': 'Bad Gateway'}),
+        ]
+
+        with self.assertLogs('apps.botapp.broadcast', 'WARNING'):
+            obj, result = self.send(['310'])
+
+        # 429, 502, 200: only the 502 counts against BROADCAST_MAX_RETRIES=1
+        self.assertEqual(len(self.server.calls), 3)
+        self.assertEqual((result['sent_count'], result['failed_count']), (1, 0))
+
+    def test_server_error_retried_then_failed(self):
+        self.server.replies['400'] = [(502, {'ok': False, 'description': 'Bad Gateway'})] * 2
+
+        obj, result = self.send(['400'])
+
+        self.assertEqual(len(self.server.calls), 2)  # BROADCAST_MAX_RETRIES=1
+        self.assertEqual((result['sent_count'], result['failed_count']), (0, 1))
+        self.assertEqual(obj.failed_count, 1)
+        self.assertIn("502", obj.last_error)
+
+    @override_settings(BROADCAST_STALE_SECONDS=600)
+    def test_stale_running_broadcast_reclaimed(self):
+        from datetime import timedelta
+        from django.utils import timezone
+
+        dead = Broadcast.objects.create(text="Salom", status='running')
+        alive = Broadcast.objects.create(text="Salom", status='running')
+        Broadcast.objects.filter(pk=dead.pk).update(updated_at=timezone.now() - timedelta(seconds=601))
+
+        with self.assertLogs('apps.botapp.broadcast', 'WARNING'):
+            self.assertEqual(broadcast.reclaim_stale_broadcasts(), 1)
+
+        dead.refresh_from_db()
+        alive.refresh_from_db()
+        self.assertEqual((dead.status, alive.status), ('failed', 'running'))
+        self.assertIsNotNone(dead.finished_at)
+
+    @override_settings(BROADCAST_GLOBAL_RATE="5/s")
+    def test_cancel_stops_sending(self):
+        chat_ids = [str(500 + i) for i in range(20)]
+
+        obj, result = self.send(chat_ids, status='cancelled')
+
+        self.assertTrue(result['cancelled'])
+        self.assertLess(len(self.server.calls), len(chat_ids))
+        self.assertEqual(obj.sent_count, len(self.server.calls))
@@ -0,0 +1,102 @@
+import asyncio
+from datetime import datetime, timezone as dt_timezone
+from unittest import mock
+
+import fakeredis
+from django.db import DatabaseError
+from django.db.models import QuerySet
+from django.test import TransactionTestCase
+
+from apps.botapp import identity
+from apps.botapp.models import BotUser
+from auth.users.models import User
+
+
+class IdentityCacheTests(TransactionTestCase):
+    # async ORM calls run in a worker thread: the data has to be committed
+    def setUp(self):
+        self.server = fakeredis.FakeServer()
+        self.redis = fakeredis.FakeRedis(server=self.server, decode_responses=True)
+        self.async_redis = None
+        patches = [
+            mock.patch.object(identity, "get_async_redis", lambda *a: self.async_redis),
+            mock.patch.object(identity, "get_redis", lambda *a: self.redis),
+            mock.patch.object(identity, "_pop_script", None),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.bot_user = BotUser.objects.create(user_id="777", first_name="Ali")
+
+    def run_async(self, coro_fn):
+        # FakeAsyncRedis is bound to the loop it is first used on
+        async def main():
+            self.async_redis = fakeredis.FakeAsyncRedis(server=self.server, decode_responses=True)
+            return await coro_fn()
+
+        return asyncio.run(main())
+
+    def test_cache_hit_skips_database(self):
+        async def scenario():
+            first = await identity.resolve_identity(777)
+            with mock.patch.object(identity, "_load", side_effect=AssertionError("DB queried")):
+                second = await identity.resolve_identity(777)
+            return first, second
+
+        first, second = self.run_async(scenario)
+        self.assertEqual(first, identity.Identity(str(self.bot_user.id), None))
+        self.assertEqual(second, first)
+        self.assertIsNotNone(self.redis.zscore(identity.LAST_INTERACTION_KEY, "777"))
+
+    def test_unknown_user_not_cached(self):
+        async def scenario():
+            return await identity.resolve_identity(555)
+
+        self.assertIsNone(self.run_async(scenario))
+        self.assertIsNone(self.redis.get(identity._key("555")))
+
+    def test_forget_identity_after_registration(self):
+        async def scenario():
+            before = await identity.resolve_identity(777)
+            user = await User.objects.acreate(phone_number="+998901112233", first_name="Ali", bot_user=self.bot_user)
+            stale = await identity.resolve_identity(777)
+            await identity.forget_identity(777)
+            fresh = await identity.resolve_identity(777)
+            return before, stale, fresh, user
+
+        before, stale, fresh, user = self.run_async(scenario)
+        self.assertFalse(before.registered)
+        self.assertFalse(stale.registered)  # still served from the cache
+        self.assertTrue(fresh.registered)
+        self.assertEqual(fresh.user_id, str(user.id))
+
+    def test_flush_writes_buffered_timestamps(self):
+        other = BotUser.objects.create(user_id="888")
+        BotUser.objects.filter(pk__in=[self.bot_user.pk, other.pk]).update(
+            last_interaction=datetime(2000, 1, 1, tzinfo=dt_timezone.utc)
+        )
+        self.redis.zadd(identity.LAST_INTERACTION_KEY, {"777": 1_700_000_000, "888": 1_700_000_500, "999": 1})
+
+        self.assertEqual(identity.flush_last_interactions(), 2)
+
+        self.bot_user.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(self.bot_user.last_interaction.timestamp(), 1_700_000_000)
+        self.assertEqual(other.last_interaction.timestamp(), 1_700_000_500)
+        self.assertEqual(self.redis.zcard(identity.LAST_INTERACTION_KEY), 0)
+
+    def test_failed_flush_requeues_without_overwriting_newer(self):
+        BotUser.objects.create(user_id="888")
+        self.redis.zadd(identity.LAST_INTERACTION_KEY, {"777": 1_700_000_000, "888": 1_700_000_500})
+
+        def fail(*args, **kwargs):
+            # 777 interacted again while the flush was running
+            self.redis.zadd(identity.LAST_INTERACTION_KEY, {"777": 1_700_000_900})
+            raise DatabaseError("db down")
+
+        with mock.patch.object(QuerySet, "update", side_effect=fail):
+            with self.assertRaises(DatabaseError):
+                identity.flush_last_interactions()
+
+        self.assertEqual(self.redis.zscore(identity.LAST_INTERACTION_KEY, "777"), 1_700_000_900)
+        self.assertEqual(self.redis.zscore(identity.LAST_INTERACTION_KEY, "888"), 1_700_000_500)
@@ -0,0 +1,188 @@
+import asyncio
+import importlib
+import json
+import os
+from unittest import mock
+
+import fakeredis
+from aiogram.types import Update
+from django.test import AsyncClient, SimpleTestCase, override_settings
+from django.urls import reverse
+
+from apps.botapp import stream
+
+
+def make_update(update_id, chat_id=42):
+    raw = json.dumps({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "Test"},
+            "text": "hi",
+        },
+    })
+    return Update.model_validate_json(raw), raw
+
+
+class RecordingDispatcher:
+    """Stands in for aiogram's dispatcher; stops the consumer once ``expected`` ids were handled."""
+
+    def __init__(self, stop, expected, failing=()):
+        self.stop = stop
+        self.expected = set(expected)
+        self.failing = set(failing)
+        self.calls = []
+
+    async def feed_update(self, bot, update):
+        self.calls.append(update.update_id)
+        if self.expected <= set(self.calls):
+            self.stop.set()
+        if update.update_id in self.failing:
+            raise RuntimeError("handler failed")
+
+
+@override_settings(TELEGRAM_STREAM_BLOCK_MS=50, TELEGRAM_STREAM_MAX_ATTEMPTS=2)
+class UpdateStreamTests(SimpleTestCase):
+    def setUp(self):
+        self.server = fakeredis.FakeServer()
+        self.redis = fakeredis.FakeRedis(server=self.server, decode_responses=True)
+        self.async_redis = None
+        patches = [
+            mock.patch.object(stream, "get_async_redis", lambda *a: self.async_redis),
+            mock.patch.object(stream, "get_redis", lambda *a: self.redis),
+            mock.patch.dict(stream._scripts, clear=True),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def run_async(self, coro_fn):
+        # FakeAsyncRedis is bound to the loop it is first used on
+        async def main():
+            self.async_redis = fakeredis.FakeAsyncRedis(server=self.server, decode_responses=True)
+            return await coro_fn()
+
+        return asyncio.run(main())
+
+    async def consume(self, dp, shard, consumer="shard-test"):
+        await asyncio.wait_for(stream.consume_shard(dp, None, shard, consumer, dp.stop), timeout=5)
+
+    def test_pending_entries_replayed_after_restart(self):
+        update, raw = make_update(1)
+        shard = stream.shard_for(update)
+        key = stream.shard_key(shard)
+
+        async def scenario():
+            for update_id in (1, 2):
+                await stream.enqueue_update(*make_update(update_id))
+            # A consumer read both entries and died before acking them
+            await stream._ensure_group(self.async_redis, key)
+            await self.async_redis.xreadgroup(stream.GROUP, "shard-test", {key: ">"})
+            dp = RecordingDispatcher(asyncio.Event(), expected={1, 2})
+            await self.consume(dp, shard)
+            return dp.calls
+
+        self.assertEqual(self.run_async(scenario), [1, 2])
+        self.assertEqual(self.redis.xpending(key, stream.GROUP)["pending"], 0)
+
+    def test_failing_update_retried_then_dead_lettered(self):
+        update, raw = make_update(3)
+        shard = stream.shard_for(update)
+        key = stream.shard_key(shard)
+
+        async def scenario():
+            for update_id in (3, 4):
+                await stream.enqueue_update(*make_update(update_id))
+            dp = RecordingDispatcher(asyncio.Event(), expected={3, 4}, failing={3})
+            await self.consume(dp, shard)
+            return dp.calls
+
+        with self.assertLogs("apps.botapp.stream", "WARNING"):
+            calls = self.run_async(scenario)
+        self.assertEqual(calls, [3, 3, 4])
+
+        dead = self.redis.xrange(stream.DEAD_LETTER_KEY)
+        self.assertEqual(len(dead), 1)
+        fields = dead[0][1]
+        self.assertEqual(fields["update"], raw)
+        self.assertEqual(fields["stream"], key)
+        self.assertIn("handler failed", fields["error"])
+        # the failed entry is acked too, it lives on only in the dead-letter stream
+        self.assertEqual(self.redis.xpending(key, stream.GROUP)["pending"], 0)
+
+    def test_stats_report_acked_and_dead_lettered_counts(self):
+        update, _ = make_update(5)
+        shard = stream.shard_for(update)
+
+        async def scenario():
+            for update_id in (5, 6, 7):
+                await stream.enqueue_update(*make_update(update_id))
+            dp = RecordingDispatcher(asyncio.Event(), expected={5, 6, 7}, failing={6})
+            await self.consume(dp, shard)
+
+        with self.assertLogs("apps.botapp.stream", "WARNING"):
+            self.run_async(scenario)
+
+        stats = stream.stream_stats()
+        self.assertEqual(stats["processed"], 2)
+        self.assertEqual(stats["dead_lettered"], 1)
+        self.assertEqual(stats["dead_letter"], 1)
+        self.assertEqual(stats["pending"], 0)
+        self.assertEqual(stats["shards"][shard]["pending"], 0)
+
+    def test_redelivered_update_id_is_queued_once(self):
+        update, raw = make_update(70001)
+        key = stream.shard_key(stream.shard_for(update))
+
+        async def scenario():
+            first = await stream.enqueue_update(update, raw)
+            second = await stream.enqueue_update(update, raw)
+            return first, second
+
+        first, second = self.run_async(scenario)
+        self.assertIsNotNone(first)
+        self.assertIsNone(second)
+        self.assertEqual(self.redis.xlen(key), 1)
+        self.assertEqual(self.redis.hget(stream.STATS_KEY, "duplicates"), "1")
+
+        seen_key = f"{stream.SEEN_PREFIX}:1"  # 70001 // 65536
+        self.assertEqual(self.redis.getbit(seen_key, 70001 % stream.SEEN_BLOCK_BITS), 1)
+        self.assertGreater(self.redis.ttl(seen_key), 0)
+
+    def test_mark_seen_and_forget_seen(self):
+        async def scenario():
+            results = [await stream.mark_seen(8), await stream.mark_seen(8)]
+            await stream.forget_seen(8)
+            results.append(await stream.mark_seen(8))
+            return results
+
+        self.assertEqual(self.run_async(scenario), [True, False, True])
+
+    @override_settings(TELEGRAM_WEBHOOK_QUEUE_ENABLED=False)
+    def test_inline_failure_lets_telegram_retry_through(self):
+        os.environ["TELEGRAM_WEBHOOK_SECRET"] = "testsecret"
+        from apps.botapp import views
+        importlib.reload(views)
+        from bot.bot import bot
+
+        url = reverse("telegram_webhook", kwargs={"token": bot.token})
+        _, raw = make_update(9)
+        dp = mock.Mock(feed_update=mock.AsyncMock(side_effect=[RuntimeError("handler failed"), None]))
+
+        async def scenario():
+            client = AsyncClient()
+            statuses = []
+            with mock.patch("bot.dispatcher.get_dispatcher", return_value=dp):
+                for _ in range(3):
+                    resp = await client.post(
+                        url, data=raw, content_type="application/json",
+                        headers={"X-Telegram-Bot-Api-Secret-Token": "testsecret"},
+                    )
+                    statuses.append((resp.status_code, json.loads(resp.content)["status"]))
+            return statuses
+
+        # failed -> bit cleared -> retry handled -> further re-delivery dropped
+        self.assertEqual(self.run_async(scenario), [(500, "error"), (200, "ok"), (200, "duplicate")])
+        self.assertEqual(dp.feed_update.await_count, 2)
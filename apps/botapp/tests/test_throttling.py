@@ -0,0 +1,63 @@
+import asyncio
+from datetime import datetime
+from unittest import mock
+
+import fakeredis
+from aiogram.types import CallbackQuery, Chat, Contact, Message, User
+from django.test import SimpleTestCase
+
+from apps.common import ratelimit
+from bot.middlewares.throttling import ThrottlingMiddleware
+
+USER = User(id=7, is_bot=False, first_name="Test")
+
+
+def message(text=None, **fields):
+    return Message(
+        message_id=1, date=datetime(2024, 1, 1), chat=Chat(id=7, type="private"), from_user=USER, text=text, **fields
+    )
+
+
+def callback(data):
+    return CallbackQuery(id="1", from_user=USER, chat_instance="ci", data=data)
+
+
+class HandlerKeyTests(SimpleTestCase):
+    def test_commands(self):
+        self.assertEqual(ThrottlingMiddleware.handler_key(message("/start")), "cmd:start")
+        self.assertEqual(ThrottlingMiddleware.handler_key(message("/Login@uz_kahoot_bot +998901234567")), "cmd:login")
+
+    def test_callbacks(self):
+        self.assertEqual(ThrottlingMiddleware.handler_key(callback("qa:abc:0:1")), "cb:qa")
+        self.assertEqual(ThrottlingMiddleware.handler_key(callback("menu")), "cb:menu")
+        self.assertIsNone(ThrottlingMiddleware.handler_key(callback(None)))
+
+    def test_other_messages(self):
+        contact = Contact(phone_number="+998901234567", first_name="Test")
+        self.assertEqual(ThrottlingMiddleware.handler_key(message(contact=contact)), "contact")
+        self.assertIsNone(ThrottlingMiddleware.handler_key(message("salom")))
+
+
+class ThrottlingMiddlewareTests(SimpleTestCase):
+    def test_handler_limit_and_single_notice(self):
+        middleware = ThrottlingMiddleware(rate="4/m", handler_rates={"cmd:login": "1/m"})
+        texts = ["/login", "/login", "/login@uz_kahoot_bot", "salom", "salom", "salom", "salom"]
+        handled = []
+
+        async def handler(event, data):
+            handled.append(event.text)
+
+        async def scenario():
+            redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+            with mock.patch.object(ratelimit, "get_async_redis", lambda *a: redis), \
+                    mock.patch.object(ratelimit, "_async_script", None), \
+                    mock.patch.object(Message, "answer", new_callable=mock.AsyncMock) as answer:
+                for text in texts:
+                    await middleware(handler, message(text), {"event_from_user": USER})
+            return answer
+
+        answer = asyncio.run(scenario())
+        # rejected /login updates do not use up the per-user limit: 3 more "salom" get through
+        self.assertEqual(handled, ["/login", "salom", "salom", "salom"])
+        # warned once, later rejections in the same window are silent
+        answer.assert_awaited_once()
@@ -1,7 +1,7 @@
 import os
 import json
 import importlib
-from django.test import AsyncClient, SimpleTestCase
+from django.test import AsyncClient, RequestFactory, SimpleTestCase, TestCase, override_settings
 from django.urls import reverse
 
 
@@ -44,3 +44,77 @@ class WebhookViewTests(SimpleTestCase):
             headers={"X-Telegram-Bot-Api-Secret-Token": "testsecret"},
         )
         assert resp.status_code in (200, 500)
+
+    async def test_webhook_queues_update_and_acks(self):
+        os.environ["TELEGRAM_WEBHOOK_SECRET"] = "testsecret"
+        from unittest import mock
+        from apps.botapp import views
+        importlib.reload(views)
+        from bot.bot import bot
+
+        url = reverse("telegram_webhook", kwargs={"token": bot.token})
+        client = AsyncClient()
+        payload = {"update_id": 5, "message": {"message_id": 1, "date": 0, "chat": {"id": 42, "type": "private"}, "text": "hi"}}
+        with mock.patch.object(views, "enqueue_update", mock.AsyncMock()) as enqueue, \
+                mock.patch("bot.dispatcher.get_dispatcher") as get_dispatcher:
+            resp = await client.post(
+                url,
+                data=json.dumps(payload),
+                content_type="application/json",
+                headers={"X-Telegram-Bot-Api-Secret-Token": "testsecret"},
+            )
+        assert resp.status_code == 200
+        assert json.loads(resp.content)["status"] == "queued"
+        enqueue.assert_awaited_once()
+        # Queued updates never build the dispatcher in the web worker
+        get_dispatcher.assert_not_called()
+
+    async def test_webhook_drops_redelivered_update(self):
+        os.environ["TELEGRAM_WEBHOOK_SECRET"] = "testsecret"
+        from unittest import mock
+        from apps.botapp import views
+        importlib.reload(views)
+        from bot.bot import bot
+
+        url = reverse("telegram_webhook", kwargs={"token": bot.token})
+        client = AsyncClient()
+        payload = {"update_id": 5, "message": {"message_id": 1, "date": 0, "chat": {"id": 42, "type": "private"}, "text": "hi"}}
+        # enqueue_update returns None when update_id was already received
+        with mock.patch.object(views, "enqueue_update", mock.AsyncMock(return_value=None)):
+            resp = await client.post(
+                url,
+                data=json.dumps(payload),
+                content_type="application/json",
+                headers={"X-Telegram-Bot-Api-Secret-Token": "testsecret"},
+            )
+        assert resp.status_code == 200
+        assert json.loads(resp.content)["status"] == "duplicate"
+
+
+class HealthDetailsTests(SimpleTestCase):
+    @override_settings(METRICS_TOKEN="s3cret", DEBUG=False)
+    def test_diagnostics_need_token(self):
+        from unittest import mock
+        from apps.botapp.views import health_details
+
+        usage = {"active_codes": 3, "capacity": 90000, "utilization": 3.3e-05}
+        with mock.patch("auth.utils.otp.OTPManager.utilization", return_value=usage):
+            anonymous = health_details(RequestFactory().get("/health/details/"))
+            authorized = health_details(
+                RequestFactory().get("/health/details/", HTTP_AUTHORIZATION="Bearer s3cret")
+            )
+        assert anonymous.status_code == 403
+        assert authorized.status_code == 200
+        assert json.loads(authorized.content)["telegram_otp"] == usage
+
+
+class HealthCheckTests(TestCase):
+    def test_probe_reports_liveness_only(self):
+        from unittest import mock
+        from apps.botapp import views
+
+        with mock.patch.object(views, "get_redis") as get_redis:
+            resp = views.health_check(RequestFactory().get("/health/"))
+        get_redis.return_value.ping.assert_called_once()
+        assert resp.status_code == 200
+        assert set(json.loads(resp.content)) == {"service", "ok", "db", "redis", "bot_token"}
@@ -1,27 +1,29 @@
 from __future__ import annotations
 
 import json
+import logging
 from typing import Any, Dict
 
+from django.conf import settings
 from django.http import JsonResponse, HttpResponseForbidden, HttpRequest, HttpResponse
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
 from environs import Env
 from django.db import connection
 
-from aiogram.types import Update
-from bot.dispatcher import dp
-from bot.bot import bot
+# aiogram, Bot va Dispatcher shu yerda import qilinmaydi: ular birinchi
+# webhook so'rovida quriladi (bot.bot.get_bot / bot.dispatcher.get_dispatcher)
+from bot.bot import BOT_TOKEN
 
-try:
-    import redis as redis_lib
-except Exception:  # pragma: no cover - optional at runtime
-    redis_lib = None
+from apps.common.redis_client import get_redis, pool_stats
+from apps.common.views import has_metrics_token
+from .stream import enqueue_update, forget_seen, mark_seen, stream_stats
 
 env = Env(); env.read_env()
 WEBHOOK_SECRET = env.str("TELEGRAM_WEBHOOK_SECRET", default="")
 MAX_BODY_BYTES = env.int("TELEGRAM_WEBHOOK_MAX_BODY", default=2_000_000)  # ~2MB
-REDIS_URL = env.str("REDIS_URL", default="redis://redis:6379/1")
+
+logger = logging.getLogger(__name__)
 
 
 @require_http_methods(["GET"])
@@ -30,7 +32,7 @@ def health_check(request: HttpRequest) -> JsonResponse:
 
     Performs quick checks:
     - Database connection (simple cursor)
-    - Redis ping (if redis extra available)
+    - Redis ping over the shared connection pool
     - Bot token presence (does not call Telegram)
     """
     status: Dict[str, Any] = {"service": "django-bot", "ok": True}
@@ -44,30 +46,66 @@ def health_check(request: HttpRequest) -> JsonResponse:
         status["ok"] = False
         status["db"] = f"error: {e}"
 
-    # Redis check (optional)
-    if redis_lib is not None:
-        try:
-            r = redis_lib.from_url(REDIS_URL)
-            r.ping()
-            status["redis"] = "ok"
-        except Exception as e:  # pragma: no cover
-            status["ok"] = False
-            status["redis"] = f"error: {e}"
+    # Redis check over the shared pool (no new connection per probe)
+    try:
+        get_redis().ping()
+        status["redis"] = "ok"
+    except Exception as e:  # pragma: no cover
+        status["ok"] = False
+        status["redis"] = f"error: {e}"
 
     # Bot token presence
-    status["bot_token"] = bool(getattr(bot, "token", None))
+    status["bot_token"] = bool(BOT_TOKEN)
 
     http_status = 200 if status.get("ok") else 500
     return JsonResponse(status, status=http_status)
 
 
+@require_http_methods(["GET"])
+def health_details(request: HttpRequest) -> JsonResponse:
+    """Internal diagnostics for operators (not for probes).
+
+    Pools, caches, OTP store and update queue numbers. Open to staff users or
+    ``Authorization: Bearer <METRICS_TOKEN>``: the numbers tell an attacker,
+    for example, how likely a guessed login code is.
+    """
+    user = getattr(request, "user", None)
+    if not (has_metrics_token(request) or (user is not None and user.is_staff)):
+        return JsonResponse({"detail": "forbidden"}, status=403)
+
+    status: Dict[str, Any] = {"redis_pools": pool_stats()}
+
+    # Per-process auth user cache hit rate
+    from auth.users.cache import user_cache_stats
+    status["user_cache"] = user_cache_stats()
+
+    # Which store served OTP calls, Redis circuit breaker state
+    from apps.common.otp import otp_store_stats
+    status["otp_store"] = otp_store_stats()
+
+    # Telegram login OTP keyspace: active codes vs capacity (= chance of a lucky guess)
+    try:
+        from auth.utils.otp import OTPManager
+        status["telegram_otp"] = OTPManager().utilization()
+    except Exception as e:  # pragma: no cover
+        status["telegram_otp"] = f"error: {e}"
+
+    # Webhook update queue: lag, pending, dead letters, processed count
+    if settings.TELEGRAM_WEBHOOK_QUEUE_ENABLED:
+        try:
+            status["update_queue"] = stream_stats()
+        except Exception as e:  # pragma: no cover
+            status["update_queue"] = f"error: {e}"
+    return JsonResponse(status)
+
+
 @require_http_methods(["GET"])
 def bot_status(request: HttpRequest) -> JsonResponse:
     """Basic bot status without external API calls."""
     try:
         bot_info = {
             "status": "running",
-            "has_token": bool(getattr(bot, "token", None)),
+            "has_token": bool(BOT_TOKEN),
         }
         return JsonResponse(bot_info)
     except Exception as e:  # pragma: no cover
@@ -89,15 +127,20 @@ async def telegram_webhook(request: HttpRequest, token: str) -> HttpResponse:
         request: Django HTTP request
         token: Bot token from URL path
 
+    Valid updates are appended to a Redis Stream and processed by
+    ``manage.py consume_updates`` (apps/botapp/stream.py), so slow handlers
+    do not hold the response. If the queue is disabled or Redis is down the
+    update is processed inline as before.
+
     Returns:
-        200 OK if processed
+        200 OK if queued or processed
         403 Forbidden if validation fails
         400 Bad Request if invalid JSON or wrong Content-Type
         413 Payload Too Large if body exceeds limit
         500 Internal Server Error if processing fails
     """
     # 1) Path token must match actual bot token
-    if token != bot.token:
+    if token != BOT_TOKEN:
         return HttpResponseForbidden("Invalid token")
 
     # 2) Verify Telegram secret header
@@ -119,15 +162,42 @@ async def telegram_webhook(request: HttpRequest, token: str) -> HttpResponse:
         return JsonResponse({"status": "bad_request", "error": "Payload too large"}, status=413)
 
     # 5) Parse update
+    from aiogram.types import Update
+
     try:
         raw_body = request.body.decode("utf-8")
         update = Update.model_validate_json(raw_body)
     except Exception as e:
         return JsonResponse({"status": "bad_request", "error": str(e)}, status=400)
 
-    # 6) Hand over to aiogram dispatcher
+    # 6) Queue for the stream consumers and acknowledge immediately.
+    #    Re-delivered update_ids are dropped in the same Redis call.
+    if settings.TELEGRAM_WEBHOOK_QUEUE_ENABLED:
+        try:
+            if await enqueue_update(update, raw_body) is None:
+                return JsonResponse({"status": "duplicate"})
+            return JsonResponse({"status": "queued"})
+        except Exception:
+            logger.warning("Update queue unavailable, processing inline", exc_info=True)
+
+    # 7) Hand over to aiogram dispatcher (duplicates dropped when Redis is reachable)
+    seen = False
+    try:
+        if not await mark_seen(update.update_id):
+            return JsonResponse({"status": "duplicate"})
+        seen = True
+    except Exception:
+        logger.warning("Update de-duplication unavailable", exc_info=True)
+    from bot.bot import get_bot
+    from bot.dispatcher import get_dispatcher
+
     try:
-        await dp.feed_update(bot=bot, update=update)
+        await get_dispatcher().feed_update(bot=get_bot(), update=update)
     except Exception as e:  # pragma: no cover - handler/runtime errors
+        if seen:
+            try:
+                await forget_seen(update.update_id)
+            except Exception:
+                pass
         return JsonResponse({"status": "error", "error": str(e)}, status=500)
     return JsonResponse({"status": "ok"})
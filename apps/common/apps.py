@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class CommonConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.common'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from .metrics import install_db_wrapper
+
+        # DB query count/time for request metrics (apps/common/metrics.py)
+        connection_created.connect(install_db_wrapper, dispatch_uid='metrics-db-wrapper')
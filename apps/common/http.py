@@ -0,0 +1,96 @@
+"""Process-wide pooled HTTP client for outbound provider calls.
+
+Celery tasks used to open a new ``httpx.Client`` per call, paying a TCP and
+TLS handshake for every SMS / Telegram message. The client here lives as
+long as the worker process, keeps connections alive and speaks HTTP/2 when
+the ``h2`` package is installed (``httpx[http2]``). It is dropped after a
+fork and closed on worker shutdown.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Optional
+
+import httpx
+from celery.signals import worker_process_init, worker_process_shutdown
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+try:  # pragma: no cover - optional extra
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:  # pragma: no cover
+    HTTP2_AVAILABLE = False
+
+_client: Optional[httpx.Client] = None
+_lock = threading.Lock()
+
+
+def get_http_client() -> httpx.Client:
+    """Shared client (thread-safe); created on first use in each process."""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = httpx.Client(
+                    http2=settings.HTTP_CLIENT_HTTP2 and HTTP2_AVAILABLE,
+                    timeout=settings.HTTP_CLIENT_TIMEOUT_SECONDS,
+                    limits=httpx.Limits(
+                        max_connections=settings.HTTP_CLIENT_MAX_CONNECTIONS,
+                        max_keepalive_connections=settings.HTTP_CLIENT_MAX_CONNECTIONS,
+                        keepalive_expiry=settings.HTTP_CLIENT_KEEPALIVE_SECONDS,
+                    ),
+                )
+    return _client
+
+
+def close_http_client() -> None:
+    global _client
+    with _lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+@worker_process_init.connect
+def _reset_after_fork(**kwargs):
+    # Sockets inherited from the parent must not be shared between processes
+    global _client
+    _client = None
+
+
+@worker_process_shutdown.connect
+def _close_on_shutdown(**kwargs):
+    close_http_client()
+
+
+def telegram_send_many(token: str, chat_ids: Iterable, text: str, **params) -> dict:
+    """Send ``text`` to several chats concurrently over the pooled client.
+
+    At most ``TELEGRAM_FANOUT_CONCURRENCY`` requests are in flight. Failures
+    are logged per chat and counted, they do not stop the other sends.
+
+    Returns:
+        {"sent": int, "failed": [chat_id, ...]}
+    """
+    url = f"{settings.TELEGRAM_API_BASE}/bot{token}/sendMessage"
+    client = get_http_client()
+
+    def send(chat_id):
+        try:
+            client.post(url, data={"chat_id": chat_id, "text": text, **params}).raise_for_status()
+            return None
+        except httpx.HTTPError:
+            logger.exception("Telegram send failed", extra={"chat_id": chat_id})
+            return chat_id
+
+    chat_ids = list(chat_ids)
+    if not chat_ids:
+        return {"sent": 0, "failed": []}
+    workers = min(settings.TELEGRAM_FANOUT_CONCURRENCY, len(chat_ids))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tg-fanout") as pool:
+        failed = [chat_id for chat_id in pool.map(send, chat_ids) if chat_id is not None]
+    return {"sent": len(chat_ids) - len(failed), "failed": failed}
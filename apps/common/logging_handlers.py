@@ -1,8 +1,11 @@
 import logging
 import os
+import threading
+import time
 import traceback
-from typing import Iterable, Optional
+from typing import Dict, Optional
 
+from apps.common.metrics import current as current_request
 from apps.common.tasks_alerts import send_telegram_alert_task
 
 
@@ -37,34 +40,194 @@ class ProductionErrorFilter(logging.Filter):
         return True
 
 
+class RequestContextFilter(logging.Filter):
+    """Add method/path/status/ms/user_id/ip of the request being served.
+
+    The values come from RequestMetricsMiddleware; attributes already set
+    on the record (``extra=``) win. ``request.user`` is read only if it was
+    already resolved, so logging never triggers an auth query.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:  # type: ignore[override]
+        stats = current_request.get()
+        if stats is None:
+            return True
+        request = stats.request
+        user = request.__dict__.get("user")
+        user = getattr(user, "_wrapped", user)  # unevaluated SimpleLazyObject -> sentinel
+        context = {
+            "method": request.method,
+            "path": request.path,
+            "status": getattr(record, "status_code", ""),
+            "ms": round((time.perf_counter() - stats.started) * 1000),
+            "user_id": getattr(user, "pk", "") or "",
+            "ip": request.META.get("HTTP_X_REAL_IP") or request.META.get("REMOTE_ADDR", ""),
+        }
+        for key, value in context.items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+
+class _Bucket:
+    """Aggregated records sharing one fingerprint within a digest window."""
+
+    __slots__ = ("count", "first_seen", "last_seen", "sample")
+
+    def __init__(self, created: float, sample: str):
+        self.count = 1
+        self.first_seen = created
+        self.last_seen = created
+        self.sample = sample
+
+
 class TelegramAdminHandler(logging.Handler):
     """Logging handler that sends ERROR+ records to Telegram admins.
 
-    It uses bot.data.config (BOT_TOKEN, ADMINS). If not available or disabled
-    via ERROR_ALERTS_ENABLED, it silently does nothing.
+    Records are not sent one by one: ``emit`` only aggregates them by
+    fingerprint (logger, exception type, raising location) in a bounded
+    in-process buffer, and a background thread enqueues a single digest
+    task per ``interval`` with a count and one sample traceback per
+    fingerprint. When the buffer holds ``capacity`` fingerprints, new ones
+    are dropped and counted instead of blocking the logging thread.
+
+    Admins come from ADMINS; ERROR_ALERTS_ENABLED=false or no admins
+    disables the handler. ALERT_DIGEST_INTERVAL_SECONDS and
+    ALERT_BUFFER_SIZE override the defaults.
     """
 
-    def __init__(self):
+    sample_chars = 1500  # per fingerprint; the exception line is at the tail
+    max_entries = 10  # fingerprints shown in one digest, by count
+
+    def __init__(self, interval: Optional[float] = None, capacity: Optional[int] = None):
         super().__init__()
         self.enabled = os.getenv("ERROR_ALERTS_ENABLED", "true").lower() in {"1", "true", "yes"}
         self.disabled = False
         admins = os.getenv("ADMINS", "").split(",")
-        self.admin_ids = [a for a in (admins or []) if str(a).strip()]
+        self.admin_ids = [a.strip() for a in (admins or []) if str(a).strip()]
         if not self.admin_ids or not self.enabled:
             # disable handler if not configured
             self.disabled = True
+        self.addFilter(RequestContextFilter())
+        self.interval = float(interval or os.getenv("ALERT_DIGEST_INTERVAL_SECONDS", "60"))
+        self.capacity = int(capacity or os.getenv("ALERT_BUFFER_SIZE", "100"))
+        self._reset()
+        if hasattr(os, "register_at_fork"):
+            # the flusher thread and a possibly held lock do not survive fork
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self) -> None:
+        self._buffer_lock = threading.Lock()
+        self._buffer: Dict[str, _Bucket] = {}
+        self._dropped = 0
+        self._window_start = time.time()
+        self._stop = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+
+    def handle(self, record: logging.LogRecord):  # type: ignore[override]
+        # No Handler.lock around emit(): the buffer has its own short lock,
+        # so threads never queue behind another thread formatting a traceback.
+        rv = self.filter(record)
+        if rv:
+            self.emit(rv if isinstance(rv, logging.LogRecord) else record)
+        return rv
 
     def emit(self, record: logging.LogRecord) -> None:  # type: ignore[override]
         if self.disabled:
             return
         try:
-            text = self._format_text(record)
-            # enqueue a single task that will send to all admins and chunk as needed
-            send_telegram_alert_task.apply_async(kwargs={"text": text, "chat_ids": self.admin_ids})
+            self._ensure_flusher()
+            key = self._fingerprint(record)
+            with self._buffer_lock:
+                if self._count(key, record.created):
+                    return
+                if len(self._buffer) >= self.capacity:
+                    self._dropped += 1
+                    return
+            # formatting the traceback happens outside the lock, once per fingerprint
+            sample = self._truncate(self._format_text(record))
+            with self._buffer_lock:
+                if not self._count(key, record.created):
+                    self._buffer[key] = _Bucket(record.created, sample)
         except Exception:  # pragma: no cover - best-effort
             # We should never raise from logging
             pass
 
+    def _count(self, key: str, created: float) -> bool:
+        bucket = self._buffer.get(key)
+        if bucket is None:
+            return False
+        bucket.count += 1
+        bucket.last_seen = max(bucket.last_seen, created)
+        return True
+
+    def _ensure_flusher(self) -> None:
+        if self._flusher is not None:
+            return
+        with self._buffer_lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._run, name="telegram-alert-digest", daemon=True)
+                self._flusher.start()
+
+    def _run(self) -> None:
+        stop = self._stop
+        while not stop.wait(self.interval):
+            self.flush()
+
+    def flush(self) -> None:  # type: ignore[override]
+        """Enqueue the digest of everything buffered since the last flush."""
+        with self._buffer_lock:
+            buffer, dropped, since = self._buffer, self._dropped, self._window_start
+            self._buffer, self._dropped, self._window_start = {}, 0, time.time()
+        if not buffer and not dropped:
+            return
+        try:
+            text = self._format_digest(buffer, dropped, since)
+            send_telegram_alert_task.apply_async(kwargs={"text": text, "chat_ids": self.admin_ids})
+        except Exception:  # pragma: no cover - best-effort
+            pass
+
+    def close(self) -> None:
+        # logging.shutdown() closes handlers at exit: send what is left
+        self._stop.set()
+        self.flush()
+        super().close()
+
+    @staticmethod
+    def _fingerprint(record: logging.LogRecord) -> str:
+        if record.exc_info and record.exc_info[0] is not None:
+            exc_type, _, tb = record.exc_info
+            location = f"{record.pathname}:{record.lineno}"
+            while tb is not None:
+                location = f"{tb.tb_frame.f_code.co_filename}:{tb.tb_lineno}"
+                tb = tb.tb_next
+            return f"{record.name}|{exc_type.__name__}|{location}"
+        # message template, not the formatted text: ids and values do not split buckets
+        return f"{record.name}|{record.pathname}:{record.lineno}|{record.msg}"[:500]
+
+    def _truncate(self, text: str) -> str:
+        if len(text) <= self.sample_chars:
+            return text
+        head = 300
+        return text[:head] + "\n...\n" + text[-(self.sample_chars - head):]
+
+    def _format_digest(self, buffer: Dict[str, _Bucket], dropped: int, since: float) -> str:
+        buckets = sorted(buffer.values(), key=lambda b: b.count, reverse=True)
+        total = sum(b.count for b in buckets)
+        lines = [
+            f"[ERROR digest] {total} record(s), {len(buckets)} kind(s) in {round(time.time() - since)}s",
+        ]
+        if dropped:
+            lines.append(f"dropped={dropped} (alert buffer full)")
+        for i, bucket in enumerate(buckets[: self.max_entries], 1):
+            first = time.strftime("%H:%M:%S", time.localtime(bucket.first_seen))
+            last = time.strftime("%H:%M:%S", time.localtime(bucket.last_seen))
+            lines += ["", f"#{i} x{bucket.count} (first {first}, last {last})", bucket.sample]
+        rest = buckets[self.max_entries:]
+        if rest:
+            lines += ["", f"... and {len(rest)} more kind(s), {sum(b.count for b in rest)} record(s)"]
+        return "\n".join(lines)
+
     def _format_text(self, record: logging.LogRecord) -> str:
         title = f"[{record.levelname}] {record.name}"
         method = getattr(record, "method", "")
@@ -88,5 +251,3 @@ class TelegramAdminHandler(logging.Handler):
             lines.append(base_msg)
 
         return "\n".join(lines)
-
-    # sending is done in celery task
@@ -0,0 +1,98 @@
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+# Web worker ishga tushishini takrorlaydi: Django setup + URLconf (birinchi so'rovdagi kabi)
+CHILD_SCRIPT = """
+import json, resource, sys, time
+started = time.perf_counter()
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+if {eager}:
+    from bot.dispatcher import warm_up
+    warm_up()
+elapsed = time.perf_counter() - started
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{
+    "seconds": elapsed,
+    "max_rss_kb": rss // 1024 if sys.platform == "darwin" else rss,
+    "modules": len(sys.modules),
+}}))
+"""
+
+
+def parse_importtime(stderr: str) -> list[tuple[str, int, int]]:
+    """``-X importtime`` chiqishi -> [(modul, self_us, cumulative_us), ...]"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+class Command(BaseCommand):
+    help = "Web worker cold start profili: import vaqtlari (python -X importtime) va RSS"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=20, help='Eng sekin modullar soni')
+        parser.add_argument(
+            '--eager-bot',
+            action='store_true',
+            help='Bot va dispatcher ni ham qurish (BOT_EAGER_INIT=True bilan ishga tushish)'
+        )
+        parser.add_argument('--json', action='store_true', help='Natijani JSON ko\'rinishida chiqarish')
+
+    def handle(self, *args, **options):
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": os.environ.get("DJANGO_SETTINGS_MODULE", "core.settings")}
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", CHILD_SCRIPT.format(eager=options['eager_bot'])],
+            capture_output=True,
+            text=True,
+            env=env,
+        )
+        if proc.returncode != 0:
+            tail = "\n".join(line for line in proc.stderr.splitlines() if not line.startswith("import time:"))
+            raise CommandError(f"Worker startup failed:\n{tail[-2000:]}")
+
+        summary = json.loads(proc.stdout.strip().splitlines()[-1])
+        rows = parse_importtime(proc.stderr)
+        by_package = defaultdict(int)
+        for name, self_us, _ in rows:
+            by_package[name.split(".")[0]] += self_us
+
+        top = options['top']
+        report = {
+            **summary,
+            "imports": len(rows),
+            "slowest_modules": [
+                {"module": name, "self_ms": self_us / 1000, "cumulative_ms": cumulative_us / 1000}
+                for name, self_us, cumulative_us in sorted(rows, key=lambda row: row[2], reverse=True)[:top]
+            ],
+            "packages": [
+                {"package": package, "self_ms": total / 1000}
+                for package, total in sorted(by_package.items(), key=lambda item: item[1], reverse=True)[:top]
+            ],
+        }
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Startup: {report['seconds'] * 1000:.0f} ms, max RSS {report['max_rss_kb'] / 1024:.1f} MB, "
+            f"{report['modules']} modules in sys.modules ({report['imports']} imported)"
+        ))
+        self.stdout.write(f"\nSlowest imports (cumulative, top {top}):")
+        for row in report["slowest_modules"]:
+            self.stdout.write(f"  {row['cumulative_ms']:9.1f} ms  {row['self_ms']:8.1f} ms self  {row['module']}")
+        self.stdout.write(f"\nTime by top-level package (self, top {top}):")
+        for row in report["packages"]:
+            self.stdout.write(f"  {row['self_ms']:9.1f} ms  {row['package']}")
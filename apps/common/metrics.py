@@ -0,0 +1,209 @@
+"""Per-endpoint request metrics shared by all web workers.
+
+``RequestMetricsMiddleware`` times every request and, through a context
+variable, counts the DB queries (``connection.execute_wrappers``) and Redis
+round trips (counting connection classes in ``redis_client``) made while
+serving it. The context variable is copied into ``sync_to_async`` threads,
+so async views are covered too.
+
+Samples are aggregated per route (resolved URL name), method and status in
+a process-local dict. A daemon thread merges that dict into one Redis hash
+every ``METRICS_FLUSH_SECONDS`` with a single pipeline, so the request path
+never talks to Redis for metrics. ``render()`` reads the hash and returns
+the Prometheus text format served on ``/metrics``.
+
+Hash ``metrics:http`` fields are ``route|method|status|<series>`` where
+series is a bucket index, ``count``, ``sum``, ``db_queries``,
+``db_seconds`` or ``redis_calls``. Counters are never reset; Prometheus
+handles rates.
+"""
+from __future__ import annotations
+
+import atexit
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+KEY = "metrics:http"
+UNMATCHED = "<unmatched>"
+METHODS = frozenset({"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"})
+
+
+class RequestStats:
+    """Numbers collected while one request is being served."""
+
+    __slots__ = ("request", "started", "db_queries", "db_seconds", "redis_calls")
+
+    def __init__(self, request):
+        self.request = request
+        self.started = time.perf_counter()
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.redis_calls = 0
+
+
+current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def count_redis_call() -> None:
+    stats = current.get()
+    if stats is not None:
+        stats.redis_calls += 1
+
+
+def db_execute_wrapper(execute, sql, params, many, context):
+    """Installed on every DB connection (apps.common.apps); no-op outside requests."""
+    stats = current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.db_queries += 1
+        stats.db_seconds += time.perf_counter() - start
+
+
+def install_db_wrapper(sender, connection, **kwargs) -> None:
+    """``connection_created`` receiver (connections are per thread)."""
+    if db_execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(db_execute_wrapper)
+
+
+def route_name(request) -> str:
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return UNMATCHED
+    return match.view_name or match.route or UNMATCHED
+
+
+class Recorder:
+    """Process-local aggregate, merged into Redis by a background thread."""
+
+    def __init__(self, buckets=None, interval: Optional[float] = None):
+        self.buckets = sorted(buckets or settings.METRICS_LATENCY_BUCKETS)
+        self.interval = interval or settings.METRICS_FLUSH_SECONDS
+        self._pid: Optional[int] = None
+        self._reset()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self) -> None:
+        # the parent's unflushed numbers stay with the parent
+        self._lock = threading.Lock()
+        self._data: defaultdict = defaultdict(float)
+
+    def observe(self, route: str, method: str, status: int, stats: RequestStats, elapsed: float) -> None:
+        prefix = f"{route}|{method}|{status}|"
+        bucket = bisect_left(self.buckets, elapsed)
+        with self._lock:
+            data = self._data
+            if bucket < len(self.buckets):  # +Inf is the count
+                data[prefix + str(bucket)] += 1
+            data[prefix + "count"] += 1
+            data[prefix + "sum"] += elapsed
+            data[prefix + "db_queries"] += stats.db_queries
+            data[prefix + "db_seconds"] += stats.db_seconds
+            data[prefix + "redis_calls"] += stats.redis_calls
+        if self._pid != os.getpid():
+            self._start()
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # first request in this process (also after a fork)
+            self._pid = os.getpid()
+        threading.Thread(target=self._run, name="metrics-flush", daemon=True).start()
+
+    def _run(self) -> None:
+        pid = os.getpid()
+        while self._pid == pid:
+            time.sleep(self.interval)
+            self.flush()
+
+    def flush(self) -> None:
+        """Merge the local aggregate into the shared hash (one pipeline)."""
+        with self._lock:
+            data, self._data = self._data, defaultdict(float)
+        if not data:
+            return
+        from .redis_client import get_redis
+
+        try:
+            pipe = get_redis("metrics").pipeline(transaction=False)
+            for field, value in data.items():
+                if field.endswith(("|sum", "|db_seconds")):
+                    pipe.hincrbyfloat(KEY, field, value)
+                elif value:
+                    pipe.hincrby(KEY, field, int(value))
+            pipe.execute()
+        except Exception:
+            logger.warning("Redis unavailable, request metrics dropped", extra={"fields": len(data)})
+
+
+recorder: Optional[Recorder] = None
+
+
+def get_recorder() -> Recorder:
+    global recorder
+    if recorder is None:
+        recorder = Recorder()
+        atexit.register(recorder.flush)
+    return recorder
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render() -> str:
+    """Prometheus text exposition of the shared hash."""
+    from .redis_client import get_redis
+
+    rec = get_recorder()
+    rec.flush()
+    raw = get_redis("metrics").hgetall(KEY)
+
+    series: dict = defaultdict(dict)
+    for field, value in raw.items():
+        route, method, status, name = field.rsplit("|", 3)
+        series[(route, method, status)][name] = float(value)
+
+    out = [
+        "# HELP http_request_duration_seconds Request latency by route",
+        "# TYPE http_request_duration_seconds histogram",
+    ]
+    for (route, method, status), values in sorted(series.items()):
+        labels = f'route="{_escape(route)}",method="{method}",status="{status}"'
+        cumulative = 0.0
+        for i, bound in enumerate(rec.buckets):
+            cumulative += values.get(str(i), 0.0)
+            out.append(f'http_request_duration_seconds_bucket{{{labels},le="{_number(bound)}"}} {_number(cumulative)}')
+        out.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {_number(values.get("count", 0.0))}')
+        out.append(f"http_request_duration_seconds_sum{{{labels}}} {_number(values.get('sum', 0.0))}")
+        out.append(f"http_request_duration_seconds_count{{{labels}}} {_number(values.get('count', 0.0))}")
+
+    for name, key, help_text in (
+        ("http_request_db_queries_total", "db_queries", "DB queries made while serving requests"),
+        ("http_request_db_seconds_total", "db_seconds", "Time spent in DB queries"),
+        ("http_request_redis_calls_total", "redis_calls", "Redis round trips made while serving requests"),
+    ):
+        out += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+        for (route, method, status), values in sorted(series.items()):
+            labels = f'route="{_escape(route)}",method="{method}",status="{status}"'
+            out.append(f"{name}{{{labels}}} {_number(values.get(key, 0.0))}")
+    return "\n".join(out) + "\n"
@@ -0,0 +1,60 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .metrics import METHODS, RequestStats, current, get_recorder, route_name
+
+
+class RequestMetricsMiddleware:
+    """Per-route latency, DB and Redis usage of every request (see apps/common/metrics.py).
+
+    Works under WSGI and ASGI. Place it first in MIDDLEWARE so the timing
+    covers the other middleware. The request's ``RequestStats`` is also what
+    ``RequestContextFilter`` reads to put method/path/user/ip on log records.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = settings.METRICS_ENABLED
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.enabled:
+            return self.get_response(request)
+        stats = RequestStats(request)
+        token = current.set(stats)
+        status = 500
+        try:
+            response = self.get_response(request)
+            status = response.status_code
+            return response
+        finally:
+            current.reset(token)
+            self._record(request, stats, status)
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+        stats = RequestStats(request)
+        token = current.set(stats)
+        status = 500
+        try:
+            response = await self.get_response(request)
+            status = response.status_code
+            return response
+        finally:
+            current.reset(token)
+            self._record(request, stats, status)
+
+    @staticmethod
+    def _record(request, stats: RequestStats, status: int) -> None:
+        elapsed = time.perf_counter() - stats.started
+        method = request.method if request.method in METHODS else "OTHER"
+        get_recorder().observe(route_name(request), method, status, stats, elapsed)
@@ -35,3 +35,47 @@ class AuditTrailMixin:
 		else:
 			super().perform_update(serializer)
 
+
+class FieldTrackerMixin:
+	"""Mixin to track which concrete fields changed since the instance was loaded.
+
+	Values are snapshotted in ``from_db`` and refreshed after each ``save``,
+	so callers can skip writes when nothing relevant changed:
+
+		if profile.has_changed():
+			profile.save(update_fields=profile.changed_fields())
+	"""
+
+	@classmethod
+	def from_db(cls, db, field_names, values):
+		instance = super().from_db(db, field_names, values)
+		instance._snapshot_fields()
+		return instance
+
+	def _snapshot_fields(self):
+		deferred = self.get_deferred_fields()
+		self._loaded_values = {
+			field.attname: getattr(self, field.attname)
+			for field in self._meta.concrete_fields
+			if field.attname not in deferred
+		}
+
+	def changed_fields(self) -> list[str]:
+		"""Names of fields whose value differs from the loaded snapshot.
+
+		Unsaved instances report every concrete field as changed.
+		"""
+		loaded = getattr(self, '_loaded_values', None)
+		if loaded is None or self._state.adding:
+			return [field.attname for field in self._meta.concrete_fields]
+		return [
+			attname for attname, value in loaded.items()
+			if getattr(self, attname) != value
+		]
+
+	def has_changed(self) -> bool:
+		return bool(self.changed_fields())
+
+	def save(self, *args, **kwargs):
+		super().save(*args, **kwargs)
+		self._snapshot_fields()
@@ -2,12 +2,15 @@ from __future__ import annotations
 
 import logging
 import random
+from collections import Counter
 from typing import Optional
 import threading
 import time
 
+import redis
 from django.conf import settings
 from .redis_client import get_redis
+from .redis_health import get_breaker
 
 logger = logging.getLogger("apps.auth")
 
@@ -80,24 +83,156 @@ class _MemoryStore:
             v, _ = val
             self._data[key] = (v, time.time() + ttl_seconds)
 
+    def otp_request(self, code_key: str, cooldown_key: str, attempts_key: str,
+                    code: str, code_ttl: int, cooldown_ttl: int) -> tuple[int, int]:
+        """Same semantics as ``_REQUEST_LUA``: returns (1, 0) or (0, cooldown_ttl)."""
+        with self._lock:
+            self._purge(cooldown_key)
+            if cooldown_key in self._data:
+                _, expires_at = self._data[cooldown_key]
+                return 0, max(0, int(expires_at - time.time()))
+            now = time.time()
+            self._data[code_key] = (code, now + code_ttl)
+            self._data[cooldown_key] = (1, now + cooldown_ttl)
+            self._data.pop(attempts_key, None)
+            return 1, 0
+
+    def otp_verify(self, code_key: str, attempts_key: str, code: str, max_attempts: int) -> tuple[int, int]:
+        """Same semantics as ``_VERIFY_LUA``: returns (status, attempts)."""
+        with self._lock:
+            self._purge(code_key)
+            self._purge(attempts_key)
+            val = self._data.get(code_key)
+            if val is None:
+                return VERIFY_MISSING, 0
+            stored, code_expires_at = val
+            if str(stored) == code:
+                self._data.pop(code_key, None)
+                self._data.pop(attempts_key, None)
+                return VERIFY_OK, 0
+            current = self._data.get(attempts_key)
+            attempts = 1 if current is None else int(current[0]) + 1
+            expires_at = code_expires_at if current is None else current[1]
+            self._data[attempts_key] = (attempts, expires_at)
+            if attempts >= max_attempts:
+                self._data.pop(code_key, None)
+            return VERIFY_WRONG, attempts
+
+
+# Verify script status codes
+VERIFY_MISSING, VERIFY_OK, VERIFY_WRONG = 0, 1, 2
+
+# KEYS: code, cooldown, attempts; ARGV: code, code_ttl, cooldown_ttl
+_REQUEST_LUA = """
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    return {0, redis.call('TTL', KEYS[2])}
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', tonumber(ARGV[2]))
+redis.call('SET', KEYS[2], '1', 'EX', tonumber(ARGV[3]))
+redis.call('DEL', KEYS[3])
+return {1, 0}
+"""
+
+# KEYS: code, attempts; ARGV: code, max_attempts
+_VERIFY_LUA = """
+local stored = redis.call('GET', KEYS[1])
+if not stored then
+    return {0, 0}
+end
+if stored == ARGV[1] then
+    redis.call('DEL', KEYS[1], KEYS[2])
+    return {1, 0}
+end
+local attempts = redis.call('INCR', KEYS[2])
+if attempts == 1 then
+    local ttl = redis.call('TTL', KEYS[1])
+    if ttl > 0 then
+        redis.call('EXPIRE', KEYS[2], ttl)
+    end
+end
+if attempts >= tonumber(ARGV[2]) then
+    redis.call('DEL', KEYS[1])
+end
+return {2, attempts}
+"""
+
+
+class _RedisStore:
+    """OTP operations as server-side Lua scripts: one atomic EVALSHA round trip each.
+
+    Scripts are registered once per process; redis-py falls back to EVAL and
+    re-caches the SHA if the server was restarted (NOSCRIPT).
+    """
+
+    _scripts: dict = {}
+
+    def __init__(self, client):
+        self.client = client
+
+    def _script(self, name: str, source: str):
+        script = self._scripts.get(name)
+        if script is None:
+            script = self._scripts[name] = self.client.register_script(source)
+        return script
+
+    def otp_request(self, code_key: str, cooldown_key: str, attempts_key: str,
+                    code: str, code_ttl: int, cooldown_ttl: int) -> tuple[int, int]:
+        ok, ttl = self._script("request", _REQUEST_LUA)(
+            keys=[code_key, cooldown_key, attempts_key],
+            args=[code, code_ttl, cooldown_ttl],
+            client=self.client,
+        )
+        return int(ok), int(ttl)
+
+    def otp_verify(self, code_key: str, attempts_key: str, code: str, max_attempts: int) -> tuple[int, int]:
+        status, attempts = self._script("verify", _VERIFY_LUA)(
+            keys=[code_key, attempts_key],
+            args=[code, max_attempts],
+            client=self.client,
+        )
+        return int(status), int(attempts)
+
 
 _memory_store = _MemoryStore()
 
 
-def _get_store():
-    """Get Redis client if available; otherwise use in-memory fallback."""
-    try:
-        r = get_redis()
-        # Ensure connection works; if not, fall back
+_store_stats: Counter = Counter()
+
+
+def _store_op(op: str, *args):
+    """Run an OTP operation on Redis, or on the configured fallback.
+
+    Redis health comes from the circuit breaker (``redis_health``) instead of
+    a PING per call. When Redis is unavailable ``OTP_STORE_FALLBACK`` decides:
+    ``"memory"`` uses the per-process store (dev only: codes are not shared
+    between workers), ``"fail"`` rejects the request with ``OTPError``.
+    """
+    breaker = get_breaker("otp")
+    if breaker.available():
         try:
-            r.ping()
-            return r
-        except Exception:
-            logger.warning("Redis unavailable, using in-memory OTP store")
-            return _memory_store
-    except Exception:
-        logger.warning("Redis init failed, using in-memory OTP store")
-        return _memory_store
+            result = getattr(_RedisStore(get_redis("otp")), op)(*args)
+        except (redis.ConnectionError, redis.TimeoutError) as exc:
+            breaker.record_failure(exc)
+            logger.warning("Redis OTP operation failed", extra={"op": op, "error": repr(exc)})
+        else:
+            breaker.record_success()
+            _store_stats["redis"] += 1
+            return result
+
+    if settings.OTP_STORE_FALLBACK == "memory":
+        _store_stats["memory"] += 1
+        return getattr(_memory_store, op)(*args)
+    _store_stats["unavailable"] += 1
+    raise OTPError("OTP service is temporarily unavailable. Try again later.")
+
+
+def otp_store_stats() -> dict:
+    """Per-process counters of which store served OTP calls."""
+    return {
+        "served": {name: _store_stats[name] for name in ("redis", "memory", "unavailable")},
+        "fallback": settings.OTP_STORE_FALLBACK,
+        "breaker": get_breaker("otp").snapshot(),
+    }
 
 
 def _key_for_code(phone: str, purpose: str = "generic") -> str:
@@ -135,24 +270,24 @@ class OTPService:
 
     @classmethod
     def request_code(cls, phone: str, *, purpose: str = "generic") -> dict:
-        r = _get_store()
-        cooldown_key = _key_for_cooldown(phone, purpose)
-        if r.exists(cooldown_key):
-            ttl = r.ttl(cooldown_key)
-            raise OTPError(f"Too many requests. Try again in {ttl if ttl else 'a few'} seconds.")
-
         code = cls.generate_code()
-        code_key = _key_for_code(phone, purpose)
-        r.setex(code_key, settings.OTP_CODE_TTL_SECONDS, code)
-        # set request cooldown to avoid spamming
-        r.setex(cooldown_key, settings.OTP_REQUEST_COOLDOWN_SECONDS, 1)
-        # reset attempts for fresh code
-        r.delete(_key_for_attempts(phone, purpose))
-
-        # Enqueue SMS send via Celery
+        # Cooldown check, code + cooldown write and attempts reset happen atomically
+        ok, cooldown_ttl = _store_op(
+            "otp_request",
+            _key_for_code(phone, purpose),
+            _key_for_cooldown(phone, purpose),
+            _key_for_attempts(phone, purpose),
+            code,
+            settings.OTP_CODE_TTL_SECONDS,
+            settings.OTP_REQUEST_COOLDOWN_SECONDS,
+        )
+        if not ok:
+            raise OTPError(f"Too many requests. Try again in {cooldown_ttl if cooldown_ttl > 0 else 'a few'} seconds.")
+
+        # Enqueue SMS send via Celery (coalesced into provider batches)
         try:
-            from .tasks_otp import send_sms_otp_task
-            send_sms_otp_task.delay(phone, code)
+            from .tasks_otp import enqueue_sms_otp
+            enqueue_sms_otp(phone, code)
         except Exception:
             logger.exception("Failed to enqueue OTP send task")
 
@@ -168,24 +303,21 @@ class OTPService:
 
     @classmethod
     def verify_code(cls, phone: str, code: str, *, purpose: str = "generic") -> bool:
-        r = _get_store()
-        attempts_key = _key_for_attempts(phone, purpose)
-        code_key = _key_for_code(phone, purpose)
+        max_attempts = settings.OTP_MAX_ATTEMPTS
+        # Compare, attempts counting and lockout happen atomically
+        status, attempts = _store_op(
+            "otp_verify",
+            _key_for_code(phone, purpose),
+            _key_for_attempts(phone, purpose),
+            str(code).strip(),
+            max_attempts,
+        )
 
-        stored: Optional[str] = r.get(code_key)
-        if not stored:
+        if status == VERIFY_MISSING:
             logger.warning("OTP verify failed: no code", extra={"phone_masked": _mask_phone(phone), "purpose": purpose})
             return False
 
-        if stored != str(code).strip():
-            # increment attempts and optionally lockout
-            attempts = r.incr(attempts_key)
-            max_attempts = settings.OTP_MAX_ATTEMPTS
-            if attempts == 1:
-                # align attempts ttl with code ttl
-                ttl = r.ttl(code_key)
-                if ttl and ttl > 0:
-                    r.expire(attempts_key, ttl)
+        if status == VERIFY_WRONG:
             logger.warning(
                 "OTP verify failed: wrong code",
                 extra={
@@ -195,13 +327,7 @@ class OTPService:
                     "purpose": purpose,
                 },
             )
-            if attempts >= max_attempts:
-                # Invalidate the code to force re-request
-                r.delete(code_key)
             return False
 
-        # success: cleanup keys
-        r.delete(code_key)
-        r.delete(attempts_key)
         logger.info("OTP verify success", extra={"phone_masked": _mask_phone(phone), "purpose": purpose})
         return True
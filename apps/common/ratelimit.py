@@ -0,0 +1,167 @@
+"""Distributed rate limiting with GCRA (generic cell rate algorithm).
+
+A rate ``"30/m"`` allows a burst of 30 requests and then one request every
+``60 / 30`` seconds. Per key Redis stores a single value: the theoretical
+arrival time (TAT) of the next request. Each check is one EVALSHA that reads
+the clock with ``TIME`` (so app servers with skewed clocks agree), updates
+the TAT and returns the verdict.
+
+Several limits can be checked together (e.g. per user and per user+handler
+in the bot): the request is allowed only if every key allows it, and only
+then are the TATs advanced - still one round trip. An optional notice key
+marks the first rejection in a window so callers can warn the user once
+instead of answering every flooded request.
+
+Used by the DRF throttles in ``apps.common.throttling`` and by the bot
+middleware in ``bot.middlewares.throttling``. If Redis is unavailable the
+check fails open: rate limiting must not take the API down with it.
+"""
+from __future__ import annotations
+
+import logging
+import math
+from typing import NamedTuple, Optional
+
+from .redis_client import get_async_redis, get_redis
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "rl"
+
+# KEYS[1..n] - TAT kalitlari, KEYS[n+1] (ixtiyoriy) - ogohlantirish kaliti
+# ARGV: n, so'ng har bir kalit uchun emission_interval_ms, burst_ms (= limit * interval)
+# Returns {allowed, retry_after_ms, remaining, notify}
+_GCRA_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local n = tonumber(ARGV[1])
+local retry, remaining, tats = 0, nil, {}
+for i = 1, n do
+    local interval = tonumber(ARGV[2 * i])
+    local burst = tonumber(ARGV[2 * i + 1])
+    local tat = tonumber(redis.call('GET', KEYS[i]) or now)
+    if tat < now then
+        tat = now
+    end
+    local allow_at = tat + interval - burst
+    if now < allow_at then
+        retry = math.max(retry, allow_at - now)
+    else
+        local left = math.floor((now - allow_at) / interval)
+        if remaining == nil or left < remaining then
+            remaining = left
+        end
+    end
+    tats[i] = tat + interval
+end
+if retry > 0 then
+    local notify = 0
+    if #KEYS > n and redis.call('SET', KEYS[n + 1], 1, 'NX', 'PX', retry) then
+        notify = 1
+    end
+    return {0, retry, 0, notify}
+end
+for i = 1, n do
+    redis.call('SET', KEYS[i], tats[i], 'PX', tats[i] - now)
+end
+return {1, 0, remaining, 0}
+"""
+
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+_sync_script = None
+_async_script = None
+
+
+class Rate(NamedTuple):
+    limit: int
+    period: int  # seconds
+
+    @property
+    def interval_ms(self) -> int:
+        # rounded up: a shorter interval would let more than ``limit`` through
+        return max(1, math.ceil(self.period * 1000 / self.limit))
+
+
+class Verdict(NamedTuple):
+    allowed: bool
+    retry_after: float  # seconds
+    remaining: int
+    notify: bool = True  # first rejection in the window (only tracked with a notice key)
+
+
+ALLOW = Verdict(True, 0.0, 0)
+
+
+def parse_rate(rate: Optional[str]) -> Optional[Rate]:
+    """``"<count>/<s|m|h|d>"`` (DRF format, e.g. ``"100/min"``) -> Rate; None disables."""
+    if not rate:
+        return None
+    count, period = rate.split("/")
+    return Rate(int(count), PERIODS[period[0]])
+
+
+def _key(key: str) -> str:
+    return f"{KEY_PREFIX}:{key}"
+
+
+def _call(limits: list, notice_key: Optional[str], burst: Optional[int] = None) -> dict:
+    keys, args = [_key(key) for key, _ in limits], [len(limits)]
+    for _, rate in limits:
+        args += [rate.interval_ms, rate.interval_ms * (burst or rate.limit)]
+    if notice_key:
+        keys.append(_key(notice_key))
+    return {"keys": keys, "args": args}
+
+
+def _verdict(reply) -> Verdict:
+    allowed, retry_ms, remaining, notify = reply
+    return Verdict(bool(allowed), math.ceil(int(retry_ms) / 10) / 100, int(remaining), bool(notify))
+
+
+def hit(key: str, rate: Optional[Rate], burst: Optional[int] = None) -> Verdict:
+    """Count one request for ``key``; returns whether it is allowed.
+
+    ``burst`` caps back-to-back requests (default: the whole limit); ``1``
+    spaces requests evenly at the rate.
+    """
+    if rate is None:
+        return ALLOW
+    return hit_all([(key, rate)], burst=burst)
+
+
+def hit_all(limits: list, notice_key: Optional[str] = None, burst: Optional[int] = None) -> Verdict:
+    """Check several ``(key, rate)`` limits in one round trip; all must allow."""
+    global _sync_script
+    limits = [(key, rate) for key, rate in limits if rate is not None]
+    if not limits:
+        return ALLOW
+    try:
+        if _sync_script is None:
+            _sync_script = get_redis("cache").register_script(_GCRA_LUA)
+        return _verdict(_sync_script(**_call(limits, notice_key, burst)))
+    except Exception:
+        logger.warning("Redis unavailable, rate limit not enforced", extra={"ratelimit_key": limits[0][0]})
+        return ALLOW
+
+
+async def ahit(key: str, rate: Optional[Rate], burst: Optional[int] = None) -> Verdict:
+    """asyncio variant of :func:`hit` (bot handlers)."""
+    if rate is None:
+        return ALLOW
+    return await ahit_all([(key, rate)], burst=burst)
+
+
+async def ahit_all(limits: list, notice_key: Optional[str] = None, burst: Optional[int] = None) -> Verdict:
+    """asyncio variant of :func:`hit_all`."""
+    global _async_script
+    limits = [(key, rate) for key, rate in limits if rate is not None]
+    if not limits:
+        return ALLOW
+    try:
+        if _async_script is None:
+            _async_script = get_async_redis("cache").register_script(_GCRA_LUA)
+        return _verdict(await _async_script(**_call(limits, notice_key, burst)))
+    except Exception:
+        logger.warning("Redis unavailable, rate limit not enforced", extra={"ratelimit_key": limits[0][0]})
+        return ALLOW
@@ -1,22 +1,149 @@
+"""Named, pooled Redis clients shared by the whole project.
+
+Connections are configured in ``settings.REDIS_CONNECTIONS``::
+
+    REDIS_CONNECTIONS = {
+        "otp": {"url": "redis://redis:6379/0"},
+        "fsm": {"url": "redis://redis:6379/0", "decode_responses": False},
+        ...
+    }
+
+Every name gets one client per process. Names that resolve to the same URL
+and options share a single connection pool, so adding a logical name does
+not open new sockets. Async clients (``get_async_redis``) have their own
+pools and are meant for the single event loop of an ASGI worker / the bot.
+"""
 from __future__ import annotations
 
+import threading
+
 import redis
-from urllib.parse import urlparse
+import redis.asyncio as redis_async
 from django.conf import settings
-from typing import Optional
-
-_redis_client: Optional[redis.Redis] = None
-
-
-def get_redis() -> redis.Redis:
-    global _redis_client
-    if _redis_client is None:
-        # Prefer explicit env-style attributes if present; else parse from CELERY_BROKER_URL
-        url = getattr(settings, "CELERY_BROKER_URL", "redis://redis:6379/0")
-        parsed = urlparse(url)
-        host = getattr(settings, "REDIS_HOST", None) or parsed.hostname or "redis"
-        port = int(getattr(settings, "REDIS_PORT", None) or (parsed.port or 6379))
-        # Allow override of DB used for OTP via OTP_REDIS_DB env
-        db = int(getattr(settings, "OTP_REDIS_DB", None) or (parsed.path.lstrip("/") or 0))
-        _redis_client = redis.Redis(host=host, port=port, db=db, decode_responses=True)
-    return _redis_client
+
+from .metrics import count_redis_call
+
+DEFAULT = "default"
+
+_clients: dict[str, redis.Redis] = {}
+_async_clients: dict[str, redis_async.Redis] = {}
+_pools: dict[tuple, redis.ConnectionPool] = {}
+_async_pools: dict[tuple, redis_async.ConnectionPool] = {}
+_lock = threading.Lock()
+
+
+class _CountingMixin:
+    """Counts round trips for request metrics (a pipeline is one send)."""
+
+    def send_packed_command(self, *args, **kwargs):
+        count_redis_call()
+        return super().send_packed_command(*args, **kwargs)
+
+
+def _counting(base):
+    return type(f"Counting{base.__name__}", (_CountingMixin, base), {})
+
+
+# passing connection_class overrides the one from_url() picks for the URL scheme
+_SYNC_CONNECTIONS = {
+    "redis": _counting(redis.Connection),
+    "rediss": _counting(redis.SSLConnection),
+    "unix": _counting(redis.UnixDomainSocketConnection),
+}
+_ASYNC_CONNECTIONS = {
+    "redis": _counting(redis_async.Connection),
+    "rediss": _counting(redis_async.SSLConnection),
+    "unix": _counting(redis_async.UnixDomainSocketConnection),
+}
+
+
+def _connection_class(url: str, connections: dict):
+    return connections.get(url.split("://", 1)[0], connections["redis"])
+
+
+def _options(name: str) -> dict:
+    connections = settings.REDIS_CONNECTIONS
+    if name not in connections:
+        raise KeyError(f"Unknown Redis connection '{name}' (see settings.REDIS_CONNECTIONS)")
+    options = {
+        "decode_responses": True,
+        "max_connections": settings.REDIS_MAX_CONNECTIONS,
+        "socket_timeout": settings.REDIS_SOCKET_TIMEOUT,
+        "socket_connect_timeout": settings.REDIS_SOCKET_TIMEOUT,
+        "health_check_interval": 30,
+    }
+    options.update(connections[name])
+    return options
+
+
+def _pool_key(options: dict) -> tuple:
+    return tuple(sorted(options.items()))
+
+
+def get_redis(name: str = DEFAULT) -> redis.Redis:
+    """Sync client for a named connection (created once per process)."""
+    client = _clients.get(name)
+    if client is None:
+        with _lock:
+            client = _clients.get(name)
+            if client is None:
+                options = _options(name)
+                key = _pool_key(options)
+                pool = _pools.get(key)
+                if pool is None:
+                    url = options.pop("url")
+                    pool = _pools[key] = redis.ConnectionPool.from_url(
+                        url, connection_class=_connection_class(url, _SYNC_CONNECTIONS), **options
+                    )
+                client = _clients[name] = redis.Redis(connection_pool=pool)
+    return client
+
+
+def get_async_redis(name: str = DEFAULT) -> redis_async.Redis:
+    """asyncio client for a named connection (created once per process)."""
+    client = _async_clients.get(name)
+    if client is None:
+        with _lock:
+            client = _async_clients.get(name)
+            if client is None:
+                options = _options(name)
+                key = _pool_key(options)
+                pool = _async_pools.get(key)
+                if pool is None:
+                    url = options.pop("url")
+                    pool = _async_pools[key] = redis_async.ConnectionPool.from_url(
+                        url, connection_class=_connection_class(url, _ASYNC_CONNECTIONS), **options
+                    )
+                client = _async_clients[name] = redis_async.Redis(connection_pool=pool)
+    return client
+
+
+def _describe(pool) -> dict:
+    kwargs = pool.connection_kwargs
+    return {
+        "address": f"{kwargs.get('host', kwargs.get('path'))}:{kwargs.get('port', '')}/{kwargs.get('db', 0)}",
+        "max_connections": pool.max_connections,
+        "created": len(pool._available_connections) + len(pool._in_use_connections),
+        "in_use": len(pool._in_use_connections),
+        "idle": len(pool._available_connections),
+    }
+
+
+def pool_stats() -> dict:
+    """Connection counts of every pool opened by this process."""
+    stats: dict[str, dict] = {}
+    for kind, clients in (("sync", _clients), ("async", _async_clients)):
+        for name, client in clients.items():
+            entry = _describe(client.connection_pool)
+            entry["kind"] = kind
+            stats[f"{kind}:{name}"] = entry
+    return stats
+
+
+def close_all() -> None:
+    """Drop every sync pool (e.g. after fork); async pools close with their loop."""
+    with _lock:
+        for pool in _pools.values():
+            pool.disconnect()
+        _pools.clear()
+        _clients.clear()
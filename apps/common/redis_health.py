@@ -0,0 +1,133 @@
+"""Cached Redis health state with a circuit breaker.
+
+Callers ask ``breaker.available()`` instead of pinging Redis before every
+operation, and report the outcome of real operations back with
+``record_success()`` / ``record_failure()``.
+
+States:
+
+- closed: Redis is assumed healthy, operations go straight through
+- open: after ``REDIS_HEALTH_FAILURE_THRESHOLD`` consecutive failures the
+  breaker opens and ``available()`` returns False without touching Redis
+- while open, a single background thread probes Redis with PING once the
+  backoff delay has elapsed; each failed probe doubles the delay (capped at
+  ``REDIS_HEALTH_BACKOFF_MAX_SECONDS``), a successful probe closes the breaker
+
+Request threads never block on a probe.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Callable
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, client_factory: Callable):
+        self.name = name
+        self._client_factory = client_factory
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._backoff = 0.0
+        self._next_probe_at = 0.0
+        self._probing = False
+        self._opened_at: float | None = None
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def available(self) -> bool:
+        """Cached health answer; schedules a background probe when one is due."""
+        if self._state == CLOSED:
+            return True
+        with self._lock:
+            due = not self._probing and time.monotonic() >= self._next_probe_at
+            if due:
+                self._probing = True
+        if due:
+            threading.Thread(target=self._probe, name=f"redis-probe-{self.name}", daemon=True).start()
+        return False
+
+    def record_success(self) -> None:
+        if self._state == CLOSED and self._failures == 0:
+            return
+        with self._lock:
+            self._close()
+
+    def record_failure(self, exc: BaseException | None = None) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == CLOSED and self._failures >= settings.REDIS_HEALTH_FAILURE_THRESHOLD:
+                self._state = OPEN
+                self._opened_at = time.time()
+                self._backoff = settings.REDIS_HEALTH_BACKOFF_BASE_SECONDS
+                self._next_probe_at = time.monotonic() + self._backoff
+                logger.warning(
+                    "Redis circuit opened",
+                    extra={"redis_name": self.name, "failures": self._failures, "error": repr(exc)},
+                )
+
+    def _close(self) -> None:
+        if self._state == OPEN:
+            logger.info("Redis circuit closed", extra={"redis_name": self.name})
+        self._state = CLOSED
+        self._failures = 0
+        self._backoff = 0.0
+        self._opened_at = None
+
+    def _probe(self) -> None:
+        try:
+            self._client_factory().ping()
+        except Exception:
+            with self._lock:
+                self._backoff = min(self._backoff * 2 or settings.REDIS_HEALTH_BACKOFF_BASE_SECONDS,
+                                    settings.REDIS_HEALTH_BACKOFF_MAX_SECONDS)
+                self._next_probe_at = time.monotonic() + self._backoff
+                self._probing = False
+            return
+        with self._lock:
+            self._close()
+            self._probing = False
+
+    def snapshot(self) -> dict:
+        return {
+            "state": self._state,
+            "consecutive_failures": self._failures,
+            "backoff_seconds": self._backoff,
+            "opened_at": self._opened_at,
+        }
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str = "default", client_factory: Callable | None = None) -> CircuitBreaker:
+    """Process-wide breaker for a Redis connection; created on first use."""
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(name)
+            if breaker is None:
+                if client_factory is None:
+                    from .redis_client import get_redis
+
+                    def client_factory():
+                        return get_redis(name)
+
+                breaker = _breakers[name] = CircuitBreaker(name, client_factory)
+    return breaker
+
+
+def breaker_stats() -> dict:
+    return {name: breaker.snapshot() for name, breaker in _breakers.items()}
@@ -5,10 +5,8 @@ from typing import Iterable, List, Optional
 import httpx
 from celery import shared_task
 
-try:
-    import redis as redis_lib
-except Exception:  # pragma: no cover
-    redis_lib = None
+from .http import telegram_send_many
+from .redis_client import get_redis
 
 
 def _chunk(text: str, size: int = 3800) -> Iterable[str]:
@@ -17,30 +15,28 @@ def _chunk(text: str, size: int = 3800) -> Iterable[str]:
 
 
 def _get_redis():  # -> Optional[redis.Redis]
-    if redis_lib is None:
-        return None
-    url = os.getenv("ALERT_REDIS_URL")
-    if not url:
-        # fallback to standard redis envs
-        host = os.getenv("REDIS_HOST", "redis")
-        port = int(os.getenv("REDIS_PORT", "6379"))
-        db = int(os.getenv("REDIS_DB", "0"))
-        url = f"redis://{host}:{port}/{db}"
+    # Shared pooled client; ALERT_REDIS_URL is read in settings.REDIS_CONNECTIONS
     try:
-        return redis_lib.from_url(url)
+        return get_redis("alerts")
     except Exception:
         return None
 
 
-def _should_send(text: str, ttl: int) -> bool:
+def _fingerprint_key(text: str, chat_ids: Optional[List[str]] = None) -> str:
+    # fingerprint based on first part to avoid token-specific mismatch;
+    # recipients are part of it: the same text to another chat is a different alert
+    base = text.strip().splitlines()
+    head = "\n".join(base[:10])[:1000]
+    recipients = ",".join(sorted(str(chat_id) for chat_id in chat_ids or ()))
+    fingerprint = hashlib.sha256(f"{recipients}|{head}".encode("utf-8")).hexdigest()
+    return f"alert:{fingerprint}"
+
+
+def _should_send(text: str, ttl: int, chat_ids: Optional[List[str]] = None) -> bool:
     r = _get_redis()
     if not r:
         return True  # no redis: no throttling
-    # fingerprint based on first part to avoid token-specific mismatch
-    base = text.strip().splitlines()
-    head = "\n".join(base[:10])[:1000]
-    fingerprint = hashlib.sha256(head.encode("utf-8")).hexdigest()
-    key = f"alert:{fingerprint}"
+    key = _fingerprint_key(text, chat_ids)
     try:
         # SETNX with TTL via set(name, value, nx=True, ex=ttl)
         created = r.set(key, "1", nx=True, ex=ttl)
@@ -56,8 +52,38 @@ def _get_admins_and_token() -> tuple[List[str], Optional[str]]:
     return admins, token
 
 
-@shared_task(bind=True, autoretry_for=(Exception,), retry_backoff=True, retry_kwargs={"max_retries": 3})
-def send_telegram_alert_task(self, text: str, chat_ids: Optional[List[str]] = None) -> None:
+ALERT_MAX_RETRIES = 3
+
+
+def _release(keys: List[str]) -> None:
+    """Drop dedup claims of an alert that could not be delivered, so the next run retries it."""
+    r = _get_redis()
+    if r is None or not keys:
+        return
+    try:
+        r.delete(*keys)
+    except Exception:
+        pass
+
+
+@shared_task(bind=True, autoretry_for=(Exception,), retry_backoff=True, retry_kwargs={"max_retries": ALERT_MAX_RETRIES})
+def send_telegram_alert_task(
+    self, text: str, chat_ids: Optional[List[str]] = None, release_keys: Optional[List[str]] = None
+) -> None:
+    """Send ``text`` to admins (or ``chat_ids``).
+
+    ``release_keys`` are caller-side claim keys (SET NX) deleted when the
+    last retry fails, so a claimed-but-undelivered alert is not suppressed.
+    """
+    try:
+        _send_alert(text, chat_ids)
+    except Exception:
+        if self.request.retries >= ALERT_MAX_RETRIES:
+            _release(release_keys or [])
+        raise
+
+
+def _send_alert(text: str, chat_ids: Optional[List[str]]) -> None:
     admins, token = _get_admins_and_token()
     if chat_ids:
         admins = chat_ids
@@ -65,21 +91,19 @@ def send_telegram_alert_task(self, text: str, chat_ids: Optional[List[str]] = No
         return
 
     throttle = int(os.getenv("ALERT_THROTTLE_SECONDS", "120"))
-    if not _should_send(text, throttle):
+    if not _should_send(text, throttle, chat_ids):
         return
 
-    api_base = os.getenv("TELEGRAM_API_BASE", "https://api.telegram.org")
-    url = f"{api_base}/bot{token}/sendMessage"
-    timeout = float(os.getenv("ALERT_HTTP_TIMEOUT", "5"))
-
-    with httpx.Client(timeout=timeout) as client:
+    # Pooled keep-alive client, admins are messaged concurrently
+    try:
         for part in _chunk(text):
-            for chat_id in admins:
-                try:
-                    client.post(url, data={"chat_id": chat_id, "text": part})
-                except Exception as e:
-                    # let autoretry handle transient failures
-                    raise e
+            result = telegram_send_many(token, admins, part)
+            if result["failed"]:
+                # let autoretry handle transient failures
+                raise httpx.HTTPError(f"Telegram alert not delivered to {len(result['failed'])} chat(s)")
+    except Exception:
+        _release([_fingerprint_key(text, chat_ids)])  # the retry must not be deduplicated away
+        raise
 
 
 @shared_task(bind=True)
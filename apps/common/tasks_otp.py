@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import json
 import logging
 import os
 from celery import shared_task
@@ -7,50 +8,138 @@ import httpx
 
 from django.conf import settings
 
+from .http import get_http_client, telegram_send_many
+from .redis_client import get_redis
+
 try:
-    from aiogram import Bot
     from bot.data.config import BOT_TOKEN, ADMINS
-except Exception:  # pragma: no cover - aiogram might not be installed in some envs
-    Bot = None
+except Exception:  # pragma: no cover - bot config might be missing in some envs
     BOT_TOKEN = None
     ADMINS = []
 
 logger = logging.getLogger("apps.auth")
 
+SMS_QUEUE_KEY = "sms:otp:queue"
+SMS_FLUSH_SCHEDULED_KEY = "sms:otp:flush_scheduled"
 
-@shared_task(bind=True, autoretry_for=(httpx.HTTPError,), retry_backoff=2, retry_kwargs={"max_retries": 3})
-def send_sms_otp_task(self, phone: str, code: str) -> dict:
+
+def _sms_payload(phone: str, code: str) -> dict:
+    return {"to": phone, "message": f"Your verification code: {code}"}
+
+
+def deliver_sms(messages: list[tuple[str, str]]) -> dict:
     """
-    Send OTP via an SMS provider.
+    Send OTP messages through the provider over the pooled HTTP client.
 
-    The default implementation logs the event. If SMS_PROVIDER_URL and SMS_API_KEY are set,
-    it will perform a POST request to that URL.
+    If SMS_PROVIDER_BULK_URL is set, several messages go out as one
+    ``{"messages": [{"to", "message"}, ...]}`` POST; otherwise each message is
+    a POST to SMS_PROVIDER_URL (reusing the same keep-alive connection).
+    Without provider credentials the codes are only logged.
     """
     provider_url = os.getenv("SMS_PROVIDER_URL")
+    bulk_url = os.getenv("SMS_PROVIDER_BULK_URL")
     api_key = os.getenv("SMS_API_KEY")
 
-    payload = {"to": phone, "message": f"Your verification code: {code}"}
-
-    if provider_url and api_key:
+    if api_key and (provider_url or bulk_url):
+        client = get_http_client()
         timeout = float(os.getenv("SMS_PROVIDER_TIMEOUT", "5"))
         headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
-        with httpx.Client(timeout=timeout) as client:
-            resp = client.post(provider_url, json=payload, headers=headers)
+        if bulk_url and (len(messages) > 1 or not provider_url):
+            resp = client.post(
+                bulk_url,
+                json={"messages": [_sms_payload(phone, code) for phone, code in messages]},
+                headers=headers,
+                timeout=timeout,
+            )
+            resp.raise_for_status()
+            logger.info("OTP batch sent via provider", extra={"count": len(messages)})
+            return {"status": "sent", "provider": bulk_url, "count": len(messages)}
+        for phone, code in messages:
+            resp = client.post(provider_url, json=_sms_payload(phone, code), headers=headers, timeout=timeout)
             resp.raise_for_status()
             logger.info("OTP sent via provider", extra={"phone": phone})
-            return {"status": "sent", "provider": provider_url}
+        return {"status": "sent", "provider": provider_url, "count": len(messages)}
 
     # Fallback: just log
-    logger.info("OTP send (log-only)", extra={"phone": phone, "code": code})
+    for phone, code in messages:
+        logger.info("OTP send (log-only)", extra={"phone": phone, "code": code})
+
+        # Optional: send via Telegram bot to all admins (for dev/testing) if TELEGRAM_OTP_NOTIFY is enabled
+        if os.getenv("TELEGRAM_OTP_NOTIFY", "false").lower() == "true" and BOT_TOKEN and ADMINS:
+            try:
+                send_telegram_otp_task.delay(phone, code)
+            except Exception:
+                logger.exception("Failed to enqueue telegram OTP notify task")
+
+    return {"status": "logged", "count": len(messages)}
 
-    # Optional: send via Telegram bot to all admins (for dev/testing) if TELEGRAM_OTP_NOTIFY is enabled
-    if os.getenv("TELEGRAM_OTP_NOTIFY", "false").lower() == "true" and Bot and BOT_TOKEN and ADMINS:
+
+def enqueue_sms_otp(phone: str, code: str) -> None:
+    """
+    Queue an OTP SMS for batched delivery.
+
+    Sends arriving within SMS_BATCH_WINDOW_SECONDS are coalesced: the first
+    one schedules ``send_sms_otp_batch_task`` with that countdown, the rest
+    only append to the Redis list. Without Redis (or with the window set to
+    0) the code is sent by its own task as before.
+    """
+    window = settings.SMS_BATCH_WINDOW_SECONDS
+    if window > 0:
         try:
-            send_telegram_otp_task.delay(phone, code)
+            r = get_redis("otp")
+            pipe = r.pipeline()
+            pipe.rpush(SMS_QUEUE_KEY, json.dumps([phone, code]))
+            pipe.expire(SMS_QUEUE_KEY, settings.OTP_CODE_TTL_SECONDS)
+            pipe.set(SMS_FLUSH_SCHEDULED_KEY, "1", nx=True, ex=max(1, int(window * 10)))
+            _, _, scheduled = pipe.execute()
+            if scheduled:
+                send_sms_otp_batch_task.apply_async(countdown=window)
+            return
         except Exception:
-            logger.exception("Failed to enqueue telegram OTP notify task")
+            logger.warning("Redis unavailable, OTP SMS sent without batching")
+    send_sms_otp_task.delay(phone, code)
 
-    return {"status": "logged"}
+
+@shared_task(bind=True, autoretry_for=(httpx.HTTPError,), retry_backoff=2, retry_kwargs={"max_retries": 3})
+def send_sms_otp_task(self, phone: str, code: str) -> dict:
+    """
+    Send OTP via an SMS provider.
+
+    The default implementation logs the event. If SMS_PROVIDER_URL and SMS_API_KEY are set,
+    it will perform a POST request to that URL.
+    """
+    return deliver_sms([(phone, code)])
+
+
+@shared_task(bind=True)
+def send_sms_otp_batch_task(self) -> dict:
+    """
+    Drain the OTP SMS queue filled by ``enqueue_sms_otp``.
+
+    Takes up to SMS_BATCH_MAX_SIZE messages per provider call. A failed batch
+    is handed to ``send_sms_otp_task`` message by message, which retries with
+    backoff.
+    """
+    r = get_redis("otp")
+    # Clear the flag first: anything queued from now on schedules a new flush
+    r.delete(SMS_FLUSH_SCHEDULED_KEY)
+    sent = 0
+    while True:
+        pipe = r.pipeline(transaction=True)
+        pipe.lrange(SMS_QUEUE_KEY, 0, settings.SMS_BATCH_MAX_SIZE - 1)
+        pipe.ltrim(SMS_QUEUE_KEY, settings.SMS_BATCH_MAX_SIZE, -1)
+        items, _ = pipe.execute()
+        if not items:
+            break
+        messages = [tuple(json.loads(item)) for item in items]
+        try:
+            deliver_sms(messages)
+            sent += len(messages)
+        except httpx.HTTPError:
+            logger.exception("OTP SMS batch failed, retrying individually", extra={"count": len(messages)})
+            for phone, code in messages:
+                send_sms_otp_task.delay(phone, code)
+    return {"status": "sent", "count": sent}
 
 
 @shared_task(bind=True)
@@ -59,21 +148,10 @@ def send_telegram_otp_task(self, phone: str, code: str) -> dict:
 
     Controlled by TELEGRAM_OTP_NOTIFY env variable. Not for production end-users.
     """
-    if not (Bot and BOT_TOKEN and ADMINS):
+    if not (BOT_TOKEN and ADMINS):
         logger.info("Telegram OTP notify skipped: missing bot config")
         return {"status": "skipped"}
-    try:
-        bot = Bot(token=BOT_TOKEN)
-        text = f"OTP test\nPhone: {phone}\nCode: {code}"
-        for admin_id in ADMINS:
-            try:
-                # Fire and forget individual messages
-                import asyncio
-                asyncio.get_event_loop().run_until_complete(bot.send_message(admin_id, text))
-            except Exception:
-                logger.exception("Failed sending OTP to admin", extra={"admin": admin_id})
-        logger.info("OTP sent to admins via Telegram", extra={"phone": phone})
-        return {"status": "telegram"}
-    except Exception:
-        logger.exception("Telegram OTP notify failure")
-        return {"status": "error"}
+    text = f"OTP test\nPhone: {phone}\nCode: {code}"
+    result = telegram_send_many(BOT_TOKEN, ADMINS, text)
+    logger.info("OTP sent to admins via Telegram", extra={"phone": phone, "sent": result["sent"]})
+    return {"status": "telegram", **result}
@@ -1,3 +1,280 @@
-from django.test import TestCase
+import json
+import logging
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
-# Create your tests here.
+import fakeredis
+import redis
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import ResolverMatch
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+from rest_framework.views import APIView
+
+from .http import telegram_send_many
+from .logging_handlers import TelegramAdminHandler
+from .metrics import Recorder, render
+from .middleware import RequestMetricsMiddleware
+from . import ratelimit
+from .ratelimit import Rate, Verdict, hit_all, parse_rate
+from .tasks_otp import deliver_sms
+from .throttling import ScopedUserRateThrottle
+from .otp import _MemoryStore, OTPError, OTPService, VERIFY_MISSING, VERIFY_OK, VERIFY_WRONG
+from .redis_client import get_redis
+from .redis_health import CircuitBreaker, CLOSED, OPEN
+
+KEYS = ('otp:code', 'otp:cooldown', 'otp:attempts')
+
+
+class MemoryStoreOTPTests(TestCase):
+    """Fallback store must behave exactly like the Lua scripts"""
+
+    def setUp(self):
+        self.store = _MemoryStore()
+
+    def test_request_respects_cooldown(self):
+        self.assertEqual(self.store.otp_request(*KEYS, '12345', 300, 60), (1, 0))
+        ok, ttl = self.store.otp_request(*KEYS, '54321', 300, 60)
+        self.assertEqual(ok, 0)
+        self.assertGreater(ttl, 0)
+        self.assertEqual(self.store.get('otp:code'), '12345')
+
+    def test_verify_success_clears_keys(self):
+        self.store.otp_request(*KEYS, '12345', 300, 60)
+        self.assertEqual(self.store.otp_verify('otp:code', 'otp:attempts', '00000', 3), (VERIFY_WRONG, 1))
+        self.assertEqual(self.store.otp_verify('otp:code', 'otp:attempts', '12345', 3), (VERIFY_OK, 0))
+        self.assertFalse(self.store.exists('otp:code'))
+        self.assertFalse(self.store.exists('otp:attempts'))
+
+    def test_code_burned_after_max_attempts(self):
+        self.store.otp_request(*KEYS, '12345', 300, 60)
+        for attempt in (1, 2, 3):
+            self.assertEqual(self.store.otp_verify('otp:code', 'otp:attempts', '00000', 3), (VERIFY_WRONG, attempt))
+        self.assertEqual(self.store.otp_verify('otp:code', 'otp:attempts', '12345', 3), (VERIFY_MISSING, 0))
+
+
+@override_settings(REDIS_HEALTH_FAILURE_THRESHOLD=2, REDIS_HEALTH_BACKOFF_BASE_SECONDS=0)
+class CircuitBreakerTests(TestCase):
+    def test_opens_after_threshold_and_probe_closes(self):
+        client = mock.Mock()
+        breaker = CircuitBreaker('test', lambda: client)
+        breaker.record_failure()
+        self.assertTrue(breaker.available())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, OPEN)
+
+        client.ping.side_effect = redis.ConnectionError
+        breaker._probe()
+        self.assertEqual(breaker.state, OPEN)
+        client.ping.side_effect = None
+        breaker._probe()
+        self.assertEqual(breaker.state, CLOSED)
+        self.assertTrue(breaker.available())
+
+    @override_settings(OTP_STORE_FALLBACK='fail')
+    @mock.patch('apps.common.otp._RedisStore.otp_request', side_effect=redis.ConnectionError)
+    def test_fail_policy_rejects_without_redis(self, _):
+        breaker = CircuitBreaker('otp', mock.Mock)
+        with mock.patch('apps.common.otp.get_breaker', return_value=breaker):
+            with self.assertRaises(OTPError):
+                OTPService.request_code('+998901234567')
+        self.assertEqual(breaker.snapshot()['consecutive_failures'], 1)
+
+
+class RedisRegistryTests(TestCase):
+    def test_names_with_same_url_share_a_pool(self):
+        self.assertIs(get_redis('otp'), get_redis('otp'))
+        self.assertIs(get_redis('otp').connection_pool, get_redis('cache').connection_pool)
+        # fsm uses decode_responses=False, so it gets its own pool
+        self.assertIsNot(get_redis('otp').connection_pool, get_redis('fsm').connection_pool)
+
+
+class ThrottledView(APIView):
+    permission_classes = [AllowAny]
+    throttle_classes = [ScopedUserRateThrottle]
+    throttle_scope = 'quiz_answer'
+
+    def get(self, request):
+        return Response({'ok': True})
+
+
+class ScopedThrottleTests(TestCase):
+    @mock.patch('apps.common.throttling.hit', return_value=Verdict(False, 2.4, 0))
+    def test_rejects_with_retry_after(self, hit):
+        response = ThrottledView.as_view()(APIRequestFactory().get('/', REMOTE_ADDR='10.0.0.1'))
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '3')
+        self.assertEqual(hit.call_args.args[0], 'quiz_answer:ip:10.0.0.1')
+
+
+class RateTests(TestCase):
+    def test_interval_never_exceeds_the_limit(self):
+        # 1000 / 30 = 33.3 ms: 33 ms would allow 30.3 requests per second
+        self.assertEqual(parse_rate("30/s").interval_ms, 34)
+        self.assertEqual(parse_rate("100/min").interval_ms, 600)
+        self.assertEqual(Rate(5000, 1).interval_ms, 1)
+
+
+class RateLimitTests(TestCase):
+    """GCRA script against fakeredis"""
+
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        for patcher in (
+            mock.patch.object(ratelimit, 'get_redis', lambda *a: self.redis),
+            mock.patch.object(ratelimit, '_sync_script', None),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_handler_rejection_does_not_spend_user_budget(self):
+        user, handler = ('u1', parse_rate("5/m")), ('u1:cmd:login', parse_rate("1/m"))
+        self.assertTrue(hit_all([user, handler]).allowed)
+        tat = self.redis.get('rl:u1')
+
+        for _ in range(3):
+            self.assertFalse(hit_all([user, handler]).allowed)
+        self.assertEqual(self.redis.get('rl:u1'), tat)
+
+        # 4 of the 5 per-user requests are still left
+        self.assertEqual([hit_all([user]).allowed for _ in range(5)], [True] * 4 + [False])
+
+    def test_notice_once_per_window(self):
+        limit = [('u2', parse_rate("1/m"))]
+        self.assertTrue(hit_all(limit, notice_key='u2:notice').allowed)
+
+        first = hit_all(limit, notice_key='u2:notice')
+        second = hit_all(limit, notice_key='u2:notice')
+        self.assertEqual((first.allowed, first.notify), (False, True))
+        self.assertEqual((second.allowed, second.notify), (False, False))
+        self.assertTrue(0 < self.redis.pttl('rl:u2:notice') <= 60_000)
+
+        self.redis.delete('rl:u2:notice')  # window over
+        self.assertTrue(hit_all(limit, notice_key='u2:notice').notify)
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.server.calls.append((self.path, body))
+        self.send_response(400 if b'chat_id=bad' in body else 200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'{}')
+
+    def log_message(self, *args):
+        pass
+
+
+class OutboundHTTPTests(TestCase):
+    """Provider calls against a local stub server"""
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _StubHandler)
+        self.server.calls = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base = f"http://127.0.0.1:{self.server.server_port}"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_sms_batch_is_one_bulk_call(self):
+        env = {'SMS_API_KEY': 'k', 'SMS_PROVIDER_URL': f"{self.base}/sms", 'SMS_PROVIDER_BULK_URL': f"{self.base}/bulk"}
+        with mock.patch.dict(os.environ, env):
+            result = deliver_sms([('+998901111111', '1111'), ('+998902222222', '2222')])
+        self.assertEqual(result['count'], 2)
+        self.assertEqual(len(self.server.calls), 1)
+        path, body = self.server.calls[0]
+        self.assertEqual(path, '/bulk')
+        self.assertEqual([m['to'] for m in json.loads(body)['messages']], ['+998901111111', '+998902222222'])
+
+    def test_telegram_fan_out_reports_failures(self):
+        with override_settings(TELEGRAM_API_BASE=self.base):
+            result = telegram_send_many('TOKEN', ['1', 'bad', '3'], 'salom')
+        self.assertEqual(result, {'sent': 2, 'failed': ['bad']})
+        self.assertEqual(len(self.server.calls), 3)
+
+
+class TelegramDigestTests(TestCase):
+    """Error records are aggregated in-process and sent as one digest"""
+
+    def _record(self, exc, msg='boom %s'):
+        try:
+            raise exc
+        except Exception:
+            return logging.getLogger('api').makeRecord(
+                'api', logging.ERROR, __file__, 1, msg, ('x',), exc_info=sys.exc_info()
+            )
+
+    @mock.patch('apps.common.logging_handlers.send_telegram_alert_task')
+    def test_storm_becomes_one_digest_and_overflow_is_counted(self, task):
+        with mock.patch.dict(os.environ, {'ADMINS': '1,2', 'ERROR_ALERTS_ENABLED': 'true'}):
+            handler = TelegramAdminHandler(interval=3600, capacity=1)
+        for _ in range(5):
+            handler.handle(self._record(ValueError('a')))
+        handler.handle(self._record(KeyError('b')))  # new fingerprint, buffer full
+        task.apply_async.assert_not_called()
+
+        handler.close()
+        task.apply_async.assert_called_once()
+        kwargs = task.apply_async.call_args.kwargs['kwargs']
+        self.assertEqual(kwargs['chat_ids'], ['1', '2'])
+        self.assertIn('x5', kwargs['text'])
+        self.assertIn('ValueError', kwargs['text'])
+        self.assertIn('dropped=1', kwargs['text'])
+        self.assertNotIn('KeyError', kwargs['text'])
+
+
+class RequestMetricsTests(TestCase):
+    """Middleware numbers end up in the Prometheus output"""
+
+    def _redis(self):
+        store = {}
+
+        def incr(key, field, value):
+            store[field] = store.get(field, 0) + value
+
+        redis = mock.Mock()
+        redis.pipeline.return_value.hincrby.side_effect = incr
+        redis.pipeline.return_value.hincrbyfloat.side_effect = incr
+        redis.hgetall.side_effect = lambda key: {field: str(value) for field, value in store.items()}
+        return redis
+
+    def test_route_latency_and_db_queries(self):
+        def view(request):
+            get_user_model().objects.count()
+            return HttpResponse('ok')
+
+        request = RequestFactory().get('/api/things/')
+        request.resolver_match = ResolverMatch(view, (), {}, url_name='things', route='api/things/')
+        recorder = Recorder(buckets=[60.0], interval=3600)
+        with mock.patch('apps.common.metrics.recorder', recorder), \
+                mock.patch('apps.common.redis_client.get_redis', return_value=self._redis()):
+            RequestMetricsMiddleware(view)(request)
+            text = render()
+
+        labels = 'route="things",method="GET",status="200"'
+        self.assertIn(f'http_request_duration_seconds_bucket{{{labels},le="60"}} 1', text)
+        self.assertIn(f'http_request_duration_seconds_count{{{labels}}} 1', text)
+        self.assertIn(f'http_request_db_queries_total{{{labels}}} 1', text)
+
+    @mock.patch('apps.common.views.render', return_value='# metrics\n')
+    def test_endpoint_requires_token_outside_debug(self, render_metrics):
+        from .views import metrics
+
+        request = RequestFactory().get('/metrics')
+        with override_settings(METRICS_TOKEN='', DEBUG=False):
+            self.assertEqual(metrics(request).status_code, 403)
+        with override_settings(METRICS_TOKEN='', DEBUG=True):
+            self.assertEqual(metrics(request).status_code, 200)
+        with override_settings(METRICS_TOKEN='s3cret', DEBUG=False):
+            self.assertEqual(metrics(request).status_code, 403)
+            authorized = RequestFactory().get('/metrics', HTTP_AUTHORIZATION='Bearer s3cret')
+            self.assertEqual(metrics(authorized).status_code, 200)
@@ -0,0 +1,66 @@
+"""DRF throttles backed by the Redis GCRA limiter (``apps.common.ratelimit``).
+
+Rates come from ``REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']`` like the stock
+DRF throttles. Views opt in with ``throttle_classes`` and ``throttle_scope``;
+the 429 response carries ``Retry-After`` (DRF sets it from ``wait()``).
+"""
+from __future__ import annotations
+
+from rest_framework.throttling import SimpleRateThrottle
+
+from .ratelimit import hit, parse_rate
+
+
+class GCRARateThrottle(SimpleRateThrottle):
+    """Base class: one Lua round trip per check, shared by all workers."""
+
+    def __init__(self):
+        if not getattr(self, 'rate', None):
+            self.rate = self.get_rate()
+        self.limit = parse_rate(self.rate)
+
+    def allow_request(self, request, view):
+        if self.limit is None:
+            return True
+        key = self.get_cache_key(request, view)
+        if key is None:
+            return True
+        self.verdict = hit(key, self.limit)
+        return self.verdict.allowed
+
+    def wait(self):
+        return self.verdict.retry_after
+
+
+class ScopedUserRateThrottle(GCRARateThrottle):
+    """
+    Limit per endpoint scope (``view.throttle_scope``) and per user;
+    anonymous requests are keyed by client IP.
+    """
+
+    def __init__(self):
+        # Scope is only known once the view is available
+        pass
+
+    def allow_request(self, request, view):
+        # Function views (@api_view) cannot set throttle_scope: subclass with `scope` instead
+        self.scope = getattr(view, 'throttle_scope', None) or type(self).scope
+        if not self.scope:
+            return True
+        self.rate = self.get_rate()
+        self.limit = parse_rate(self.rate)
+        return super().allow_request(request, view)
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = f"user:{request.user.pk}"
+        else:
+            ident = f"ip:{self.get_ident(request)}"
+        return f"{self.scope}:{ident}"
+
+
+class ScopedIPRateThrottle(ScopedUserRateThrottle):
+    """Limit per endpoint scope and client IP (login/OTP endpoints)."""
+
+    def get_cache_key(self, request, view):
+        return f"{self.scope}:ip:{self.get_ident(request)}"
@@ -1,3 +1,31 @@
-from django.shortcuts import render
+import hmac
 
-# Create your views here.
+from django.conf import settings
+from django.http import HttpRequest, HttpResponse, HttpResponseForbidden
+from django.views.decorators.http import require_http_methods
+
+from .metrics import render
+
+
+def has_metrics_token(request: HttpRequest) -> bool:
+    """``Authorization: Bearer <METRICS_TOKEN>``; without a token only DEBUG is open."""
+    token = settings.METRICS_TOKEN
+    if not token:
+        return settings.DEBUG
+    return hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}")
+
+
+@require_http_methods(["GET"])
+def metrics(request: HttpRequest) -> HttpResponse:
+    """Prometheus scrape endpoint (all workers, aggregated in Redis).
+
+    The scraper must send ``Authorization: Bearer <METRICS_TOKEN>``; with no
+    token configured the endpoint is only served when DEBUG is on.
+    """
+    if not has_metrics_token(request):
+        return HttpResponseForbidden("forbidden")
+    try:
+        body = render()
+    except Exception as e:  # pragma: no cover - depends on env
+        return HttpResponse(f"# metrics unavailable: {e}\n", status=503, content_type="text/plain")
+    return HttpResponse(body, content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,128 @@
+"""
+Fan bo'yicha savollar banki snapshoti (Redis).
+
+Fanning barcha faol savollari va javob variantlari bitta so'rov bilan
+yig'iladi va JSON ko'rinishida versiyalangan kalitda saqlanadi:
+
+- ``quiz:bank:{subject_id}`` - joriy versiya;
+- ``quiz:bank:{subject_id}:{version}`` - snapshotning o'zi.
+
+Test sessiyasi boshlanganda versiya yozib qo'yiladi, shuning uchun savol
+tahrirlansa ham davom etayotgan test o'z snapshotidan foydalanadi. Savol
+yoki javob o'zgarganda (signals) joriy versiya o'chiriladi va keyingi
+so'rov yangi snapshot quradi. Har bir jarayon o'qilgan snapshotlarni
+xotirada ham saqlaydi (versiya o'zgarmas - eskirish yo'q).
+"""
+from __future__ import annotations
+
+import json
+import logging
+import uuid
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Prefetch
+
+from apps.common.redis_client import get_async_redis, get_redis
+from .models import Answer, Question
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "quiz:bank"
+MEMO_SIZE = 64
+
+
+class Bank(NamedTuple):
+    subject_id: str
+    version: str
+    questions: dict  # question_id -> {"text", "time_limit", "answers": [{"id", "text", "correct"}]}
+
+
+_memo: "OrderedDict[tuple, Bank]" = OrderedDict()
+
+
+def _pointer_key(subject_id) -> str:
+    return f"{KEY_PREFIX}:{subject_id}"
+
+
+def _bank_key(subject_id, version: str) -> str:
+    return f"{KEY_PREFIX}:{subject_id}:{version}"
+
+
+def _remember(bank: Bank) -> Bank:
+    _memo[(bank.subject_id, bank.version)] = bank
+    _memo.move_to_end((bank.subject_id, bank.version))
+    while len(_memo) > MEMO_SIZE:
+        _memo.popitem(last=False)
+    return bank
+
+
+def _decode(subject_id: str, version: str, raw) -> Bank:
+    return _remember(Bank(subject_id, version, json.loads(raw)))
+
+
+def build_bank(subject_id) -> Bank:
+    """Fan snapshotini bazadan yig'ish va Redis ga yozish."""
+    subject_id = str(subject_id)
+    questions = Question.objects.filter(subject_id=subject_id, deleted_at__isnull=True).prefetch_related(
+        Prefetch('answers', queryset=Answer.objects.filter(deleted_at__isnull=True).order_by('order'))
+    ).order_by('order', 'created_at')
+    data = {
+        str(q.id): {
+            'text': q.question_text,
+            'time_limit': q.time_limit,
+            'answers': [
+                {'id': str(a.id), 'text': a.answer_text, 'correct': a.is_correct} for a in q.answers.all()
+            ],
+        }
+        for q in questions
+    }
+    bank = _remember(Bank(subject_id, uuid.uuid4().hex[:12], data))
+    try:
+        ttl = settings.QUIZ_BANK_TTL_SECONDS
+        pipe = get_redis("cache").pipeline()
+        pipe.set(_bank_key(subject_id, bank.version), json.dumps(data), ex=ttl)
+        pipe.set(_pointer_key(subject_id), bank.version, ex=ttl)
+        pipe.execute()
+    except Exception:
+        logger.warning("Redis unavailable, question bank not cached", extra={"subject_id": subject_id})
+    return bank
+
+
+async def aget_bank(subject_id, version: Optional[str] = None) -> Bank:
+    """
+    Snapshotni olish: xotira -> Redis -> baza.
+
+    Args:
+        version: Sessiyada saqlangan versiya; berilmasa joriy versiya
+    """
+    subject_id = str(subject_id)
+    if version and (subject_id, version) in _memo:
+        return _memo[(subject_id, version)]
+    try:
+        redis = get_async_redis("cache")
+        if version is None:
+            version = await redis.get(_pointer_key(subject_id))
+            if version and (subject_id, version) in _memo:
+                return _memo[(subject_id, version)]
+        raw = await redis.get(_bank_key(subject_id, version)) if version else None
+        if raw:
+            return _decode(subject_id, version, raw)
+    except Exception:
+        logger.warning("Redis unavailable, question bank loaded from DB", extra={"subject_id": subject_id})
+    return await sync_to_async(build_bank)(subject_id)
+
+
+def invalidate_bank(subject_id) -> None:
+    """Joriy versiyani tranzaksiya tugagach o'chirish (eski versiyalar TTL gacha qoladi)."""
+
+    def _drop():
+        try:
+            get_redis("cache").delete(_pointer_key(subject_id))
+        except Exception:
+            logger.warning("Redis unavailable, question bank not invalidated", extra={"subject_id": str(subject_id)})
+
+    transaction.on_commit(_drop)
@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 from apps.common.models import BaseModel
 
 
@@ -115,6 +116,35 @@ class Quiz(BaseModel):
             self.score = 0
         self.save()
     
+    def update_attempt_statistics(self):
+        """Tugatilgan test natijasini QuizAttempt statistikasiga qo'shish"""
+        attempt, created = QuizAttempt.objects.get_or_create(
+            student=self.student,
+            subject=self.subject,
+            defaults={'deleted_at': None}
+        )
+        
+        attempt.total_attempts += 1
+        attempt.total_questions_answered += self.total_questions
+        attempt.total_correct += self.correct_answers
+        attempt.total_wrong += self.wrong_answers
+        attempt.last_attempt_date = timezone.now()
+        
+        # O'rtacha ballni hisoblash
+        attempt.average_score = Quiz.objects.filter(
+            student=self.student,
+            subject=self.subject,
+            is_completed=True,
+            deleted_at__isnull=True
+        ).aggregate(models.Avg('score'))['score__avg'] or 0
+        
+        # Eng yaxshi ballni yangilash
+        if self.score > attempt.best_score:
+            attempt.best_score = self.score
+        
+        attempt.save()
+        return attempt
+    
     class Meta:
         verbose_name = "Test sessiyasi"
         verbose_name_plural = "Test sessiyalari"
@@ -0,0 +1,175 @@
+"""
+Bot orqali topshirilayotgan test sessiyasi holati (Redis).
+
+Sessiya davomida baza ishlatilmaydi: har bir javob bitta Lua chaqiruvi
+(savol indeksini tekshirish, javobni ro'yxatga qo'shish, sarflangan vaqtni
+hisoblash), savollar esa bank snapshotidan (apps/quizzes/bank.py) olinadi.
+Ikki marta bosilgan yoki eski xabardagi tugma indeks mos kelmagani uchun
+rad etiladi; boshqa Telegram foydalanuvchisining bosishi va mavjud bo'lmagan
+variant (soxta callback) ham skript ichida, yozishdan oldin rad etiladi. Test tugaganda barcha javoblar bitta tranzaksiyada
+``bulk_create`` bilan yoziladi; sessiya faqat saqlangandan keyin
+o'chiriladi, shuning uchun saqlash muvaffaqiyatsiz bo'lsa javoblar
+yo'qolmaydi va yakunlashni qayta urinish mumkin.
+
+Javob ``savol indeksi:variant indeksi:soniya`` ko'rinishida saqlanadi; ID
+larga faqat yakunda snapshot orqali aylantiriladi.
+
+Kalitlar: ``quiz:session:{quiz_id}`` (hash: meta, index, asked_at) va
+``quiz:session:{quiz_id}:answers`` (ro'yxat).
+"""
+from __future__ import annotations
+
+import json
+import time
+from typing import NamedTuple, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from apps.common.redis_client import get_async_redis
+from .bank import Bank
+from .models import Quiz, StudentAnswer
+
+KEY_PREFIX = "quiz:session"
+
+INVALID = -4
+FORBIDDEN = -3
+EXPIRED = -2
+STALE = -1
+
+# KEYS: hash, answers; ARGV: expected index, option, ttl, Telegram id
+# Returns {new index | STALE | EXPIRED | FORBIDDEN | INVALID, meta}
+_ANSWER_LUA = """
+local meta = redis.call('HGET', KEYS[1], 'meta')
+if not meta then
+    return {-2, false}
+end
+local decoded = cjson.decode(meta)
+if tostring(decoded.tg_id) ~= ARGV[4] then
+    return {-3, meta}
+end
+local index = tonumber(ARGV[1])
+if tonumber(redis.call('HGET', KEYS[1], 'index')) ~= index then
+    return {-1, meta}
+end
+local options = decoded.options and decoded.options[index + 1]
+local option = tonumber(ARGV[2])
+if not options or not option or option < 0 or option >= options then
+    return {-4, meta}
+end
+local t = redis.call('TIME')
+local now = tonumber(t[1])
+local taken = now - tonumber(redis.call('HGET', KEYS[1], 'asked_at') or now)
+redis.call('RPUSH', KEYS[2], ARGV[1] .. ':' .. ARGV[2] .. ':' .. taken)
+redis.call('HSET', KEYS[1], 'asked_at', now)
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+return {redis.call('HINCRBY', KEYS[1], 'index', 1), meta}
+"""
+_scripts: dict = {}
+
+
+class SessionMeta(NamedTuple):
+    quiz_id: str
+    subject_id: str
+    version: str
+    question_ids: list
+    tg_id: str = ''  # testni boshlagan Telegram foydalanuvchisi
+    options: tuple = ()  # har bir savoldagi variantlar soni
+
+
+def _keys(quiz_id) -> list:
+    return [f"{KEY_PREFIX}:{quiz_id}", f"{KEY_PREFIX}:{quiz_id}:answers"]
+
+
+def _script(name: str, source: str):
+    if name not in _scripts:
+        _scripts[name] = get_async_redis("cache").register_script(source)
+    return _scripts[name]
+
+
+async def create_session(quiz_id, bank: Bank, question_ids: list, tg_id) -> SessionMeta:
+    options = [len(bank.questions[question_id]['answers']) for question_id in question_ids]
+    meta = SessionMeta(str(quiz_id), bank.subject_id, bank.version, question_ids, str(tg_id), options)
+    key = _keys(quiz_id)[0]
+    pipe = get_async_redis("cache").pipeline()
+    pipe.hset(key, mapping={'meta': json.dumps(meta._asdict()), 'index': 0, 'asked_at': int(time.time())})
+    pipe.expire(key, settings.QUIZ_SESSION_TTL_SECONDS)
+    await pipe.execute()
+    return meta
+
+
+def _meta(raw) -> Optional[SessionMeta]:
+    return SessionMeta(**json.loads(raw)) if raw else None
+
+
+async def record_answer(quiz_id, index: int, option: int, tg_id) -> tuple[int, Optional[SessionMeta]]:
+    """
+    Javobni yozish (faqat testni boshlagan foydalanuvchidan, mavjud variant).
+
+    Returns:
+        (keyingi savol indeksi yoki STALE / EXPIRED / FORBIDDEN / INVALID, sessiya meta)
+    """
+    status, meta = await _script("answer", _ANSWER_LUA)(
+        keys=_keys(quiz_id),
+        args=[index, option, settings.QUIZ_SESSION_TTL_SECONDS, str(tg_id)],
+    )
+    return int(status), _meta(meta)
+
+
+async def session_answers(quiz_id) -> tuple[Optional[SessionMeta], list[tuple[int, int, int]]]:
+    """
+    Yakunlash uchun meta va javoblarni o'qish (sessiya o'chirilmaydi).
+
+    Returns:
+        (meta yoki None, [(savol indeksi, variant indeksi, sarflangan soniya), ...])
+    """
+    key, answers_key = _keys(quiz_id)
+    pipe = get_async_redis("cache").pipeline()
+    pipe.hget(key, 'meta')
+    pipe.lrange(answers_key, 0, -1)
+    meta, answers = await pipe.execute()
+    return _meta(meta), [tuple(int(part) for part in item.split(':')) for item in answers]
+
+
+async def close_session(quiz_id) -> None:
+    """Javoblar bazaga yozilgandan keyin sessiyani o'chirish"""
+    await get_async_redis("cache").delete(*_keys(quiz_id))
+
+
+def persist_answers(meta: SessionMeta, bank: Bank, answers: list[tuple[int, int, int]]) -> Quiz:
+    """
+    Sessiya javoblarini bitta tranzaksiyada saqlash va testni yakunlash.
+
+    StudentAnswer lar ``bulk_create`` bilan yoziladi (``is_correct`` bank
+    snapshotidan), keyin natija va QuizAttempt statistikasi yangilanadi.
+    """
+    rows, correct = [], 0
+    for index, option, taken in answers:
+        question = bank.questions.get(meta.question_ids[index])
+        if question is None or not 0 <= option < len(question['answers']):
+            # snapshot yo'qolgan yoki variant mavjud emas - bunday javob hisobga olinmaydi
+            continue
+        answer = question['answers'][option]
+        correct += answer['correct']
+        rows.append(StudentAnswer(
+            quiz_id=meta.quiz_id,
+            question_id=meta.question_ids[index],
+            selected_answer_id=answer['id'],
+            is_correct=answer['correct'],
+            time_taken=taken,
+        ))
+
+    with transaction.atomic():
+        quiz = Quiz.objects.select_for_update().select_related('student').get(pk=meta.quiz_id)
+        if quiz.is_completed:
+            return quiz
+        StudentAnswer.objects.bulk_create(rows, ignore_conflicts=True)
+        quiz.correct_answers = correct
+        quiz.wrong_answers = len(rows) - correct
+        quiz.is_completed = True
+        quiz.completed_at = timezone.now()
+        quiz.calculate_results()
+        quiz.update_attempt_statistics()
+    return quiz
@@ -0,0 +1,18 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .bank import invalidate_bank
+from .models import Question, Answer
+
+
+@receiver([post_save, post_delete], sender=Question)
+def invalidate_bank_on_question_change(sender, instance, **kwargs):
+    """Savol o'zgarsa (soft delete ham) fan snapshoti qayta quriladi"""
+    invalidate_bank(instance.subject_id)
+
+
+@receiver([post_save, post_delete], sender=Answer)
+def invalidate_bank_on_answer_change(sender, instance, **kwargs):
+    subject_id = Question.objects.filter(pk=instance.question_id).values_list('subject_id', flat=True).first()
+    if subject_id:
+        invalidate_bank(subject_id)
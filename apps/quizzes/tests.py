@@ -1 +1,183 @@
-# Testlar uchun signal va utility funksiyalar
+import asyncio
+from unittest import mock
+
+import fakeredis
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from apps.students.models import Student
+from auth.users.models import User
+
+from . import bank as question_bank
+from . import session
+from .models import Answer, Question, Quiz, QuizAttempt, StudentAnswer, Subject
+
+
+def make_subject(name="Fizika", questions=3):
+    subject = Subject.objects.create(name=name)
+    for i in range(questions):
+        question = Question.objects.create(subject=subject, question_text=f"Savol {i}", order=i)
+        Answer.objects.create(question=question, answer_text="To'g'ri", is_correct=True, order=0)
+        Answer.objects.create(question=question, answer_text="Noto'g'ri", is_correct=False, order=1)
+    return subject
+
+
+@override_settings(QUIZ_SESSION_TTL_SECONDS=600)
+class QuizSessionTests(SimpleTestCase):
+    """Redis sessiyasi (fakeredis): javob Lua skripti va yakunlash"""
+
+    bank = question_bank.Bank("1", "v1", {q: {"answers": [{}, {}]} for q in ("q1", "q2", "q3")})
+
+    def setUp(self):
+        self.server = fakeredis.FakeServer()
+        self.redis = fakeredis.FakeRedis(server=self.server, decode_responses=True)
+        self.async_redis = None
+        patches = [
+            mock.patch.object(session, "get_async_redis", lambda *a: self.async_redis),
+            mock.patch.dict(session._scripts, clear=True),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def run_async(self, coro_fn):
+        # FakeAsyncRedis ishlatilgan event loop ga bog'lanadi
+        async def main():
+            self.async_redis = fakeredis.FakeAsyncRedis(server=self.server, decode_responses=True)
+            return await coro_fn()
+
+        return asyncio.run(main())
+
+    def test_double_tap_and_stale_index_rejected(self):
+        async def scenario():
+            meta = await session.create_session("abc", self.bank, ["q1", "q2", "q3"], 7)
+            first = await session.record_answer("abc", 0, 1, 7)
+            double_tap = await session.record_answer("abc", 0, 0, 7)
+            ahead = await session.record_answer("abc", 2, 0, 7)
+            return meta, first, double_tap, ahead
+
+        meta, first, double_tap, ahead = self.run_async(scenario)
+        self.assertEqual(first, (1, meta))
+        self.assertEqual(double_tap, (session.STALE, meta))
+        self.assertEqual(ahead[0], session.STALE)
+        # rad etilgan javoblar yozilmaydi
+        self.assertEqual(len(self.redis.lrange("quiz:session:abc:answers", 0, -1)), 1)
+        self.assertGreater(self.redis.ttl("quiz:session:abc:answers"), 0)
+
+    def test_expired_session(self):
+        async def scenario():
+            await session.create_session("abc", self.bank, ["q1"], 7)
+            self.redis.delete(*session._keys("abc"))  # TTL tugadi
+            return await session.record_answer("abc", 0, 0, 7)
+
+        self.assertEqual(self.run_async(scenario), (session.EXPIRED, None))
+
+    def test_other_user_and_forged_option_rejected(self):
+        async def scenario():
+            meta = await session.create_session("abc", self.bank, ["q1", "q2"], 7)
+            results = [
+                await session.record_answer("abc", 0, 0, 8),  # boshqa foydalanuvchi
+                await session.record_answer("abc", 0, 2, 7),  # savolda 2 ta variant
+                await session.record_answer("abc", 0, -1, 7),
+                await session.record_answer("abc", 0, 1, 7),
+            ]
+            return meta, results
+
+        meta, results = self.run_async(scenario)
+        self.assertEqual(meta.tg_id, "7")
+        self.assertEqual(
+            [status for status, _ in results], [session.FORBIDDEN, session.INVALID, session.INVALID, 1]
+        )
+        self.assertEqual(self.redis.lrange("quiz:session:abc:answers", 0, -1)[0].split(":")[:2], ["0", "1"])
+        self.assertEqual(self.redis.llen("quiz:session:abc:answers"), 1)
+
+    def test_answers_kept_until_session_closed(self):
+        async def scenario():
+            meta = await session.create_session("abc", self.bank, ["q1", "q2"], 7)
+            await session.record_answer("abc", 0, 0, 7)
+            await session.record_answer("abc", 1, 1, 7)
+            read = await session.session_answers("abc")
+            again = await session.session_answers("abc")  # saqlash muvaffaqiyatsiz bo'lsa qayta o'qiladi
+            await session.close_session("abc")
+            closed = await session.session_answers("abc")
+            return meta, read, again, closed
+
+        meta, read, again, closed = self.run_async(scenario)
+        self.assertEqual(read[0], meta)
+        self.assertEqual([answer[:2] for answer in read[1]], [(0, 0), (1, 1)])
+        self.assertEqual(again, read)
+        self.assertEqual(closed, (None, []))
+
+
+class PersistAnswersTests(TestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        patcher = mock.patch.object(question_bank, "get_redis", lambda *a: self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.subject = make_subject()
+        user = User.objects.create(phone_number="+998901234567", first_name="Talaba")
+        self.student = Student.objects.get_or_create(user=user)[0]
+        self.quiz = Quiz.objects.create(student=self.student, subject=self.subject, title="Test", total_questions=3)
+        self.bank = question_bank.build_bank(self.subject.id)
+        self.meta = session.SessionMeta(
+            self.quiz.id.hex, str(self.subject.id), self.bank.version, list(self.bank.questions)
+        )
+
+    def test_out_of_range_option_skipped(self):
+        quiz = session.persist_answers(self.meta, self.bank, [(0, 0, 5), (1, 9, 4)])
+
+        self.assertTrue(quiz.is_completed)
+        self.assertEqual(StudentAnswer.objects.filter(quiz=self.quiz).count(), 1)
+
+    def test_results_and_attempt_saved_once(self):
+        answers = [(0, 0, 5), (1, 1, 7), (2, 0, 3)]  # 2 ta to'g'ri, 1 ta noto'g'ri
+
+        quiz = session.persist_answers(self.meta, self.bank, answers)
+
+        self.assertTrue(quiz.is_completed)
+        self.assertEqual((quiz.correct_answers, quiz.wrong_answers, round(quiz.percentage)), (2, 1, 67))
+        saved = StudentAnswer.objects.filter(quiz=self.quiz)
+        self.assertEqual(saved.count(), 3)
+        self.assertEqual(saved.filter(is_correct=True).count(), 2)
+        self.assertEqual(sorted(saved.values_list('time_taken', flat=True)), [3, 5, 7])
+        attempt = QuizAttempt.objects.get(student=self.student, subject=self.subject)
+        self.assertEqual((attempt.total_attempts, attempt.total_correct, attempt.total_wrong), (1, 2, 1))
+
+        # ikkinchi yakunlash (qayta urinish) hech narsani o'zgartirmaydi
+        again = session.persist_answers(self.meta, self.bank, answers)
+        self.assertTrue(again.is_completed)
+        self.assertEqual(StudentAnswer.objects.filter(quiz=self.quiz).count(), 3)
+        attempt.refresh_from_db()
+        self.assertEqual((attempt.total_attempts, attempt.total_correct), (1, 2))
+
+
+class BankInvalidationTests(TestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        patcher = mock.patch.object(question_bank, "get_redis", lambda *a: self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.subject = make_subject(questions=1)
+        self.pointer = question_bank._pointer_key(self.subject.id)
+        self.redis.set(self.pointer, "v1")
+
+    def test_question_save_drops_pointer(self):
+        question = Question.objects.get(subject=self.subject)
+        with self.captureOnCommitCallbacks(execute=True):
+            question.question_text = "Yangi matn"
+            question.save()
+        self.assertIsNone(self.redis.get(self.pointer))
+
+    def test_answer_save_drops_pointer(self):
+        answer = Answer.objects.filter(question__subject=self.subject).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            answer.is_correct = not answer.is_correct
+            answer.save()
+        self.assertIsNone(self.redis.get(self.pointer))
+
+    def test_pointer_kept_until_commit(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            Question.objects.get(subject=self.subject).save()
+            self.assertEqual(self.redis.get(self.pointer), "v1")
+        self.assertEqual(len(callbacks), 1)
@@ -5,9 +5,11 @@ from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
 from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter
 from django.utils import timezone
-from django.db.models import Count, Avg, Q
+from django.db.models import Count, Q
 import random
 
+from apps.common.throttling import ScopedUserRateThrottle
+from auth.users.authentication import get_request_student
 from .models import Subject, Question, Answer, Quiz, StudentAnswer, QuizAttempt
 from .serializers import (
     SubjectListSerializer,
@@ -215,6 +217,7 @@ class QuizViewSet(viewsets.ModelViewSet):
     ordering_fields = ['started_at', 'completed_at', 'score', 'percentage']
     ordering = ['-started_at']
     http_method_names = ['get', 'post', 'delete', 'head', 'options']
+    throttle_scope = None  # start_quiz / submit_answer actionlarida belgilanadi
     
     def get_queryset(self):
         return Quiz.objects.filter(
@@ -239,7 +242,7 @@ class QuizViewSet(viewsets.ModelViewSet):
         request=QuizStartSerializer,
         responses={201: QuizDetailSerializer}
     )
-    @action(detail=False, methods=['post'])
+    @action(detail=False, methods=['post'], throttle_classes=[ScopedUserRateThrottle], throttle_scope='quiz_start')
     def start_quiz(self, request):
         """Test boshlash"""
         serializer = QuizStartSerializer(data=request.data)
@@ -249,10 +252,8 @@ class QuizViewSet(viewsets.ModelViewSet):
         questions_count = serializer.validated_data['questions_count']
         
         # Student profilini olish
-        try:
-            from apps.students.models import Student
-            student = Student.objects.get(user=request.user, deleted_at__isnull=True)
-        except Student.DoesNotExist:
+        student = get_request_student(request)
+        if student is None:
             return Response(
                 {'detail': 'Siz student emassiz'},
                 status=status.HTTP_403_FORBIDDEN
@@ -309,7 +310,7 @@ class QuizViewSet(viewsets.ModelViewSet):
         request=QuizSubmitAnswerSerializer,
         responses={200: StudentAnswerDetailSerializer}
     )
-    @action(detail=False, methods=['post'])
+    @action(detail=False, methods=['post'], throttle_classes=[ScopedUserRateThrottle], throttle_scope='quiz_answer')
     def submit_answer(self, request):
         """Javob yuborish"""
         serializer = QuizSubmitAnswerSerializer(data=request.data)
@@ -412,32 +413,7 @@ class QuizViewSet(viewsets.ModelViewSet):
         quiz.calculate_results()
         
         # QuizAttempt statistikasini yangilash
-        attempt, created = QuizAttempt.objects.get_or_create(
-            student=quiz.student,
-            subject=quiz.subject,
-            defaults={'deleted_at': None}
-        )
-        
-        attempt.total_attempts += 1
-        attempt.total_questions_answered += quiz.total_questions
-        attempt.total_correct += quiz.correct_answers
-        attempt.total_wrong += quiz.wrong_answers
-        attempt.last_attempt_date = timezone.now()
-        
-        # O'rtacha ballni hisoblash
-        all_quizzes = Quiz.objects.filter(
-            student=quiz.student,
-            subject=quiz.subject,
-            is_completed=True,
-            deleted_at__isnull=True
-        )
-        attempt.average_score = all_quizzes.aggregate(Avg('score'))['score__avg'] or 0
-        
-        # Eng yaxshi ballni yangilash
-        if quiz.score > attempt.best_score:
-            attempt.best_score = quiz.score
-        
-        attempt.save()
+        quiz.update_attempt_statistics()
         
         serializer = QuizDetailSerializer(quiz)
         return Response(serializer.data)
@@ -450,10 +426,8 @@ class QuizViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def my_quizzes(self, request):
         """Mening testlarim"""
-        try:
-            from apps.students.models import Student
-            student = Student.objects.get(user=request.user, deleted_at__isnull=True)
-        except Student.DoesNotExist:
+        student = get_request_student(request)
+        if student is None:
             return Response(
                 {'detail': 'Siz student emassiz'},
                 status=status.HTTP_403_FORBIDDEN
@@ -514,10 +488,8 @@ class QuizAttemptViewSet(viewsets.ReadOnlyModelViewSet):
     @action(detail=False, methods=['get'])
     def my_statistics(self, request):
         """Mening statistikam"""
-        try:
-            from apps.students.models import Student
-            student = Student.objects.get(user=request.user, deleted_at__isnull=True)
-        except Student.DoesNotExist:
+        student = get_request_student(request)
+        if student is None:
             return Response(
                 {'detail': 'Siz student emassiz'},
                 status=status.HTTP_403_FORBIDDEN
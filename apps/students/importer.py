@@ -0,0 +1,308 @@
+"""
+Talaba va o'qituvchilarni XLSX/CSV fayldan ommaviy import qilish.
+
+Qatorlar oqim (streaming) rejimida o'qiladi, telefon raqamlari bitta
+so'rov bilan tekshiriladi, User va profil yozuvlari esa partiyalab
+bulk_create qilinadi. bulk_create post_save signallarini chaqirmaydi,
+shuning uchun Student/Teacher profillari shu yerda yaratiladi.
+
+Kutiladigan ustunlar (sarlavha qatori, katta-kichik harf farqi yo'q):
+phone_number, first_name, last_name, user_type, group, grade,
+date_of_birth, address, subjects, experience_years
+"""
+from __future__ import annotations
+
+import csv
+import io
+import os
+import zipfile
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Iterable, Iterator, Optional
+
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+
+from auth.users.models import User
+from auth.users.serializers import PHONE_VALIDATOR
+from .models import StudentGroup, Student, Teacher
+
+COLUMNS = (
+    'phone_number', 'first_name', 'last_name', 'user_type', 'group', 'grade',
+    'date_of_birth', 'address', 'subjects', 'experience_years',
+)
+USER_TYPES = {choice for choice, _ in User.USER_TYPE_CHOICES}
+LOOKUP_CHUNK = 1000
+
+
+@dataclass
+class ImportResult:
+    total_rows: int = 0
+    created_students: int = 0
+    created_teachers: int = 0
+    created_groups: int = 0
+    errors: list = field(default_factory=list)
+
+    def as_dict(self) -> dict:
+        return {
+            'total_rows': self.total_rows,
+            'created_students': self.created_students,
+            'created_teachers': self.created_teachers,
+            'created_groups': self.created_groups,
+            'error_count': len(self.errors),
+            'errors': self.errors,
+        }
+
+
+def _cell(value) -> str:
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def _xlsx_rows(file) -> Iterator[tuple]:
+    """XLSX qatorlari; buzilgan fayl xatolari ValueError ga aylantiriladi (view 400 qaytaradi)."""
+    from openpyxl import load_workbook
+    from openpyxl.utils.exceptions import InvalidFileException
+
+    try:
+        workbook = load_workbook(file, read_only=True, data_only=True)
+        # read_only rejimida varaq XML i iteratsiya paytida o'qiladi
+        yield from workbook.active.iter_rows(values_only=True)
+    except (zipfile.BadZipFile, InvalidFileException, KeyError, SyntaxError, OSError) as exc:
+        raise ValueError("XLSX fayl buzilgan yoki o'qib bo'lmaydi") from exc
+
+
+def read_rows(file, filename: str) -> Iterator[tuple[int, dict]]:
+    """Fayl qatorlarini (qator raqami, {ustun: qiymat}) ko'rinishida oqim bilan o'qish."""
+    extension = os.path.splitext(filename or '')[1].lower()
+    if extension == '.csv':
+        text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+        rows = csv.reader(text)
+    elif extension in ('.xlsx', '.xlsm'):
+        rows = _xlsx_rows(file)
+    else:
+        raise ValueError("Faqat .xlsx yoki .csv fayllar qabul qilinadi")
+
+    header = next(rows, None)
+    if not header:
+        return
+    columns = [_cell(name).lower() for name in header]
+    if 'phone_number' not in columns:
+        raise ValueError("Faylda 'phone_number' ustuni topilmadi")
+
+    for number, values in enumerate(rows, start=2):
+        if not any(_cell(value) for value in values):
+            continue
+        yield number, {
+            column: value
+            for column, value in zip(columns, values)
+            if column in COLUMNS
+        }
+
+
+def _parse_date(value) -> Optional[date]:
+    if value in (None, ''):
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = _cell(value)
+    for fmt in ('%Y-%m-%d', '%d.%m.%Y', '%d/%m/%Y'):
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError("Tug'ilgan sana noto'g'ri formatda (YYYY-MM-DD yoki DD.MM.YYYY)")
+
+
+def _validate_row(raw: dict, default_user_type: str) -> tuple[dict, list]:
+    errors = []
+    phone = User.objects.normalize_phone_number(_cell(raw.get('phone_number')))
+    if not phone:
+        errors.append("Telefon raqami kiritilmagan")
+    else:
+        try:
+            PHONE_VALIDATOR(phone)
+        except ValidationError as exc:
+            errors.extend(exc.messages)
+
+    user_type = _cell(raw.get('user_type')).lower() or default_user_type
+    if user_type not in USER_TYPES:
+        errors.append(f"Noma'lum foydalanuvchi turi: {user_type}")
+
+    row = {
+        'phone_number': phone,
+        'first_name': _cell(raw.get('first_name'))[:150],
+        'last_name': _cell(raw.get('last_name'))[:150],
+        'user_type': user_type,
+        'group': _cell(raw.get('group')),
+        'address': _cell(raw.get('address')) or None,
+        'subjects': _cell(raw.get('subjects'))[:500],
+    }
+    try:
+        row['date_of_birth'] = _parse_date(raw.get('date_of_birth'))
+    except ValueError as exc:
+        errors.append(str(exc))
+    for name in ('grade', 'experience_years'):
+        text = _cell(raw.get(name))
+        try:
+            row[name] = int(text) if text else None
+        except ValueError:
+            errors.append(f"'{name}' butun son bo'lishi kerak")
+    return row, errors
+
+
+def _existing_phones(phones: list) -> set:
+    existing = set()
+    for start in range(0, len(phones), LOOKUP_CHUNK):
+        existing.update(
+            User.objects.filter(phone_number__in=phones[start:start + LOOKUP_CHUNK])
+            .values_list('phone_number', flat=True)
+        )
+    return existing
+
+
+def _resolve_groups(rows: Iterable[dict], create_groups: bool, dry_run: bool) -> tuple[dict, int]:
+    """Guruh nomi -> id; yo'q guruhlar bitta bulk_create bilan yaratiladi."""
+    wanted = {}
+    for row in rows:
+        if row['group']:
+            wanted.setdefault(row['group'], row['grade'] or 1)
+    if not wanted:
+        return {}, 0
+
+    groups = {}
+    for group_id, name in StudentGroup.objects.filter(
+        name__in=wanted, deleted_at__isnull=True
+    ).order_by('created_at').values_list('id', 'name'):
+        groups.setdefault(name, group_id)
+
+    missing = [name for name in wanted if name not in groups]
+    if missing and create_groups and not dry_run:
+        created = StudentGroup.objects.bulk_create(
+            [StudentGroup(name=name, grade=wanted[name]) for name in missing]
+        )
+        groups.update({group.name: group.id for group in created})
+        return groups, len(created)
+    return groups, len(missing) if create_groups else 0
+
+
+def _create_batch(batch: list, groups: dict) -> tuple[int, int]:
+    """Bitta tranzaksiyada User va profillarni yaratish (signallarsiz)."""
+    with transaction.atomic():
+        users = User.objects.bulk_create([
+            User(
+                phone_number=row['phone_number'],
+                first_name=row['first_name'],
+                last_name=row['last_name'],
+                user_type=row['user_type'],
+                # OTP orqali kiriladi: make_password(None) xeshlamaydi, shuning uchun tez
+                password=make_password(None),
+            )
+            for row in batch
+        ])
+        students, teachers = [], []
+        for user, row in zip(users, batch):
+            if row['user_type'] == 'student':
+                students.append(Student(
+                    user=user,
+                    group_id=groups.get(row['group']),
+                    date_of_birth=row['date_of_birth'],
+                    address=row['address'],
+                ))
+            else:
+                teachers.append(Teacher(
+                    user=user,
+                    subjects=row['subjects'],
+                    experience_years=row['experience_years'] or 0,
+                ))
+        Student.objects.bulk_create(students)
+        Teacher.objects.bulk_create(teachers)
+    return len(students), len(teachers)
+
+
+def import_people(
+    file,
+    filename: str,
+    default_user_type: str = 'student',
+    create_groups: bool = True,
+    dry_run: bool = False,
+    batch_size: int = 500,
+) -> ImportResult:
+    """
+    Fayldan foydalanuvchilarni import qilish.
+
+    Xatoli qatorlar o'tkazib yuboriladi va hisobotga qo'shiladi; qolganlari
+    `batch_size` tadan alohida tranzaksiyalarda yoziladi.
+    """
+    result = ImportResult()
+    valid, seen = [], {}
+    for number, raw in read_rows(file, filename):
+        result.total_rows += 1
+        row, errors = _validate_row(raw, default_user_type)
+        phone = row['phone_number']
+        if phone and phone in seen:
+            errors.append(f"Telefon raqami faylda takrorlangan ({seen[phone]}-qator)")
+        if errors:
+            result.errors.append({'row': number, 'phone_number': phone, 'errors': errors})
+            continue
+        seen[phone] = number
+        row['row'] = number
+        valid.append(row)
+
+    existing = _existing_phones([row['phone_number'] for row in valid])
+    if existing:
+        rows = []
+        for row in valid:
+            if row['phone_number'] in existing:
+                result.errors.append({
+                    'row': row['row'],
+                    'phone_number': row['phone_number'],
+                    'errors': ["Bu telefon raqami bilan foydalanuvchi mavjud"],
+                })
+            else:
+                rows.append(row)
+        valid = rows
+
+    groups, result.created_groups = _resolve_groups(
+        (row for row in valid if row['user_type'] == 'student'), create_groups, dry_run
+    )
+    if not create_groups:
+        rows = []
+        for row in valid:
+            if row['user_type'] == 'student' and row['group'] and row['group'] not in groups:
+                result.errors.append({
+                    'row': row['row'],
+                    'phone_number': row['phone_number'],
+                    'errors': [f"Guruh topilmadi: {row['group']}"],
+                })
+            else:
+                rows.append(row)
+        valid = rows
+    result.errors.sort(key=lambda error: error['row'])
+
+    if dry_run:
+        result.created_students = sum(1 for row in valid if row['user_type'] == 'student')
+        result.created_teachers = len(valid) - result.created_students
+        return result
+
+    for start in range(0, len(valid), batch_size):
+        batch = valid[start:start + batch_size]
+        try:
+            students, teachers = _create_batch(batch, groups)
+        except IntegrityError:
+            # Parallel ro'yxatdan o'tish bilan to'qnashuv: partiya butunlay qaytariladi
+            result.errors.extend(
+                {'row': row['row'], 'phone_number': row['phone_number'],
+                 'errors': ["Saqlashda xatolik: telefon raqami band bo'lishi mumkin"]}
+                for row in batch
+            )
+            continue
+        result.created_students += students
+        result.created_teachers += teachers
+    return result
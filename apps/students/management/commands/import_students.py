@@ -0,0 +1,77 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.students.importer import import_people
+
+
+class Command(BaseCommand):
+    help = 'XLSX yoki CSV fayldan talaba va o\'qituvchilarni ommaviy import qilish'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'file',
+            type=str,
+            help='Fayl yo\'li (.xlsx yoki .csv)'
+        )
+        parser.add_argument(
+            '--user-type',
+            choices=['student', 'teacher'],
+            default='student',
+            help='user_type ustuni bo\'sh bo\'lsa ishlatiladigan tur'
+        )
+        parser.add_argument(
+            '--no-create-groups',
+            action='store_true',
+            help='Mavjud bo\'lmagan guruhlarni yaratmaslik (qator xato deb hisoblanadi)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Faqat tekshirish, bazaga yozmaslik'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Bitta tranzaksiyadagi qatorlar soni'
+        )
+
+    def handle(self, *args, **options):
+        path = options['file']
+        if not os.path.exists(path):
+            raise CommandError(f'Fayl topilmadi: {path}')
+
+        started = time.monotonic()
+        with open(path, 'rb') as file:
+            try:
+                result = import_people(
+                    file,
+                    path,
+                    default_user_type=options['user_type'],
+                    create_groups=not options['no_create_groups'],
+                    dry_run=options['dry_run'],
+                    batch_size=options['batch_size'],
+                )
+            except ValueError as exc:
+                raise CommandError(str(exc))
+
+        for error in result.errors:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"{error['row']}-qator ({error['phone_number'] or '-'}): {'; '.join(error['errors'])}"
+                )
+            )
+
+        prefix = '[DRY RUN] ' if options['dry_run'] else ''
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{prefix}Jami qatorlar: {result.total_rows}, "
+                f"talabalar: {result.created_students}, "
+                f"o'qituvchilar: {result.created_teachers}, "
+                f"yangi guruhlar: {result.created_groups}, "
+                f"xatolar: {len(result.errors)} "
+                f"({time.monotonic() - started:.1f}s)"
+            )
+        )
@@ -1,6 +1,7 @@
 from django.db import models
 from django.conf import settings
 from apps.common.models import BaseModel
+from apps.common.mixins import FieldTrackerMixin
 
 
 class StudentGroup(BaseModel):
@@ -15,7 +16,7 @@ class StudentGroup(BaseModel):
         verbose_name_plural = "Talabalar guruhlari"
 
 
-class Student(BaseModel):
+class Student(FieldTrackerMixin, BaseModel):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='student_profile', verbose_name="Foydalanuvchi")
     group = models.ForeignKey(StudentGroup, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Guruh")
     date_of_birth = models.DateField(null=True, blank=True, verbose_name="Tug'ilgan sana")
@@ -29,7 +30,7 @@ class Student(BaseModel):
         verbose_name_plural = "Talabalar"
 
 
-class Teacher(BaseModel):
+class Teacher(FieldTrackerMixin, BaseModel):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='teacher_profile', verbose_name="Foydalanuvchi")
     subjects = models.CharField(max_length=500, blank=True, verbose_name="Fanlar")
     experience_years = models.PositiveIntegerField(default=0, verbose_name="Tajriba yillari")
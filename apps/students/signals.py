@@ -17,11 +17,24 @@ def create_user_profile(sender, instance, created, **kwargs):
 
 
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
-def save_user_profile(sender, instance, **kwargs):
+def save_user_profile(sender, instance, created, **kwargs):
     """
-    User saqlanganida profil ham saqlanadi (agar mavjud bo'lsa).
+    User saqlanganida profil faqat xotirada o'zgartirilgan bo'lsa saqlanadi.
+
+    Profil oldindan yuklanmagan bo'lsa (masalan, last_login yangilanishi)
+    unda o'zgarish bo'lishi mumkin emas, shuning uchun bazaga so'rov yuborilmaydi.
     """
-    if instance.user_type == 'student' and hasattr(instance, 'student_profile'):
-        instance.student_profile.save()
-    elif instance.user_type == 'teacher' and hasattr(instance, 'teacher_profile'):
-        instance.teacher_profile.save()
+    if created:
+        return
+    accessor = {'student': 'student_profile', 'teacher': 'teacher_profile'}.get(instance.user_type)
+    if accessor is None or not getattr(type(instance), accessor).is_cached(instance):
+        return
+    profile = getattr(instance, accessor, None)
+    if profile is None:
+        return
+    if profile._state.adding:
+        profile.save()
+        return
+    changed = profile.changed_fields()
+    if changed:
+        profile.save(update_fields={*changed, 'updated_at'})
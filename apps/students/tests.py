@@ -1,3 +1,73 @@
+import io
+
 from django.test import TestCase
 
-# Create your tests here.
+from auth.users.models import User
+from .importer import import_people
+from .models import StudentGroup, Student, Teacher
+
+
+class BulkImportTests(TestCase):
+    def test_csv_import_creates_profiles_and_reports_bad_rows(self):
+        User.objects.create_user(phone_number="+998901234567")
+        csv_file = io.BytesIO(
+            "phone_number,first_name,last_name,user_type,group,grade\n"
+            "+998 90 000 00 01,Ali,Valiyev,,9-A,9\n"
+            "+998900000002,Olim,Karimov,teacher,,\n"
+            "+998901234567,Bor,Foydalanuvchi,,9-A,9\n"
+            "abc,Xato,Raqam,,9-A,9\n"
+            "+998900000001,Takror,Qator,,9-A,9\n"
+            "+998900000003,Vali,Aliyev,student,9-A,9\n".encode()
+        )
+
+        result = import_people(csv_file, "school.csv")
+
+        self.assertEqual((result.total_rows, result.created_students, result.created_teachers), (6, 2, 1))
+        self.assertEqual([error['row'] for error in result.errors], [4, 5, 6])
+        group = StudentGroup.objects.get(name="9-A")
+        self.assertEqual(
+            set(Student.objects.filter(group=group).values_list('user__phone_number', flat=True)),
+            {"+998900000001", "+998900000003"},
+        )
+        self.assertTrue(Teacher.objects.filter(user__phone_number="+998900000002").exists())
+        self.assertFalse(User.objects.get(phone_number="+998900000001").has_usable_password())
+
+    def test_corrupt_xlsx_is_rejected_as_bad_input(self):
+        for content in (b"bu zip emas", b"PK\x03\x04buzilgan"):
+            with self.subTest(content=content), self.assertRaisesMessage(ValueError, "XLSX fayl buzilgan"):
+                import_people(io.BytesIO(content), "school.xlsx")
+
+
+class ProfileSaveTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(phone_number="+998905555555")
+
+    def test_login_and_user_update_do_not_touch_profile(self):
+        from django.contrib.auth.models import update_last_login
+
+        user = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(1):
+            update_last_login(None, user)
+
+        user.first_name = "Ali"
+        with self.assertNumQueries(1):
+            user.save()
+
+        profile = user.student_profile
+        updated_at = profile.updated_at
+        with self.assertNumQueries(1):
+            user.save()
+        profile.refresh_from_db()
+        self.assertEqual(profile.updated_at, updated_at)
+
+    def test_changed_profile_is_saved_with_user(self):
+        user = User.objects.get(pk=self.user.pk)
+        group = StudentGroup.objects.create(name="5-A", grade=5)
+        user.student_profile.group = group
+        user.student_profile.address = "Toshkent"
+        self.assertEqual(set(user.student_profile.changed_fields()), {'group_id', 'address'})
+
+        with self.assertNumQueries(2):
+            user.save()
+        self.assertEqual(Student.objects.get(user=user).group, group)
+        self.assertFalse(user.student_profile.has_changed())
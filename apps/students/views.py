@@ -1,12 +1,14 @@
 from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from django_filters.rest_framework import DjangoFilterBackend
 from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter
 from django.utils import timezone
 
 from .models import StudentGroup, Student, Teacher
+from .importer import import_people
 from .serializers import (
     StudentGroupListSerializer,
     StudentGroupDetailSerializer,
@@ -240,6 +242,58 @@ class StudentViewSet(viewsets.ModelViewSet):
         students = self.get_queryset().filter(group_id=group_id)
         serializer = self.get_serializer(students, many=True)
         return Response(serializer.data)
+    
+    @extend_schema(
+        summary="Fayldan import",
+        description="XLSX yoki CSV fayldan talaba va o'qituvchilarni ommaviy yaratish. "
+                    "Ustunlar: phone_number, first_name, last_name, user_type, group, grade, "
+                    "date_of_birth, address, subjects, experience_years. "
+                    "Xatoli qatorlar o'tkazib yuboriladi va hisobotda qaytariladi.",
+        tags=["Studentlar"],
+        request={
+            'multipart/form-data': {
+                'type': 'object',
+                'properties': {
+                    'file': {'type': 'string', 'format': 'binary'},
+                    'user_type': {'type': 'string', 'enum': ['student', 'teacher']},
+                    'create_groups': {'type': 'boolean'},
+                    'dry_run': {'type': 'boolean'},
+                },
+                'required': ['file'],
+            }
+        }
+    )
+    @action(
+        detail=False,
+        methods=['post'],
+        url_path='import',
+        parser_classes=[MultiPartParser],
+        permission_classes=[IsAdminUser],
+    )
+    def import_file(self, request):
+        """Fayldan ommaviy import (faqat admin)"""
+        upload = request.FILES.get('file')
+        if not upload:
+            return Response(
+                {'detail': 'file maydoni talab qilinadi'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        def flag(name, default):
+            return str(request.data.get(name, default)).lower() in ('1', 'true', 'yes')
+        
+        try:
+            result = import_people(
+                upload.file,
+                upload.name,
+                default_user_type=request.data.get('user_type') or 'student',
+                create_groups=flag('create_groups', True),
+                dry_run=flag('dry_run', False),
+            )
+        except ValueError as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response(result.as_dict(), status=status.HTTP_200_OK)
 
 
 @extend_schema_view(
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+from django.utils.functional import SimpleLazyObject
+from drf_spectacular.contrib.rest_framework_simplejwt import SimpleJWTScheme
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+# Access tokenga qo'shiladigan profil claimlari (get_tokens_for_user).
+# Guruh tokenga yozilmaydi: u token muddatida o'zgarishi mumkin, shuning
+# uchun User keshidan olinadi (cache.STUDENT_GROUP)
+PROFILE_CLAIMS = ('student_id', 'teacher_id')
+
+
+def profile_claims(user) -> dict:
+    """User profilidan access token claimlarini yig'ish (bitta so'rov)"""
+    from apps.students.models import Student, Teacher
+
+    claims = dict.fromkeys(PROFILE_CLAIMS)
+    if user.user_type == 'student':
+        student_id = Student.objects.filter(user=user, deleted_at__isnull=True).values_list('id', flat=True).first()
+        if student_id:
+            claims['student_id'] = str(student_id)
+    elif user.user_type == 'teacher':
+        teacher_id = Teacher.objects.filter(user=user, deleted_at__isnull=True).values_list('id', flat=True).first()
+        if teacher_id:
+            claims['teacher_id'] = str(teacher_id)
+    return claims
+
+
+def _student_from_claims(user, token):
+    from apps.students.models import Student
+    from .cache import STUDENT_GROUP
+
+    if token is None or 'student_id' not in token:
+        return Student.objects.filter(user=user, deleted_at__isnull=True).first()
+    if not token['student_id']:
+        return None
+    names, values = ['id', 'user_id'], [Student._meta.pk.to_python(token['student_id']), user.pk]
+    if hasattr(user, STUDENT_GROUP):
+        # User keshidan (Student saqlanganda tozalanadi)
+        names.append('group_id')
+        values.append(Student._meta.get_field('group').to_python(getattr(user, STUDENT_GROUP)))
+    # Qolgan maydonlar deferred: kerak bo'lsa Django ularni alohida yuklaydi
+    student = Student.from_db('default', names, values)
+    Student.user.field.set_cached_value(student, user)
+    return student
+
+
+def _teacher_from_claims(user, token):
+    from apps.students.models import Teacher
+
+    if token is None or 'teacher_id' not in token:
+        return Teacher.objects.filter(user=user, deleted_at__isnull=True).first()
+    if not token['teacher_id']:
+        return None
+    teacher = Teacher.from_db(
+        'default',
+        ['id', 'user_id'],
+        [Teacher._meta.pk.to_python(token['teacher_id']), user.pk],
+    )
+    Teacher.user.field.set_cached_value(teacher, user)
+    return teacher
+
+
+def _attach_profiles(request, user, token) -> None:
+    # SimpleLazyObject(None) falsy bo'ladi, shuning uchun `if request.student:` ishlaydi
+    request.student = SimpleLazyObject(lambda: _student_from_claims(user, token))
+    request.teacher = SimpleLazyObject(lambda: _teacher_from_claims(user, token))
+
+
+class ProfileJWTAuthentication(JWTAuthentication):
+    """
+    JWT autentifikatsiya + `request.student` / `request.teacher`.
+
+    Foydalanuvchi keshdan olinadi. Profil access token claimlaridan
+    so'rovsiz tiklanadi; claimlar bo'lmasa (eski token) birinchi
+    murojaatda bitta so'rov bilan yuklanadi.
+    """
+
+    def authenticate(self, request):
+        result = super().authenticate(request)
+        if result is not None:
+            user, token = result
+            _attach_profiles(request._request, user, token)
+        return result
+
+    def get_user(self, validated_token):
+        """Foydalanuvchini qisqa TTL li keshdan tiklash (auth/users/cache.py)"""
+        if api_settings.CHECK_REVOKE_TOKEN:
+            # Parol xeshi keshda saqlanmaydi
+            return super().get_user(validated_token)
+
+        from .cache import get_cached_user
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken("Token contained no recognizable user identification")
+
+        user = get_cached_user(user_id)
+        if user is None:
+            raise AuthenticationFailed("User not found", code="user_not_found")
+        if not user.is_active:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        return user
+
+
+class ProfileJWTScheme(SimpleJWTScheme):
+    """OpenAPI: ProfileJWTAuthentication oddiy JWT Bearer sxemasi sifatida"""
+    target_class = 'auth.users.authentication.ProfileJWTAuthentication'
+
+
+def get_request_student(request):
+    """Joriy so'rov talabasini qaytarish (yo'q bo'lsa None)"""
+    student = getattr(request, 'student', None)
+    if student is None:
+        # Boshqa autentifikatsiya (session, force_authenticate) orqali kelgan so'rov
+        _attach_profiles(request._request, request.user, None)
+        student = request.student
+    # Lazy proxy o'rniga haqiqiy model obyektini qaytarish
+    return student._wrapped if student else None
+
+
+def get_request_teacher(request):
+    """Joriy so'rov o'qituvchisini qaytarish (yo'q bo'lsa None)"""
+    teacher = getattr(request, 'teacher', None)
+    if teacher is None:
+        _attach_profiles(request._request, request.user, None)
+        teacher = request.teacher
+    return teacher._wrapped if teacher else None
@@ -0,0 +1,220 @@
+"""
+Autentifikatsiya uchun User keshi.
+
+Har bir API so'rovi JWT dan user_id oladi va users_user jadvalidan
+foydalanuvchini o'qiydi. Bu modul foydalanuvchini ikki darajali keshdan
+tiklaydi:
+
+1. jarayon ichidagi qisqa TTL li LRU (boshqa jarayonlardagi o'zgarishlar
+   ko'pi bilan USER_CACHE_LOCAL_TTL_SECONDS kechikadi)
+2. Redis (USER_CACHE_REDIS_TTL_SECONDS), o'zgarishda darhol o'chiriladi
+
+Redis kaliti user id va foydalanuvchining versiya hisoblagichidan iborat:
+o'chirishda versiya oshadi va keshga yozish faqat o'qish boshlangandagi
+versiya o'zgarmagan bo'lsa bajariladi, shuning uchun parallel so'rov
+eskirgan (masalan, bloklanmagan) foydalanuvchini qayta yozib qo'ymaydi.
+
+Parol xeshi keshga yozilmaydi: u deferred maydon bo'lib qoladi.
+
+Talabaning guruhi ham shu yozuvda (``user.student_group_id``) saqlanadi:
+token da guruh yo'q, Student saqlanganda kesh tozalanadi (signals.py).
+"""
+from __future__ import annotations
+
+import json
+import logging
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Optional
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import User
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "auth:user"
+CACHED_FIELDS = [field for field in User._meta.concrete_fields if field.attname != 'password']
+# Profil qiymati: User maydoni emas, _user_queryset annotatsiyasi
+STUDENT_GROUP = 'student_group_id'
+
+# KEYS[1] - ma'lumot, KEYS[2] - versiya; ARGV: versiya, ttl, payload
+_SET_IF_VERSION_LUA = """
+if (redis.call('GET', KEYS[2]) or '0') ~= ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[3], 'EX', tonumber(ARGV[2]))
+return 1
+"""
+_set_script = None
+
+_local: "OrderedDict[str, tuple[float, dict]]" = OrderedDict()
+_local_lock = threading.Lock()
+_stats: Counter = Counter()
+
+
+def _redis():
+    from apps.common.redis_client import get_redis
+
+    return get_redis("cache")
+
+
+def _data_key(user_id: str) -> str:
+    return f"{KEY_PREFIX}:{user_id}"
+
+
+def _version_key(user_id: str) -> str:
+    return f"{KEY_PREFIX}:{user_id}:ver"
+
+
+def _user_queryset():
+    """User + faol talaba profilining guruhi, bitta so'rovda"""
+    from django.db.models import OuterRef, Subquery
+    from apps.students.models import Student
+
+    group = Student.objects.filter(user=OuterRef('pk'), deleted_at__isnull=True).values('group_id')[:1]
+    return User.objects.defer('password').annotate(**{STUDENT_GROUP: Subquery(group)})
+
+
+def _dump(user: User) -> dict:
+    values = {field.attname: getattr(user, field.attname) for field in CACHED_FIELDS}
+    values[STUDENT_GROUP] = getattr(user, STUDENT_GROUP)
+    return values
+
+
+def _encode(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else str(value)
+
+
+def _hydrate(values: dict) -> User:
+    """Keshdagi qiymatlardan User obyektini so'rovsiz qurish"""
+    names, row = [], []
+    for field in CACHED_FIELDS:
+        names.append(field.attname)
+        row.append(field.to_python(values.get(field.attname)))
+    user = User.from_db('default', names, row)
+    setattr(user, STUDENT_GROUP, values.get(STUDENT_GROUP))
+    return user
+
+
+def _local_get(user_id: str) -> Optional[dict]:
+    with _local_lock:
+        entry = _local.get(user_id)
+        if entry is None:
+            return None
+        expires_at, values = entry
+        if expires_at < time.monotonic():
+            del _local[user_id]
+            return None
+        _local.move_to_end(user_id)
+        return values
+
+
+def _local_set(user_id: str, values: dict) -> None:
+    with _local_lock:
+        _local[user_id] = (time.monotonic() + settings.USER_CACHE_LOCAL_TTL_SECONDS, values)
+        _local.move_to_end(user_id)
+        while len(_local) > settings.USER_CACHE_LOCAL_MAX_ENTRIES:
+            _local.popitem(last=False)
+
+
+def _redis_store(client, user_id: str, version, values: dict) -> None:
+    global _set_script
+    if _set_script is None:
+        _set_script = _redis().register_script(_SET_IF_VERSION_LUA)
+    _set_script(
+        keys=[_data_key(user_id), _version_key(user_id)],
+        args=[version or '0', settings.USER_CACHE_REDIS_TTL_SECONDS, json.dumps(values, default=_encode)],
+        client=client,
+    )
+
+
+def get_cached_user(user_id) -> Optional[User]:
+    """
+    Foydalanuvchini keshdan yoki bazadan olish.
+
+    Returns:
+        User yoki None (foydalanuvchi topilmasa)
+    """
+    if not settings.USER_CACHE_ENABLED:
+        return _user_queryset().filter(pk=user_id).first()
+
+    user_id = str(user_id)
+    values = _local_get(user_id)
+    if values is not None:
+        _stats['local_hits'] += 1
+        return _hydrate(values)
+
+    client, version = None, None
+    try:
+        client = _redis()
+        payload, version = client.mget(_data_key(user_id), _version_key(user_id))
+    except Exception:
+        _stats['redis_errors'] += 1
+        payload = None
+    if payload is not None:
+        _stats['redis_hits'] += 1
+        values = json.loads(payload)
+        _local_set(user_id, values)
+        return _hydrate(values)
+
+    _stats['misses'] += 1
+    user = _user_queryset().filter(pk=user_id).first()
+    if user is None:
+        return None
+    values = _dump(user)
+    _local_set(user_id, values)
+    if client is not None:
+        try:
+            _redis_store(client, user_id, version, values)
+        except Exception:
+            _stats['redis_errors'] += 1
+    return user
+
+
+def _forget(user_id: str) -> None:
+    with _local_lock:
+        _local.pop(user_id, None)
+    try:
+        pipe = _redis().pipeline(transaction=False)
+        pipe.incr(_version_key(user_id))
+        pipe.expire(_version_key(user_id), settings.USER_CACHE_REDIS_TTL_SECONDS * 2)
+        pipe.delete(_data_key(user_id))
+        pipe.execute()
+    except Exception:
+        _stats['redis_errors'] += 1
+        logger.warning("Redis unavailable, user cache entry not invalidated", extra={"user_id": user_id})
+
+
+def invalidate_user(user_id) -> None:
+    """
+    Foydalanuvchi keshini o'chirish: darhol va tranzaksiya tasdiqlangach.
+
+    Darhol o'chirish commit gacha parallel so'rov eski yozuvni o'qishining
+    oldini oladi; commit dan keyingi o'chirish esa shu orada bazadan
+    (hali eski holatda) qayta yozilgan yozuvni tozalaydi.
+    """
+    user_id = str(user_id)
+    _stats['invalidations'] += 1
+    _forget(user_id)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _forget(user_id))
+
+
+def user_cache_stats() -> dict:
+    """Jarayon ichidagi hit/miss hisoblagichlari"""
+    hits = _stats['local_hits'] + _stats['redis_hits']
+    lookups = hits + _stats['misses']
+    return {
+        **{name: _stats[name] for name in ('local_hits', 'redis_hits', 'misses', 'invalidations', 'redis_errors')},
+        'hit_rate': round(hits / lookups, 4) if lookups else None,
+        'local_entries': len(_local),
+    }
+
+
+def clear_local_cache() -> None:
+    with _local_lock:
+        _local.clear()
+    _stats.clear()
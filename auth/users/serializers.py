@@ -1,10 +1,12 @@
 from __future__ import annotations
 
+from django.conf import settings
 from django.core.validators import RegexValidator
 from rest_framework import serializers
 from rest_framework_simplejwt.tokens import RefreshToken
 from drf_spectacular.utils import extend_schema_field
 from .models import User
+from .authentication import profile_claims
 from django.contrib.auth.password_validation import validate_password
 
 
@@ -29,9 +31,9 @@ class TelegramVerifyOTPSerializer(serializers.Serializer):
     """Telegram OTP tasdiqlash va JWT token olish"""
     otp = serializers.CharField(
         required=True,
-        min_length=5,
-        max_length=5,
-        help_text="5 xonali OTP kod (Example: '12345')"
+        min_length=settings.TELEGRAM_OTP_LENGTH,
+        max_length=settings.TELEGRAM_OTP_LENGTH,
+        help_text=f"{settings.TELEGRAM_OTP_LENGTH} xonali OTP kod (Example: '12345')"
     )
     
     class Meta:
@@ -167,12 +169,22 @@ class PasswordSetSerializer(serializers.Serializer):
 
 
 def get_tokens_for_user(user):
-    """User uchun JWT tokenlarni yaratadi"""
+    """
+    User uchun JWT tokenlarni yaratadi.
+
+    Access tokenga student/teacher va guruh id lari qo'shiladi, shunda
+    ProfileJWTAuthentication `request.student` ni so'rovsiz tiklaydi.
+    Refresh tokenga qo'shilmaydi: yangilangan access token eskirgan
+    guruhni olib yurmasligi uchun.
+    """
     refresh = RefreshToken.for_user(user)
+    access = refresh.access_token
+    for claim, value in profile_claims(user).items():
+        access[claim] = value
     
     return {
         'refresh': str(refresh),
-        'access': str(refresh.access_token),
+        'access': str(access),
         'user': user
     }
     
\ No newline at end of file
@@ -0,0 +1,34 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .cache import invalidate_user
+from .models import User
+
+# Bu maydonlar autentifikatsiyaga ta'sir qilmaydi: keshni tozalash shart emas
+_UNCACHED_UPDATES = frozenset({'last_login'})
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_cache_on_save(sender, instance, update_fields=None, **kwargs):
+    """Foydalanuvchi o'zgarganda (rol, bloklash, ism va h.k.) keshni tozalash"""
+    if update_fields and set(update_fields) <= _UNCACHED_UPDATES:
+        return
+    invalidate_user(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def invalidate_user_cache_on_delete(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender='students.Student')
+def invalidate_user_cache_on_student_save(sender, instance, update_fields=None, **kwargs):
+    """Talaba guruhi keshdagi User yozuvida: guruh o'zgarsa keshni tozalash"""
+    if update_fields and not set(update_fields) & {'group', 'group_id', 'deleted_at'}:
+        return
+    invalidate_user(instance.user_id)
+
+
+@receiver(post_delete, sender='students.Student')
+def invalidate_user_cache_on_student_delete(sender, instance, **kwargs):
+    invalidate_user(instance.user_id)
@@ -1,3 +1,120 @@
+from unittest import mock
+
+import fakeredis
 from django.test import TestCase
+from rest_framework.test import APIClient
+
+from apps.students.models import StudentGroup
+from .models import User
+from .serializers import get_tokens_for_user
+
+
+class ProfileClaimsTests(TestCase):
+    def setUp(self):
+        self.group = StudentGroup.objects.create(name="6-B", grade=6)
+        self.user = User.objects.create_user(phone_number="+998906666666")
+        self.user.student_profile.group = self.group
+        self.user.save()
+        self.client = APIClient()
+
+    def test_access_token_carries_profile_ids(self):
+        from rest_framework_simplejwt.tokens import AccessToken
+
+        token = AccessToken(get_tokens_for_user(self.user)['access'])
+        self.assertEqual(token['student_id'], str(self.user.student_profile.id))
+        self.assertNotIn('group_id', token)
+        self.assertIsNone(token['teacher_id'])
+
+    def test_group_change_reaches_existing_token(self):
+        from rest_framework_simplejwt.tokens import AccessToken
+        from .authentication import _student_from_claims
+        from .cache import clear_local_cache, get_cached_user
+
+        clear_local_cache()
+        token = AccessToken(get_tokens_for_user(self.user)['access'])
+        self.assertEqual(_student_from_claims(get_cached_user(self.user.pk), token).group_id, self.group.id)
+
+        other = StudentGroup.objects.create(name="7-A", grade=7)
+        with self.captureOnCommitCallbacks(execute=True):
+            profile = self.user.student_profile
+            profile.group = other
+            profile.save(update_fields=['group'])
+        with self.assertNumQueries(1):
+            student = _student_from_claims(get_cached_user(self.user.pk), token)
+        self.assertEqual(student.group_id, other.id)
+
+    def test_student_endpoint_skips_profile_query(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {get_tokens_for_user(self.user)['access']}")
+        # User + statistika; talaba profili tokendan olinadi
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/attendance/attendance-statistics/my_statistics/')
+        self.assertEqual(response.status_code, 200)
+
+
+class UserCacheTests(TestCase):
+    def setUp(self):
+        from .cache import clear_local_cache
+
+        clear_local_cache()
+        self.user = User.objects.create_user(phone_number="+998907777777")
+
+    def test_user_is_hydrated_from_local_cache(self):
+        from .cache import get_cached_user, user_cache_stats
+
+        with self.assertNumQueries(1):
+            get_cached_user(self.user.pk)
+        with self.assertNumQueries(0):
+            cached = get_cached_user(self.user.pk)
+
+        self.assertEqual((cached.pk, cached.phone_number), (self.user.pk, self.user.phone_number))
+        self.assertIn('password', cached.get_deferred_fields())
+        self.assertEqual(user_cache_stats()['local_hits'], 1)
+
+    def test_deactivation_invalidates_cache(self):
+        from . import cache
+
+        redis = fakeredis.FakeRedis(decode_responses=True)
+        with mock.patch.object(cache, '_redis', return_value=redis), mock.patch.object(cache, '_set_script', None):
+            cache.get_cached_user(self.user.pk)
+            self.assertTrue(redis.exists(f"auth:user:{self.user.pk}"))
+            with self.captureOnCommitCallbacks(execute=True):
+                self.user.is_active = False
+                self.user.save()
+                # commit gacha ham eski yozuv o'qilmaydi
+                self.assertFalse(redis.exists(f"auth:user:{self.user.pk}"))
+            with self.assertNumQueries(1):
+                self.assertFalse(cache.get_cached_user(self.user.pk).is_active)
+            self.assertEqual(redis.get(f"auth:user:{self.user.pk}:ver"), '2')
+
+
+class TelegramOTPTests(TestCase):
+    def setUp(self):
+        from auth.utils.otp import OTPManager
+
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        with mock.patch('auth.utils.otp.get_redis', return_value=self.redis):
+            self.manager = OTPManager()
+
+    def test_codes_are_unique_among_active_logins(self):
+        codes = [self.manager.issue_otp(str(user_id)) for user_id in range(500)]
+
+        self.assertNotIn(None, codes)
+        self.assertEqual(len(set(codes)), 500)
+        self.assertEqual(self.manager.utilization()['active_codes'], 500)
+
+    def test_reissue_releases_previous_code(self):
+        old = self.manager.issue_otp('42')
+        new = self.manager.issue_otp('42')
+
+        self.assertIsNone(self.manager.verify_otp_by_code(old))
+        self.assertFalse(self.redis.exists(f"otp_code:{old}"))
+        self.assertEqual(self.manager.utilization()['active_codes'], 1)
+        self.assertEqual(self.manager.verify_otp_by_code(new), '42')
+
+    def test_code_is_single_use(self):
+        code = self.manager.issue_otp('7')
 
-# Create your tests here.
+        self.assertEqual(self.manager.verify_otp_by_code(code), '7')
+        self.assertIsNone(self.manager.verify_otp_by_code(code))
+        self.assertFalse(self.manager.verify_otp('7', code))
+        self.assertEqual(self.manager.utilization()['active_codes'], 0)
@@ -1,5 +1,5 @@
 from rest_framework import status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework_simplejwt.views import TokenRefreshView
@@ -15,15 +15,24 @@ from .serializers import (
 )
 from auth.utils.otp import OTPManager
 from apps.botapp.models import BotUser
+from apps.common.throttling import ScopedIPRateThrottle
 
 User = get_user_model()
 otp_manager = OTPManager()
 
 
+class OTPRequestThrottle(ScopedIPRateThrottle):
+    scope = 'telegram_otp_request'
+
+
+class OTPVerifyThrottle(ScopedIPRateThrottle):
+    scope = 'telegram_otp_verify'
+
+
 @extend_schema(
     tags=['Authentication'],
     summary='Request OTP code via Telegram',
-    description='Request a 5-digit OTP code that will be sent to user via Telegram bot. '
+    description='Request a one-time OTP code that will be sent to user via Telegram bot. '
                 'Rate limited to 1 request per minute.',
     request=TelegramRequestOTPSerializer,
     responses={
@@ -71,6 +80,7 @@ otp_manager = OTPManager()
 )
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([OTPRequestThrottle])
 def telegram_request_otp(request):
     """
     Telegram user_id orqali OTP kod so'rash.
@@ -117,22 +127,20 @@ def telegram_request_otp(request):
             status=status.HTTP_404_NOT_FOUND
         )
     
-    # OTP generatsiya qilish
-    otp = otp_manager.generate_otp()
-    
-    # OTP ni Redis ga saqlash
-    if not otp_manager.save_otp(user_id, otp):
+    # Boshqa foydalanuvchida yo'q OTP kodni band qilish
+    otp = otp_manager.issue_otp(user_id)
+    if otp is None:
         return Response(
             {'error': 'Server error', 'message': 'OTP saqlashda xatolik.'},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
     
     # OTP ni Telegram bot orqali yuborish
-    from bot.bot import bot
+    from bot.bot import get_bot
     
     try:
         # Async function ni sync context da ishlatish (Django uchun to'g'ri usul)
-        send_message = async_to_sync(bot.send_message)
+        send_message = async_to_sync(get_bot().send_message)
         send_message(
             chat_id=int(user_id),
             text=f"🔐 Sizning login kodingiz: <code>{otp}</code>\n\n"
@@ -149,7 +157,7 @@ def telegram_request_otp(request):
         {
             'success': True,
             'message': 'OTP kod Telegram botga yuborildi.',
-            'expires_in': 300  # 5 daqiqa
+            'expires_in': otp_manager.otp_expiry
         },
         status=status.HTTP_200_OK
     )
@@ -199,6 +207,7 @@ def telegram_request_otp(request):
 )
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([OTPVerifyThrottle])
 def telegram_verify_otp(request):
     """
     OTP kodni tekshirish va JWT token berish.
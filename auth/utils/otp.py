@@ -1,78 +1,163 @@
+import logging
 import random
-import redis
+
 from django.conf import settings
 
+from apps.common.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+CODE_PREFIX = "otp_code:"
+USER_PREFIX = "otp:"
+ACTIVE_CODES_KEY = "otp_codes:active"
+
+# Kod ajratish: nomzodlardan birinchi bo'sh kodni SET NX bilan band qilish.
+# KEYS: otp:{user}, active, otp_code:{c1}..otp_code:{cN}
+# ARGV: user_id, ttl, code_prefix, c1..cN
+_ISSUE_LUA = """
+local now = tonumber(redis.call('TIME')[1])
+local ttl = tonumber(ARGV[2])
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now)
+for i = 3, #KEYS do
+    local code = ARGV[i + 1]
+    if redis.call('SET', KEYS[i], ARGV[1], 'NX', 'EX', ttl) then
+        local old = redis.call('GET', KEYS[1])
+        if old then
+            -- oldingi kod faqat shu foydalanuvchiniki bo'lsa bo'shatiladi
+            local old_key = ARGV[3] .. old
+            if redis.call('GET', old_key) == ARGV[1] then
+                redis.call('DEL', old_key)
+            end
+            redis.call('ZREM', KEYS[2], old)
+        end
+        redis.call('SET', KEYS[1], code, 'EX', ttl)
+        redis.call('ZADD', KEYS[2], now + ttl, code)
+        return {code, redis.call('ZCARD', KEYS[2])}
+    end
+end
+return {false, redis.call('ZCARD', KEYS[2])}
+"""
+
+# KEYS: otp_code:{code}, active; ARGV: code, user_prefix
+_VERIFY_BY_CODE_LUA = """
+local user_id = redis.call('GET', KEYS[1])
+if not user_id then
+    return false
+end
+redis.call('DEL', KEYS[1])
+redis.call('ZREM', KEYS[2], ARGV[1])
+local user_key = ARGV[2] .. user_id
+if redis.call('GET', user_key) == ARGV[1] then
+    redis.call('DEL', user_key)
+end
+return user_id
+"""
+
+# KEYS: otp:{user}, active; ARGV: code, code_prefix
+_VERIFY_LUA = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+redis.call('DEL', KEYS[1], ARGV[2] .. ARGV[1])
+redis.call('ZREM', KEYS[2], ARGV[1])
+return 1
+"""
+
 
 class OTPManager:
     """OTP kodlarni boshqarish uchun utility class"""
-    
+
     def __init__(self):
-        redis_host = getattr(settings, 'REDIS_HOST', 'redis')
-        redis_port = getattr(settings, 'REDIS_PORT', 6379)
-        redis_db = getattr(settings, 'REDIS_DB', 0)
-        
-        self.redis_client = redis.Redis(
-            host=redis_host,
-            port=redis_port,
-            db=redis_db,
-            decode_responses=True
-        )
-        self.otp_expiry = 300  # 5 daqiqa (sekundda)
+        # Umumiy pool dan olingan client (yangi ulanish ochmaydi)
+        self.redis_client = get_redis("otp")
+        self.otp_expiry = settings.TELEGRAM_OTP_TTL_SECONDS
         self.rate_limit_expiry = 60  # 1 daqiqa
-    
-    def generate_otp(self) -> str:
-        """5 xonali tasodifiy OTP kod yaratadi"""
-        return str(random.randint(10000, 99999))
-    
-    def save_otp(self, user_id: str, otp: str) -> bool:
-        """OTP ni Redis ga saqlaydi (user_id va otp_code ga bog'laydi)"""
-        key = f"otp:{user_id}"
-        reverse_key = f"otp_code:{otp}"
+        self.code_length = settings.TELEGRAM_OTP_LENGTH
+        self.last_utilization = 0.0
+        self._issue = self.redis_client.register_script(_ISSUE_LUA)
+        self._verify_by_code = self.redis_client.register_script(_VERIFY_BY_CODE_LUA)
+        self._verify = self.redis_client.register_script(_VERIFY_LUA)
+
+    @property
+    def capacity(self) -> int:
+        """Mumkin bo'lgan kodlar soni (birinchi raqam 0 emas)"""
+        return 9 * 10 ** (self.code_length - 1)
+
+    def issue_otp(self, user_id: str) -> str | None:
+        """
+        Foydalanuvchi uchun boshqa hech kimda yo'q kodni band qilish.
+
+        Bir nechta nomzod bitta Lua chaqiruvida SET NX bilan sinab ko'riladi,
+        shuning uchun bir vaqtda minglab login bo'lsa ham kodlar bir-birini
+        ustidan yozmaydi. Foydalanuvchining oldingi kodi bekor qilinadi.
+
+        Returns:
+            Kod yoki None (Redis xatosi yoki barcha nomzodlar band)
+        """
+        start = 10 ** (self.code_length - 1)
+        candidates = [
+            str(code) for code in random.SystemRandom().sample(
+                range(start, 10 * start), settings.TELEGRAM_OTP_ALLOCATION_ATTEMPTS
+            )
+        ]
         try:
-            # user_id orqali OTP topish uchun
-            self.redis_client.setex(key, self.otp_expiry, otp)
-            # OTP orqali user_id topish uchun (reverse mapping)
-            self.redis_client.setex(reverse_key, self.otp_expiry, user_id)
-            return True
-        except Exception as e:
-            print(f"Error saving OTP: {e}")
-            return False
-    
+            code, active = self._issue(
+                keys=[f"{USER_PREFIX}{user_id}", ACTIVE_CODES_KEY, *(CODE_PREFIX + c for c in candidates)],
+                args=[user_id, self.otp_expiry, CODE_PREFIX, *candidates],
+            )
+        except Exception:
+            logger.exception("Error saving OTP")
+            return None
+
+        self.last_utilization = int(active) / self.capacity
+        if self.last_utilization >= settings.TELEGRAM_OTP_UTILIZATION_WARNING:
+            logger.warning(
+                "OTP keyspace utilization is high, consider increasing TELEGRAM_OTP_LENGTH",
+                extra={"active_codes": int(active), "capacity": self.capacity},
+            )
+        if code is None:
+            logger.error("OTP allocation failed: all candidates taken", extra={"active_codes": int(active)})
+        return code
+
+    def utilization(self) -> dict:
+        """
+        Faol kodlar soni va kodlar fazosining bandlik darajasi.
+
+        Kirish faqat kod bilan tasdiqlanadi, shuning uchun bandlik - bitta
+        tasodifiy taxminning muvaffaqiyatli bo'lish ehtimoli.
+        """
+        active = self.redis_client.zcount(ACTIVE_CODES_KEY, '(' + str(self.redis_client.time()[0]), '+inf')
+        return {
+            'active_codes': active,
+            'capacity': self.capacity,
+            'utilization': round(active / self.capacity, 6),
+        }
+
     def verify_otp(self, user_id: str, otp: str) -> bool:
         """OTP ni tekshiradi (user_id bilan)"""
-        key = f"otp:{user_id}"
-        stored_otp = self.redis_client.get(key)
-        
-        if stored_otp and stored_otp == otp:
-            # OTP to'g'ri - barcha keylarni o'chirish
-            self.redis_client.delete(key)
-            self.redis_client.delete(f"otp_code:{otp}")
-            return True
-        return False
-    
+        return bool(self._verify(
+            keys=[f"{USER_PREFIX}{user_id}", ACTIVE_CODES_KEY],
+            args=[otp, CODE_PREFIX],
+        ))
+
     def verify_otp_by_code(self, otp: str) -> str | None:
-        """OTP kodni tekshiradi va user_id ni qaytaradi"""
-        reverse_key = f"otp_code:{otp}"
-        user_id = self.redis_client.get(reverse_key)
-        
-        if user_id:
-            # OTP to'g'ri - barcha keylarni o'chirish
-            self.redis_client.delete(reverse_key)
-            self.redis_client.delete(f"otp:{user_id}")
-            return user_id
-        return None
-    
+        """OTP kodni tekshiradi va user_id ni qaytaradi (kod bir marta ishlatiladi)"""
+        return self._verify_by_code(
+            keys=[f"{CODE_PREFIX}{otp}", ACTIVE_CODES_KEY],
+            args=[otp, USER_PREFIX],
+        )
+
     def can_request_otp(self, user_id: str) -> bool:
         """Rate limiting: 1 daqiqada faqat 1 marta OTP so'rash mumkin"""
         rate_key = f"otp_rate:{user_id}"
-        
+
         if self.redis_client.exists(rate_key):
             return False
-        
+
         # Rate limit qo'yish
         self.redis_client.setex(rate_key, self.rate_limit_expiry, "1")
         return True
-    
+
     def get_remaining_time(self, user_id: str) -> int:
         """Rate limit qolgan vaqtni qaytaradi (sekundda)"""
         rate_key = f"otp_rate:{user_id}"
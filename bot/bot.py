@@ -1,5 +1,5 @@
-from aiogram import Bot
-from aiogram.client.default import DefaultBotProperties
+import threading
+
 from environs import Env
 
 env = Env()
@@ -7,5 +7,30 @@ env.read_env()
 
 BOT_TOKEN = env.str("BOT_TOKEN")
 
-# Create bot instance (Aiogram v3)
-bot = Bot(token=BOT_TOKEN, default=DefaultBotProperties(parse_mode="HTML"))
+_bot = None
+_lock = threading.Lock()
+
+
+def get_bot():
+    """
+    Bot instance (Aiogram v3), birinchi chaqiruvda yaratiladi.
+
+    aiogram ni import qilish va Bot yaratish web worker ishga tushishida
+    emas, birinchi webhook so'rovida (yoki BOT_EAGER_INIT bilan) bajariladi.
+    """
+    global _bot
+    if _bot is None:
+        with _lock:
+            if _bot is None:
+                from aiogram import Bot
+                from aiogram.client.default import DefaultBotProperties
+
+                _bot = Bot(token=BOT_TOKEN, default=DefaultBotProperties(parse_mode="HTML"))
+    return _bot
+
+
+def __getattr__(name):
+    # `from bot.bot import bot` eski importlari uchun (faqat murojaat qilinganda yaratiladi)
+    if name == "bot":
+        return get_bot()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
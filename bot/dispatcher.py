@@ -1,17 +1,49 @@
-from aiogram import Dispatcher
-from aiogram.fsm.storage.redis import RedisStorage
-from redis.asyncio import Redis
-from .routers import register_routers
-from .data.config import REDIS_HOST, REDIS_PORT, REDIS_DB
+import threading
 
+_dp = None
+_lock = threading.Lock()
 
-def create_dispatcher() -> Dispatcher:
-    redis = Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB)
-    storage = RedisStorage(redis=redis)
+
+def create_dispatcher():
+    from aiogram import Dispatcher
+    from aiogram.fsm.storage.redis import RedisStorage
+    from apps.common.redis_client import get_async_redis
+    from .middlewares import setup as setup_middlewares
+    from .routers import register_routers
+
+    storage = RedisStorage(redis=get_async_redis("fsm"))
     dp = Dispatcher(storage=storage)
+    setup_middlewares(dp)
     register_routers(dp)
     return dp
 
 
-# A global dispatcher instance (can be imported where needed)
-dp = create_dispatcher()
+def get_dispatcher():
+    """
+    Global dispatcher, birinchi chaqiruvda quriladi va saqlanadi.
+
+    Routerlar, middlewarelar va FSM storage import vaqtida emas, birinchi
+    update kelganda (yoki BOT_EAGER_INIT bilan worker ishga tushganda)
+    yaratiladi.
+    """
+    global _dp
+    if _dp is None:
+        with _lock:
+            if _dp is None:
+                _dp = create_dispatcher()
+    return _dp
+
+
+def warm_up():
+    """Startup hook: bot va dispatcher ni oldindan qurish (BOT_EAGER_INIT)"""
+    from .bot import get_bot
+
+    get_bot()
+    get_dispatcher()
+
+
+def __getattr__(name):
+    # `from bot.dispatcher import dp` eski importlari uchun
+    if name == "dp":
+        return get_dispatcher()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
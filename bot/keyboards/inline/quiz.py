@@ -0,0 +1,38 @@
+from aiogram.filters.callback_data import CallbackData
+from aiogram.types import InlineKeyboardMarkup
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+
+class SubjectCallback(CallbackData, prefix="qs"):
+    subject_id: str
+
+
+class AnswerCallback(CallbackData, prefix="qa"):
+    quiz: str  # Quiz ID (hex, callback_data 64 baytga sig'ishi uchun)
+    index: int  # savol tartib raqami - eski tugmalarni aniqlash uchun
+    option: int  # javob varianti tartib raqami
+
+
+def get_subjects_keyboard(subjects) -> InlineKeyboardMarkup:
+    """
+    Fanlar ro'yxati: har bir fan alohida qatorda.
+    """
+    builder = InlineKeyboardBuilder()
+    for subject in subjects:
+        builder.button(text=subject['name'], callback_data=SubjectCallback(subject_id=str(subject['id'])))
+    builder.adjust(1)
+    return builder.as_markup()
+
+
+def get_answers_keyboard(quiz_id: str, index: int, answers: list) -> InlineKeyboardMarkup:
+    """
+    Savol javob variantlari (A, B, C, ...).
+    """
+    builder = InlineKeyboardBuilder()
+    for option, answer in enumerate(answers):
+        builder.button(
+            text=f"{chr(65 + option)}) {answer['text'][:60]}",
+            callback_data=AnswerCallback(quiz=quiz_id, index=index, option=option),
+        )
+    builder.adjust(1)
+    return builder.as_markup()
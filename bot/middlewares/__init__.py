@@ -1,12 +1,13 @@
 from aiogram import Dispatcher
 
-from bot.loader import dp
+from .identity import IdentityMiddleware
 from .throttling import ThrottlingMiddleware
 
 
 def setup(dp: Dispatcher):
-    dp.middleware.setup(ThrottlingMiddleware())
-
-
-if __name__ == "middlewares":
-    dp.middleware.setup(ThrottlingMiddleware())
+    # Tartib muhim: flood avval rad etiladi, keyin identity yuklanadi
+    throttling = ThrottlingMiddleware()
+    identity = IdentityMiddleware()
+    for observer in (dp.message, dp.callback_query):
+        observer.outer_middleware(throttling)
+        observer.outer_middleware(identity)
@@ -0,0 +1,25 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from apps.botapp.identity import resolve_identity
+
+
+class IdentityMiddleware(BaseMiddleware):
+    """
+    Handlerlarga `identity` argumentini beradi (apps/botapp/identity.py).
+
+    Keshdan o'qish va last_interaction buferi bitta Redis round trip;
+    BotUser qatori har bir xabarda qayta yozilmaydi.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get('event_from_user')
+        data['identity'] = await resolve_identity(user.id) if user else None
+        return await handler(event, data)
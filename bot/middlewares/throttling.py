@@ -1,37 +1,77 @@
-import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional
 
-from aiogram import types, Dispatcher
-from aiogram.dispatcher import DEFAULT_RATE_LIMIT
-from aiogram.dispatcher.handler import CancelHandler, current_handler
-from aiogram.dispatcher.middlewares import BaseMiddleware
-from aiogram.utils.exceptions import Throttled
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, Message, TelegramObject
+from django.conf import settings
+
+from apps.common.ratelimit import ahit_all, parse_rate
 
 
 class ThrottlingMiddleware(BaseMiddleware):
     """
-    Simple middleware
+    Foydalanuvchi va handler bo'yicha taqsimlangan (Redis GCRA) flood himoyasi.
+
+    Limitlar barcha webhook workerlari uchun umumiy:
+
+    - har bir foydalanuvchi uchun BOT_RATE_LIMIT;
+    - foydalanuvchi + handler kaliti uchun BOT_HANDLER_RATE_LIMITS
+      (``cmd:<buyruq>`` yoki ``cb:<callback prefiksi>``).
+
+    Ikkala limit va "ogohlantirildi" belgisi bitta Lua chaqiruvida
+    tekshiriladi. Limitdan oshgan update handlerga yetib bormaydi,
+    foydalanuvchi esa har oynada faqat bir marta ogohlantiriladi.
     """
 
-    def __init__(self, limit=DEFAULT_RATE_LIMIT, key_prefix='antiflood_'):
-        self.rate_limit = limit
+    def __init__(
+        self,
+        rate: str | None = None,
+        handler_rates: Dict[str, str] | None = None,
+        key_prefix: str = 'bot',
+    ):
+        self.rate = parse_rate(rate or settings.BOT_RATE_LIMIT)
+        rates = settings.BOT_HANDLER_RATE_LIMITS if handler_rates is None else handler_rates
+        self.handler_rates = {key: parse_rate(value) for key, value in rates.items()}
         self.prefix = key_prefix
-        super(ThrottlingMiddleware, self).__init__()
-
-    async def on_process_message(self, message: types.Message, data: dict):
-        handler = current_handler.get()
-        dispatcher = Dispatcher.get_current()
-        if handler:
-            limit = getattr(handler, "throttling_rate_limit", self.rate_limit)
-            key = getattr(handler, "throttling_key", f"{self.prefix}_{handler.__name__}")
-        else:
-            limit = self.rate_limit
-            key = f"{self.prefix}_message"
-        try:
-            await dispatcher.throttle(key, rate=limit)
-        except Throttled as t:
-            await self.message_throttled(message, t)
-            raise CancelHandler()
-
-    async def message_throttled(self, message: types.Message, throttled: Throttled):
-        if throttled.exceeded_count <= 2:
-            await message.reply("Too many requests!")
+
+    @staticmethod
+    def handler_key(event: TelegramObject) -> Optional[str]:
+        """Update qaysi handlerga borishini handler tanlanmasdan oldin aniqlash"""
+        if isinstance(event, Message):
+            text = event.text or ''
+            if text.startswith('/'):
+                return f"cmd:{text.split()[0][1:].split('@')[0].lower()}"
+            return 'contact' if event.contact else None
+        if isinstance(event, CallbackQuery) and event.data:
+            return f"cb:{event.data.split(':', 1)[0]}"
+        return None
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get('event_from_user')
+        if user is None:
+            return await handler(event, data)
+
+        base = f"{self.prefix}:{user.id}"
+        limits = [(base, self.rate)]
+        key = self.handler_key(event)
+        if key in self.handler_rates:
+            limits.append((f"{base}:{key}", self.handler_rates[key]))
+
+        verdict = await ahit_all(limits, notice_key=f"{base}:notice")
+        if verdict.allowed:
+            return await handler(event, data)
+        if verdict.notify:
+            await self.throttled(event, verdict.retry_after)
+        elif isinstance(event, CallbackQuery):
+            await event.answer()  # tugmadagi "yuklanmoqda" belgisini olib tashlash
+        return None
+
+    async def throttled(self, event: TelegramObject, retry_after: float):
+        if isinstance(event, CallbackQuery):
+            await event.answer("Juda ko'p so'rov!", show_alert=False)
+        elif isinstance(event, Message):
+            await event.answer(f"⏳ Juda ko'p so'rov! {max(1, round(retry_after))} soniyadan so'ng urinib ko'ring.")
@@ -5,54 +5,72 @@ from aiogram.fsm.context import FSMContext
 import os
 import sys
 import django
+from django.apps import apps
+from django.conf import settings
 
-# Django settings ni sozlash
-sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
-django.setup()
+# Django settings ni sozlash (faqat Django tashqarisida ishga tushirilganda;
+# web worker va manage.py da setup allaqachon bajarilgan)
+if not apps.ready:
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+    django.setup()
 
+from apps.botapp.identity import Identity, forget_identity, remember_identity
 from apps.botapp.models import BotUser
 from auth.users.models import User
 from auth.utils.otp import OTPManager
 from bot.states.registration_state import Registration
 from bot.keyboards.default.registration import get_fullname_keyboard, get_phone_keyboard
+from bot.routers.quiz import quiz_router
 
 user_router = Router(name="user-router")
 otp_manager = OTPManager()
 
 
+def _otp_lifetime() -> str:
+    """OTP amal qilish muddati matni (TELEGRAM_OTP_TTL_SECONDS dan)"""
+    minutes, seconds = divmod(settings.TELEGRAM_OTP_TTL_SECONDS, 60)
+    if not seconds:
+        return f"{minutes} daqiqa"
+    if not minutes:
+        return f"{seconds} soniya"
+    return f"{minutes} daqiqa {seconds} soniya"
+
+
 @user_router.message(CommandStart())
-async def cmd_start(message: Message, state: FSMContext):
+async def cmd_start(message: Message, state: FSMContext, identity: Identity | None):
     """
     /start buyrug'i. User ro'yxatdan o'tgan yoki o'tmaganligini tekshiradi.
+
+    `identity` IdentityMiddleware tomonidan keshdan beriladi.
     """
     user_id = str(message.from_user.id)
     
-    # BotUser mavjudligini tekshirish
-    try:
-        bot_user = await BotUser.objects.aget(user_id=user_id)
-        
-        # Agar user bog'langan bo'lsa
-        if await User.objects.filter(bot_user=bot_user).aexists():
-            await message.answer(
-                f"Assalomu alaykum, {message.from_user.full_name}!\n"
-                "Siz allaqachon ro'yxatdan o'tgansiz. 🎉",
-                reply_markup=ReplyKeyboardRemove()
-            )
-        else:
-            # BotUser bor lekin User bog'lanmagan
-            await start_registration(message, state)
-    except BotUser.DoesNotExist:
+    # Agar user bog'langan bo'lsa
+    if identity is not None and identity.registered:
+        await message.answer(
+            f"Assalomu alaykum, {message.from_user.full_name}!\n"
+            "Siz allaqachon ro'yxatdan o'tgansiz. 🎉",
+            reply_markup=ReplyKeyboardRemove()
+        )
+        return
+    
+    if identity is None:
         # BotUser ham yo'q - yangi foydalanuvchi
-        # BotUser yaratish
-        await BotUser.objects.acreate(
+        # BotUser yaratish (parallel /start lar uchun get_or_create)
+        bot_user, _ = await BotUser.objects.aget_or_create(
             user_id=user_id,
-            first_name=message.from_user.first_name,
-            last_name=message.from_user.last_name or "",
-            username=message.from_user.username,
-            language_code=message.from_user.language_code
+            defaults={
+                'first_name': message.from_user.first_name,
+                'last_name': message.from_user.last_name or "",
+                'username': message.from_user.username,
+                'language_code': message.from_user.language_code,
+            }
         )
-        await start_registration(message, state)
+        await remember_identity(user_id, Identity(str(bot_user.id), None))
+    
+    # BotUser bor lekin User bog'lanmagan
+    await start_registration(message, state)
 
 
 async def start_registration(message: Message, state: FSMContext):
@@ -158,6 +176,8 @@ async def process_phone_number(message: Message, state: FSMContext):
                 reply_markup=ReplyKeyboardRemove()
             )
         
+        # Bog'lanish o'zgardi - keyingi update bazadan qayta yuklaydi
+        await forget_identity(user_id)
         await state.clear()
         
     except Exception as e:
@@ -198,30 +218,21 @@ async def cmd_help(message: Message):
         "Commands:",
         "/start - Start the bot",
         "/login - Tizimga kirish uchun OTP olish",
+        "/quiz - Test topshirish",
         "/help - This help message",
     ]
     await message.answer("\n".join(text))
 
 
 @user_router.message(Command("login"))
-async def cmd_login(message: Message):
+async def cmd_login(message: Message, identity: Identity | None):
     """
     Tizimga kirish uchun OTP kod so'rash.
     """
     user_id = str(message.from_user.id)
     
-    # User ro'yxatdan o'tganligini tekshirish
-    try:
-        bot_user = await BotUser.objects.aget(user_id=user_id)
-        
-        if not await User.objects.filter(bot_user=bot_user).aexists():
-            await message.answer(
-                "❌ Siz hali ro'yxatdan o'tmagansiz!\n\n"
-                "Avval /start buyrug'ini bosib ro'yxatdan o'ting."
-            )
-            return
-        
-    except BotUser.DoesNotExist:
+    # User ro'yxatdan o'tganligini tekshirish (IdentityMiddleware keshi)
+    if identity is None or not identity.registered:
         await message.answer(
             "❌ Siz hali ro'yxatdan o'tmagansiz!\n\n"
             "Avval /start buyrug'ini bosib ro'yxatdan o'ting."
@@ -237,11 +248,9 @@ async def cmd_login(message: Message):
         )
         return
     
-    # OTP generatsiya qilish
-    otp = otp_manager.generate_otp()
-    
-    # OTP ni Redis ga saqlash
-    if not otp_manager.save_otp(user_id, otp):
+    # Boshqa foydalanuvchida yo'q OTP kodni band qilish
+    otp = otp_manager.issue_otp(user_id)
+    if otp is None:
         await message.answer(
             "❌ Xatolik yuz berdi!\n\n"
             "Iltimos, keyinroq qayta urinib ko'ring."
@@ -251,7 +260,7 @@ async def cmd_login(message: Message):
     # OTP ni yuborish
     await message.answer(
         f"🔐 Sizning login kodingiz: <code>{otp}</code>\n\n"
-        f"⏱ Kod 5 daqiqa davomida amal qiladi.\n\n"
+        f"⏱ Kod {_otp_lifetime()} davomida amal qiladi.\n\n"
         f"💡 Bu kodni ilovangizda kiriting.\n"
         f"⚠️ Agar siz bu kodni so'ramagan bo'lsangiz, ushbu xabarni e'tiborsiz qoldiring."
     )
@@ -263,4 +272,6 @@ async def echo(message: Message):
 
 
 def register_routers(dp: Dispatcher):
+    # quiz_router avval: user_router oxiridagi echo barcha matnlarni ushlaydi
+    dp.include_router(quiz_router)
     dp.include_router(user_router)
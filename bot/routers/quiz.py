@@ -0,0 +1,154 @@
+import html
+import random
+
+from aiogram import Router
+from aiogram.filters import Command
+from aiogram.types import CallbackQuery, Message
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Exists, OuterRef
+
+from apps.botapp.identity import Identity
+from apps.quizzes.bank import aget_bank
+from apps.quizzes.models import Question, Quiz, Subject
+from apps.quizzes.session import (
+    EXPIRED, FORBIDDEN, INVALID, STALE,
+    close_session, create_session, persist_answers, record_answer, session_answers,
+)
+from apps.students.models import Student
+from bot.keyboards.inline.quiz import AnswerCallback, SubjectCallback, get_answers_keyboard, get_subjects_keyboard
+
+quiz_router = Router(name="quiz-router")
+
+NOT_REGISTERED = (
+    "❌ Siz hali ro'yxatdan o'tmagansiz!\n\n"
+    "Avval /start buyrug'ini bosib ro'yxatdan o'ting."
+)
+
+
+def _question_text(bank, meta, index: int) -> str:
+    question = bank.questions[meta.question_ids[index]]
+    return (
+        f"❓ Savol {index + 1}/{len(meta.question_ids)}\n\n"
+        f"<b>{html.escape(question['text'])}</b>\n\n"
+        f"⏱ {question['time_limit']} soniya"
+    )
+
+
+async def _finish(callback: CallbackQuery, quiz_id: str):
+    """Javoblarni bazaga yozish; sessiya faqat shundan keyin o'chiriladi"""
+    meta, answers = await session_answers(quiz_id)
+    if meta is None:  # boshqa so'rov allaqachon yakunlagan
+        return
+    bank = await aget_bank(meta.subject_id, meta.version)
+    quiz = await sync_to_async(persist_answers)(meta, bank, answers)
+    await close_session(quiz_id)
+    await callback.message.edit_text(
+        "🏁 Test yakunlandi!\n\n"
+        f"✅ To'g'ri javoblar: {quiz.correct_answers}/{quiz.total_questions}\n"
+        f"📊 Natija: {quiz.percentage:.0f}%"
+    )
+
+
+async def _show_question(message: Message, bank, meta, index: int):
+    question = bank.questions[meta.question_ids[index]]
+    await message.edit_text(
+        _question_text(bank, meta, index),
+        reply_markup=get_answers_keyboard(meta.quiz_id, index, question['answers']),
+    )
+
+
+@quiz_router.message(Command("quiz"))
+async def cmd_quiz(message: Message, identity: Identity | None):
+    """
+    /quiz buyrug'i. Test topshirish uchun fan tanlash.
+    """
+    if identity is None or not identity.registered:
+        await message.answer(NOT_REGISTERED)
+        return
+
+    # Faqat faol savoli bor fanlar (questions__deleted_at__isnull LEFT JOIN da savolsiz fanlarni ham o'tkazardi)
+    has_questions = Exists(Question.objects.filter(subject=OuterRef('pk'), deleted_at__isnull=True))
+    subjects = [
+        subject async for subject in Subject.objects.filter(
+            has_questions, deleted_at__isnull=True
+        ).values('id', 'name').order_by('order', 'name')
+    ]
+    if not subjects:
+        await message.answer("📭 Hozircha testlar mavjud emas.")
+        return
+    await message.answer("📚 Fanni tanlang:", reply_markup=get_subjects_keyboard(subjects))
+
+
+@quiz_router.callback_query(SubjectCallback.filter())
+async def start_quiz(callback: CallbackQuery, callback_data: SubjectCallback, identity: Identity | None):
+    """
+    Testni boshlash: savollar bank snapshotidan tanlanadi, holat Redis sessiyasida.
+    """
+    if identity is None or not identity.registered:
+        await callback.answer(NOT_REGISTERED, show_alert=True)
+        return
+
+    student = await Student.objects.filter(
+        user_id=identity.user_id, deleted_at__isnull=True
+    ).select_related('user').afirst()
+    if student is None:
+        await callback.answer("❌ Siz student emassiz", show_alert=True)
+        return
+
+    bank = await aget_bank(callback_data.subject_id)
+    if not bank.questions:
+        await callback.answer("📭 Bu fanda savollar topilmadi", show_alert=True)
+        return
+
+    count = min(settings.QUIZ_BOT_QUESTIONS_COUNT, len(bank.questions))
+    question_ids = random.sample(list(bank.questions), count)
+    subject = await Subject.objects.aget(pk=callback_data.subject_id)
+    quiz = await Quiz.objects.acreate(
+        student=student,
+        subject=subject,
+        title=f"{subject.name} testi (bot)",
+        total_questions=count,
+    )
+    meta = await create_session(quiz.id.hex, bank, question_ids, callback.from_user.id)
+
+    await callback.answer()
+    await _show_question(callback.message, bank, meta, 0)
+
+
+@quiz_router.callback_query(AnswerCallback.filter())
+async def answer_question(callback: CallbackQuery, callback_data: AnswerCallback):
+    """
+    Javobni qabul qilish. Bazaga murojaat yo'q: bitta Lua chaqiruvi va snapshot.
+    """
+    quiz_id, index = callback_data.quiz, callback_data.index
+    status, meta = await record_answer(quiz_id, index, callback_data.option, callback.from_user.id)
+    if status == EXPIRED:
+        await callback.answer("⌛ Test muddati tugagan. /quiz orqali qayta boshlang.", show_alert=True)
+        return
+    if status == FORBIDDEN:
+        await callback.answer("❌ Bu test sizga tegishli emas", show_alert=True)
+        return
+    if status == INVALID:
+        await callback.answer("❌ Bunday javob varianti yo'q", show_alert=True)
+        return
+    if status == STALE:
+        if index == len(meta.question_ids) - 1:
+            # Oxirgi javob yozilgan, lekin sessiya yopilmagan (saqlash xatosi) - qayta urinish
+            await callback.answer()
+            await _finish(callback, quiz_id)
+            return
+        await callback.answer("Bu savolga allaqachon javob berilgan")
+        return
+
+    bank = await aget_bank(meta.subject_id, meta.version)
+    question = bank.questions[meta.question_ids[index]]
+    chosen = question['answers'][callback_data.option]
+    await callback.answer("✅ To'g'ri!" if chosen['correct'] else "❌ Noto'g'ri")
+
+    if status < len(meta.question_ids):
+        await _show_question(callback.message, bank, meta, status)
+        return
+
+    # Test tugadi - javoblar bitta tranzaksiyada saqlanadi
+    await _finish(callback, quiz_id)
@@ -75,6 +75,7 @@ INSTALLED_APPS = [
 AUTH_USER_MODEL = "users.User"
 
 MIDDLEWARE = [
+    "apps.common.middleware.RequestMetricsMiddleware",  # first: times the whole stack, served on /metrics
     "django.middleware.security.SecurityMiddleware",
     "corsheaders.middleware.CorsMiddleware",  # CORS middleware - eng yuqorida bo'lishi kerak
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -187,7 +188,7 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'auth.users.authentication.ProfileJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -199,6 +200,13 @@ REST_FRAMEWORK = {
         'rest_framework.filters.SearchFilter',
         'rest_framework.filters.OrderingFilter',
     ],
+    # Redis GCRA throttles (apps/common/throttling.py), keyed per scope + user/IP
+    'DEFAULT_THROTTLE_RATES': {
+        'quiz_start': env.str('THROTTLE_QUIZ_START', '10/m'),
+        'quiz_answer': env.str('THROTTLE_QUIZ_ANSWER', '120/m'),
+        'telegram_otp_request': env.str('THROTTLE_TELEGRAM_OTP_REQUEST', '10/m'),  # per IP
+        'telegram_otp_verify': env.str('THROTTLE_TELEGRAM_OTP_VERIFY', '20/m'),  # per IP, guards code guessing
+    },
 }
 
 # DRF Spectacular (OpenAPI/Swagger) Configuration
@@ -250,6 +258,24 @@ CELERY_RESULT_BACKEND = env.str(
     default=f"redis://{env.str('REDIS_HOST', 'redis')}:{env.int('REDIS_PORT', 6379)}/{env.int('REDIS_DB', 0)}",
 )
 
+# Redis connections (apps/common/redis_client.py): one pooled client per name per process
+REDIS_URL = env.str(
+    "REDIS_URL",
+    default=f"redis://{env.str('REDIS_HOST', 'redis')}:{env.int('REDIS_PORT', 6379)}/{env.int('REDIS_DB', 0)}",
+)
+REDIS_MAX_CONNECTIONS = env.int("REDIS_MAX_CONNECTIONS", 50)  # per pool, per process
+REDIS_SOCKET_TIMEOUT = env.float("REDIS_SOCKET_TIMEOUT", 5.0)
+REDIS_CONNECTIONS = {
+    "default": {"url": REDIS_URL},
+    "otp": {"url": env.str("OTP_REDIS_URL", REDIS_URL)},
+    "cache": {"url": env.str("CACHE_REDIS_URL", REDIS_URL)},
+    # aiogram FSM storage works with bytes
+    "fsm": {"url": env.str("FSM_REDIS_URL", REDIS_URL), "decode_responses": False},
+    "alerts": {"url": env.str("ALERT_REDIS_URL", REDIS_URL)},
+    "metrics": {"url": env.str("METRICS_REDIS_URL", REDIS_URL)},
+    "broker": {"url": CELERY_BROKER_URL},
+}
+
 CELERY_TASK_TIME_LIMIT = env.int("CELERY_TASK_TIME_LIMIT", 60 * 10)  # hard limit 10m
 CELERY_TASK_SOFT_TIME_LIMIT = env.int("CELERY_TASK_SOFT_TIME_LIMIT", 60 * 5)  # soft 5m
 CELERY_TASK_ALWAYS_EAGER = env.bool("CELERY_TASK_ALWAYS_EAGER", False)
@@ -260,7 +286,53 @@ CELERY_ENABLE_UTC = USE_TZ
 # Celery Beat Schedule - periodic tasks
 from celery.schedules import crontab
 
-CELERY_BEAT_SCHEDULE = {}
+CELERY_BEAT_SCHEDULE = {
+    "advance-lesson-statuses": {
+        "task": "apps.attendance.tasks.advance_lesson_statuses_task",
+        "schedule": crontab(minute="*/5"),
+    },
+    "detect-chronic-absence": {
+        "task": "apps.attendance.tasks.detect_chronic_absence_task",
+        "schedule": crontab(hour=20, minute=0),
+    },
+    "drain-check-ins": {
+        "task": "apps.attendance.tasks.drain_check_ins_task",
+        "schedule": env.float("CHECKIN_DRAIN_INTERVAL_SECONDS", 5.0),  # seconds
+    },
+    "warm-lesson-cache": {
+        "task": "apps.attendance.tasks.warm_lesson_cache_task",
+        "schedule": crontab(hour=0, minute=1),
+    },
+    "flush-bot-last-interactions": {
+        "task": "apps.botapp.tasks.flush_last_interactions_task",
+        "schedule": env.float("BOT_LAST_INTERACTION_FLUSH_SECONDS", 30.0),  # seconds
+    },
+    "reclaim-stale-broadcasts": {
+        "task": "apps.botapp.tasks.reclaim_stale_broadcasts_task",
+        "schedule": crontab(minute="*/5"),
+    },
+}
+
+# Attendance: auto-mark remaining students absent when a lesson is completed
+LESSON_AUTO_ABSENT_ENABLED = env.bool("LESSON_AUTO_ABSENT_ENABLED", False)
+LESSON_AUTO_ABSENT_LOOKBACK_DAYS = env.int("LESSON_AUTO_ABSENT_LOOKBACK_DAYS", 1)
+
+# Attendance: Redis cache for today/this_week lesson lists (invalidated on writes)
+LESSON_CACHE_ENABLED = env.bool("LESSON_CACHE_ENABLED", True)
+LESSON_CACHE_TTL_SECONDS = env.int("LESSON_CACHE_TTL_SECONDS", 60 * 60 * 24)
+
+# Attendance: student self check-in buffered in Redis, drained by beat
+CHECKIN_DRAIN_WINDOW_SECONDS = env.int("CHECKIN_DRAIN_WINDOW_SECONDS", 5)  # batch a burst before writing
+CHECKIN_KEY_GRACE_SECONDS = env.int("CHECKIN_KEY_GRACE_SECONDS", 60 * 10)
+CHECKIN_META_CACHE_SECONDS = env.int("CHECKIN_META_CACHE_SECONDS", 60)
+CHECKIN_PROCESSING_TIMEOUT_SECONDS = env.int("CHECKIN_PROCESSING_TIMEOUT_SECONDS", 300)  # then a stalled drain is redone
+
+# Attendance: nightly chronic-absence detection
+CHRONIC_ABSENCE_RATE_THRESHOLD = env.float("CHRONIC_ABSENCE_RATE_THRESHOLD", 75.0)  # percent
+CHRONIC_ABSENCE_MIN_LESSONS = env.int("CHRONIC_ABSENCE_MIN_LESSONS", 5)
+CHRONIC_ABSENCE_STREAK = env.int("CHRONIC_ABSENCE_STREAK", 3)  # consecutive missed lessons
+CHRONIC_ABSENCE_ALERT_TTL_SECONDS = env.int("CHRONIC_ABSENCE_ALERT_TTL_SECONDS", 60 * 60 * 24 * 7)
+CHRONIC_ABSENCE_NOTIFY_STUDENTS = env.bool("CHRONIC_ABSENCE_NOTIFY_STUDENTS", True)
 
 # OTP settings (Redis-backed)
 OTP_CODE_TTL_SECONDS = env.int("OTP_CODE_TTL_SECONDS", 120)  # 2 minutes
@@ -268,6 +340,85 @@ OTP_REQUEST_COOLDOWN_SECONDS = env.int("OTP_REQUEST_COOLDOWN_SECONDS", 60)  # 1
 OTP_MAX_ATTEMPTS = env.int("OTP_MAX_ATTEMPTS", 5)
 OTP_CODE_LENGTH = env.int("OTP_CODE_LENGTH", 6)
 OTP_REDIS_PREFIX = env.str("OTP_REDIS_PREFIX", "otp")
+# Telegram webhook queue (apps/botapp/stream.py): webhook enqueues, `manage.py consume_updates` processes
+TELEGRAM_WEBHOOK_QUEUE_ENABLED = env.bool("TELEGRAM_WEBHOOK_QUEUE_ENABLED", True)
+TELEGRAM_STREAM_SHARDS = env.int("TELEGRAM_STREAM_SHARDS", 8)  # per-chat ordering is kept within a shard
+TELEGRAM_STREAM_MAXLEN = env.int("TELEGRAM_STREAM_MAXLEN", 100_000)  # approximate trim per stream
+TELEGRAM_STREAM_BATCH_SIZE = env.int("TELEGRAM_STREAM_BATCH_SIZE", 50)
+TELEGRAM_STREAM_BLOCK_MS = env.int("TELEGRAM_STREAM_BLOCK_MS", 2000)  # keep below REDIS_SOCKET_TIMEOUT
+TELEGRAM_STREAM_MAX_ATTEMPTS = env.int("TELEGRAM_STREAM_MAX_ATTEMPTS", 3)  # then dead-lettered
+TELEGRAM_UPDATE_DEDUP_TTL_SECONDS = env.int("TELEGRAM_UPDATE_DEDUP_TTL_SECONDS", 60 * 60 * 24)  # Telegram keeps updates 24h
+
+# Build the bot and dispatcher when the web worker starts instead of on the first webhook call
+BOT_EAGER_INIT = env.bool("BOT_EAGER_INIT", False)
+
+# Bot flood protection (bot/middlewares/throttling.py), per Telegram user, DRF rate format
+BOT_RATE_LIMIT = env.str("BOT_RATE_LIMIT", "30/m")
+# Extra per user+handler limits: "cmd:<command>" or "cb:<callback prefix>", e.g. "cmd:login=5/m,cb:qa=120/m"
+BOT_HANDLER_RATE_LIMITS = env.dict("BOT_HANDLER_RATE_LIMITS", {
+    "cmd:start": "10/m",
+    "cmd:login": "5/m",
+    "cmd:quiz": "10/m",
+    "contact": "5/m",
+    "cb:qs": "10/m",
+    "cb:qa": "120/m",
+})
+# Bot identity cache (apps/botapp/identity.py); last_interaction is flushed by beat
+BOT_IDENTITY_CACHE_TTL_SECONDS = env.int("BOT_IDENTITY_CACHE_TTL_SECONDS", 60 * 5)
+
+# Bot broadcasts (apps/botapp/broadcast.py): Telegram allows ~30 msg/s overall and 1 msg/s per chat
+BROADCAST_GLOBAL_RATE = env.str("BROADCAST_GLOBAL_RATE", "30/s")  # shared by all workers via Redis
+BROADCAST_CHAT_RATE = env.str("BROADCAST_CHAT_RATE", "1/s")
+BROADCAST_CONCURRENCY = env.int("BROADCAST_CONCURRENCY", 30)  # requests in flight
+BROADCAST_MAX_RETRIES = env.int("BROADCAST_MAX_RETRIES", 3)  # per message on 5xx / network errors (429 waits are free)
+BROADCAST_PROGRESS_INTERVAL_SECONDS = env.float("BROADCAST_PROGRESS_INTERVAL_SECONDS", 2.0)
+BROADCAST_STALE_SECONDS = env.int("BROADCAST_STALE_SECONDS", 60 * 10)  # running without progress -> worker died
+
+# Quizzes in the bot: question bank snapshot (apps/quizzes/bank.py) and Redis session (apps/quizzes/session.py)
+QUIZ_BANK_TTL_SECONDS = env.int("QUIZ_BANK_TTL_SECONDS", 60 * 60 * 24)  # must outlive sessions
+QUIZ_SESSION_TTL_SECONDS = env.int("QUIZ_SESSION_TTL_SECONDS", 60 * 60 * 2)  # idle time before a quiz is abandoned
+QUIZ_BOT_QUESTIONS_COUNT = env.int("QUIZ_BOT_QUESTIONS_COUNT", 10)
+
+# Telegram login OTP (auth/utils/otp.py): codes are unique among active logins
+TELEGRAM_OTP_LENGTH = env.int("TELEGRAM_OTP_LENGTH", 5)
+TELEGRAM_OTP_TTL_SECONDS = env.int("TELEGRAM_OTP_TTL_SECONDS", 300)
+TELEGRAM_OTP_ALLOCATION_ATTEMPTS = env.int("TELEGRAM_OTP_ALLOCATION_ATTEMPTS", 8)  # candidates per SET NX script
+# Share of codes in use = chance that one random guess logs someone in (verify is by code alone);
+# 0.02 of the 5-digit keyspace is 1800 active codes, far above a normal morning peak
+TELEGRAM_OTP_UTILIZATION_WARNING = env.float("TELEGRAM_OTP_UTILIZATION_WARNING", 0.02)
+# Where OTP calls go while Redis is down: "memory" (per-process, dev only) or "fail"
+OTP_STORE_FALLBACK = env.str("OTP_STORE_FALLBACK", "memory" if DEBUG else "fail")
+
+# Request metrics (apps/common/metrics.py): per-route latency, DB and Redis usage, Prometheus on /metrics
+METRICS_ENABLED = env.bool("METRICS_ENABLED", True)
+METRICS_FLUSH_SECONDS = env.float("METRICS_FLUSH_SECONDS", 10.0)  # per worker, one Redis pipeline
+METRICS_LATENCY_BUCKETS = [float(b) for b in env.list(
+    "METRICS_LATENCY_BUCKETS", [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+)]  # seconds
+METRICS_TOKEN = env.str("METRICS_TOKEN", "")  # scrapers send "Authorization: Bearer <token>"; unset: DEBUG only
+
+# Outbound HTTP (apps/common/http.py): one pooled keep-alive client per worker process
+HTTP_CLIENT_HTTP2 = env.bool("HTTP_CLIENT_HTTP2", True)  # needs the h2 package (httpx[http2])
+HTTP_CLIENT_TIMEOUT_SECONDS = env.float("HTTP_CLIENT_TIMEOUT_SECONDS", 5.0)
+HTTP_CLIENT_MAX_CONNECTIONS = env.int("HTTP_CLIENT_MAX_CONNECTIONS", 20)
+HTTP_CLIENT_KEEPALIVE_SECONDS = env.float("HTTP_CLIENT_KEEPALIVE_SECONDS", 30.0)
+TELEGRAM_API_BASE = env.str("TELEGRAM_API_BASE", "https://api.telegram.org")
+TELEGRAM_FANOUT_CONCURRENCY = env.int("TELEGRAM_FANOUT_CONCURRENCY", 8)
+
+# OTP SMS: sends within the window are coalesced into one provider call (0 disables)
+SMS_BATCH_WINDOW_SECONDS = env.float("SMS_BATCH_WINDOW_SECONDS", 0.5)
+SMS_BATCH_MAX_SIZE = env.int("SMS_BATCH_MAX_SIZE", 100)
+
+# Redis circuit breaker (apps/common/redis_health.py)
+REDIS_HEALTH_FAILURE_THRESHOLD = env.int("REDIS_HEALTH_FAILURE_THRESHOLD", 3)  # consecutive failures to open
+REDIS_HEALTH_BACKOFF_BASE_SECONDS = env.float("REDIS_HEALTH_BACKOFF_BASE_SECONDS", 1.0)
+REDIS_HEALTH_BACKOFF_MAX_SECONDS = env.float("REDIS_HEALTH_BACKOFF_MAX_SECONDS", 30.0)
+
+# Authentication: user cache used by ProfileJWTAuthentication (in-process LRU + Redis)
+USER_CACHE_ENABLED = env.bool("USER_CACHE_ENABLED", True)
+USER_CACHE_LOCAL_TTL_SECONDS = env.float("USER_CACHE_LOCAL_TTL_SECONDS", 5.0)
+USER_CACHE_LOCAL_MAX_ENTRIES = env.int("USER_CACHE_LOCAL_MAX_ENTRIES", 10_000)
+USER_CACHE_REDIS_TTL_SECONDS = env.int("USER_CACHE_REDIS_TTL_SECONDS", 60)
 
 # SimpleJWT lifetimes (can be tuned via env)
 from datetime import timedelta
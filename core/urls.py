@@ -18,14 +18,17 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
-from apps.botapp.views import health_check, bot_status, telegram_webhook
+from apps.botapp.views import health_check, health_details, bot_status, telegram_webhook
+from apps.common.views import metrics
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView, SpectacularRedocView
 
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('health/', health_check, name='health_check'),
+    path('health/details/', health_details, name='health_details'),
     path('bot-status/', bot_status, name='bot_status'),
+    path('metrics', metrics, name='metrics'),
     path('api/telegram/webhook/<str:token>', telegram_webhook, name='telegram_webhook_no_slash'),
     path('api/telegram/webhook/<str:token>/', telegram_webhook, name='telegram_webhook'),
     
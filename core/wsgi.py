@@ -14,3 +14,11 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
 application = get_wsgi_application()
+
+# Optional startup hook: otherwise the bot is built on the first webhook call
+from django.conf import settings  # noqa: E402
+
+if settings.BOT_EAGER_INIT:
+    from bot.dispatcher import warm_up
+
+    warm_up()